@@ -1,19 +1,75 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional
+import os
+from contextlib import asynccontextmanager
 
-from school_db import get_connection
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+
+import school_metrics
+import school_profiler
+from school_db import close_pools, ensure_schema
+from school_http import (
+    MetricsMiddleware,
+    ProfilerMiddleware,
+    conditional_response,
+    metrics_response,
+    profiles_response,
+    rows_response,
+)
+from school_io import MEDIA_TYPES, encode_rows
 from school_service import (
+    COURSE_KEYS,
+    EXPORTS,
+    MAX_PAGE_SIZE,
+    PAGE_SIZE,
+    STUDENT_KEYS,
+    TEACHER_KEYS,
     add_course,
     add_student,
+    add_students,
     add_teacher,
     enroll_student_in_course,
+    enroll_students_in_courses,
+    get_course,
+    get_courses_by_ids,
+    get_data_version,
+    get_enrollment,
+    get_program,
+    get_program_progress,
+    get_student,
+    get_students_by_ids,
+    get_teacher,
+    iter_program_progress,
     list_courses,
     list_students,
     list_teachers,
+    page_cursor,
 )
 
-app = FastAPI(title="SampleAgenda API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ensure_schema()
+    yield
+    close_pools()
+
+
+app = FastAPI(title="SampleAgenda API", lifespan=lifespan)
+if school_metrics.ENABLED:
+    app.add_middleware(MetricsMiddleware, app_name="api")
+if school_profiler.ENABLED:
+    app.add_middleware(ProfilerMiddleware)
+
+MAX_BATCH_SIZE = 1000
+
+# List endpoints that encode their rows straight to JSON instead of going
+# through their pydantic response model; the output is the same.
+FAST_JSON = {
+    name.strip()
+    for name in os.environ.get("SCHOOL_API_FAST_JSON", "teachers,courses,students").split(",")
+    if name.strip()
+}
 
 
 class TeacherIn(BaseModel):
@@ -57,6 +113,16 @@ class EnrollmentIn(BaseModel):
     semester: str
 
 
+def _field_names(model: type[BaseModel]) -> tuple[str, ...]:
+    """The model's fields in declaration order (pydantic v2, or v1's ``__fields__``)."""
+    return tuple(getattr(model, "model_fields", None) or model.__fields__)
+
+
+TEACHER_FIELDS = _field_names(Teacher)
+COURSE_FIELDS = _field_names(Course)
+STUDENT_FIELDS = _field_names(Student)
+
+
 class Enrollment(BaseModel):
     id: int
     student_id: int
@@ -66,10 +132,72 @@ class Enrollment(BaseModel):
     grade: Optional[str] = None
 
 
-def _get_row(table: str, pk: int):
-    conn = get_connection()
-    cur = conn.execute(f"SELECT * FROM {table} WHERE id=?", (pk,))
-    return cur.fetchone()
+class StudentProgress(BaseModel):
+    student_id: int
+    student_number: str
+    name: str
+    passed: int
+    remaining: int
+    failed: int
+
+
+class StudentResult(BaseModel):
+    status: int
+    detail: Optional[str] = None
+    student: Optional[Student] = None
+
+
+class EnrollmentResult(BaseModel):
+    status: int
+    detail: Optional[str] = None
+    enrollment: Optional[Enrollment] = None
+
+
+def _check_batch_size(size: int) -> None:
+    if size > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=422, detail=f"At most {MAX_BATCH_SIZE} items per request"
+        )
+
+
+def _parse_ids(ids: str) -> List[int]:
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be comma-separated integers")
+    _check_batch_size(len(parsed))
+    return parsed
+
+
+def _list_page(response: Response, list_rows, keys, limit: int, cursor: Optional[str], **filters):
+    """Fetch one keyset page and advertise the next one in ``X-Next-Cursor``."""
+    try:
+        rows = list_rows(limit=limit, after=cursor, **filters)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    next_cursor = page_cursor(rows, limit, keys)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+
+def _not_modified(request: Request, response: Response, *tables: str) -> Optional[Response]:
+    token, _ = get_data_version(*tables)
+    return conditional_response(request, response, token)
+
+
+def _error_status(error: Exception) -> int:
+    return 404 if isinstance(error, LookupError) else 409
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    return metrics_response()
+
+
+@app.get("/admin/profiles", include_in_schema=False)
+def profiles(top: int = 20) -> Response:
+    return profiles_response(top)
 
 
 @app.post("/teachers", response_model=Teacher, status_code=201)
@@ -79,27 +207,55 @@ def create_teacher(data: TeacherIn) -> Teacher:
 
 
 @app.get("/teachers", response_model=List[Teacher])
-def read_teachers() -> List[Teacher]:
-    return [Teacher(**dict(row)) for row in list_teachers()]
+def read_teachers(
+    request: Request,
+    response: Response,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    last_name: Optional[str] = None,
+) -> List[Teacher]:
+    not_modified = _not_modified(request, response, "teacher")
+    if not_modified is not None:
+        return not_modified
+    rows = _list_page(
+        response, list_teachers, TEACHER_KEYS, limit, cursor, last_name=last_name
+    )
+    if "teachers" in FAST_JSON:
+        return rows_response(rows, TEACHER_FIELDS, response)
+    return [Teacher(**dict(row)) for row in rows]
 
 
 @app.post("/courses", response_model=Course, status_code=201)
 def create_course(data: CourseIn) -> Course:
-    if data.teacher_id is not None and not _get_row("teacher", data.teacher_id):
+    if data.teacher_id is not None and not get_teacher(data.teacher_id):
         raise HTTPException(status_code=404, detail="Teacher not found")
     cid = add_course(data.name, data.credits, data.teacher_id)
-    conn = get_connection()
-    row = conn.execute(
-        "SELECT c.*, t.first_name || ' ' || t.last_name AS teacher_name "
-        "FROM course c LEFT JOIN teacher t ON c.teacher_id = t.id WHERE c.id=?",
-        (cid,),
-    ).fetchone()
-    return Course(**dict(row))
+    return Course(**dict(get_course(cid)))
 
 
 @app.get("/courses", response_model=List[Course])
-def read_courses() -> List[Course]:
-    return [Course(**dict(row)) for row in list_courses()]
+def read_courses(
+    request: Request,
+    response: Response,
+    ids: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    name: Optional[str] = None,
+    teacher_id: Optional[int] = None,
+) -> List[Course]:
+    not_modified = _not_modified(request, response, "course", "teacher")
+    if not_modified is not None:
+        return not_modified
+    if ids is not None:
+        rows = get_courses_by_ids(_parse_ids(ids))
+    else:
+        rows = _list_page(
+            response, list_courses, COURSE_KEYS, limit, cursor,
+            name=name, teacher_id=teacher_id,
+        )
+    if "courses" in FAST_JSON:
+        return rows_response(rows, COURSE_FIELDS, response)
+    return [Course(**dict(row)) for row in rows]
 
 
 @app.post("/students", response_model=Student, status_code=201)
@@ -110,18 +266,93 @@ def create_student(data: StudentIn) -> Student:
     return Student(id=sid, **data.dict())
 
 
+@app.post("/students/batch", response_model=List[StudentResult])
+def create_students(data: List[StudentIn]) -> List[StudentResult]:
+    _check_batch_size(len(data))
+    results = add_students(
+        (item.first_name, item.last_name, item.student_number, item.email)
+        for item in data
+    )
+    return [
+        StudentResult(status=201, student=Student(id=result, **item.dict()))
+        if isinstance(result, int)
+        else StudentResult(status=_error_status(result), detail=str(result))
+        for item, result in zip(data, results)
+    ]
+
+
 @app.get("/students", response_model=List[Student])
-def read_students() -> List[Student]:
-    return [Student(**dict(row)) for row in list_students()]
+def read_students(
+    request: Request,
+    response: Response,
+    ids: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    last_name: Optional[str] = None,
+    student_number: Optional[str] = None,
+) -> List[Student]:
+    not_modified = _not_modified(request, response, "student")
+    if not_modified is not None:
+        return not_modified
+    if ids is not None:
+        rows = get_students_by_ids(_parse_ids(ids))
+    else:
+        rows = _list_page(
+            response, list_students, STUDENT_KEYS, limit, cursor,
+            last_name=last_name, student_number=student_number,
+        )
+    if "students" in FAST_JSON:
+        return rows_response(rows, STUDENT_FIELDS, response)
+    return [Student(**dict(row)) for row in rows]
 
 
 @app.post("/enrollments", response_model=Enrollment, status_code=201)
 def enroll(data: EnrollmentIn) -> Enrollment:
-    if not _get_row("student", data.student_id):
+    if not get_student(data.student_id):
         raise HTTPException(status_code=404, detail="Student not found")
-    if not _get_row("course", data.course_id):
+    if not get_course(data.course_id):
         raise HTTPException(status_code=404, detail="Course not found")
     eid = enroll_student_in_course(data.student_id, data.course_id, data.semester)
-    conn = get_connection()
-    row = conn.execute("SELECT * FROM enrollment WHERE id=?", (eid,)).fetchone()
-    return Enrollment(**dict(row))
+    return Enrollment(**dict(get_enrollment(eid)))
+
+
+@app.post("/enrollments/batch", response_model=List[EnrollmentResult])
+def enroll_batch(data: List[EnrollmentIn]) -> List[EnrollmentResult]:
+    _check_batch_size(len(data))
+    results = enroll_students_in_courses(
+        [(item.student_id, item.course_id, item.semester) for item in data]
+    )
+    return [
+        EnrollmentResult(
+            status=201,
+            enrollment=Enrollment(id=result, status="enrolled", **item.dict()),
+        )
+        if isinstance(result, int)
+        else EnrollmentResult(status=_error_status(result), detail=str(result))
+        for item, result in zip(data, results)
+    ]
+
+
+@app.get("/export/{entity}")
+def export(entity: str, format: Literal["csv", "ndjson"] = "ndjson") -> StreamingResponse:
+    """Stream every row of ``entity``; memory use does not grow with the table."""
+    if entity not in EXPORTS:
+        raise HTTPException(status_code=404, detail="Unknown entity")
+    return StreamingResponse(
+        encode_rows(EXPORTS[entity](), format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{entity}.{format}"'},
+    )
+
+
+@app.get("/programs/{program_id}/progress", response_model=List[StudentProgress])
+def read_program_progress(program_id: int, format: Literal["json", "ndjson"] = "json"):
+    """Progress of every student in the program, optionally streamed as NDJSON."""
+    if not get_program(program_id):
+        raise HTTPException(status_code=404, detail="Program not found")
+    if format == "ndjson":
+        return StreamingResponse(
+            encode_rows(iter_program_progress(program_id), format),
+            media_type=MEDIA_TYPES[format],
+        )
+    return [StudentProgress(**dict(row)) for row in get_program_progress(program_id)]
@@ -1,21 +1,64 @@
-from fastapi import FastAPI, Request, Form
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request, Response, Form
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
+import school_db
+import school_metrics
+import school_profiler
 import school_service as svc
-
-app = FastAPI()
+from school_async import AsyncService
+from school_http import (
+    MetricsMiddleware,
+    ProfilerMiddleware,
+    conditional_response,
+    metrics_response,
+    profiles_response,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    school_db.ensure_schema()
+    yield
+    db.shutdown()
+    school_db.close_pools()
+
+
+app = FastAPI(lifespan=lifespan)
+if school_metrics.ENABLED:
+    app.add_middleware(MetricsMiddleware, app_name="app")
+if school_profiler.ENABLED:
+    app.add_middleware(ProfilerMiddleware)
+db = AsyncService(svc)
 templates = Jinja2Templates(directory="templates")
 
 
+async def _page(list_rows, keys, cursor: str | None, **filters):
+    """Return one page of ``list_rows`` and the cursor of the next page."""
+    try:
+        rows = await list_rows(limit=svc.PAGE_SIZE, after=cursor, **filters)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return rows, svc.page_cursor(rows, svc.PAGE_SIZE, keys)
+
+
 @app.get("/")
 async def root() -> RedirectResponse:
     return RedirectResponse(url="/courses")
 
 
 @app.get("/teachers")
-async def get_teachers(request: Request):
-    teachers = svc.list_teachers()
-    return templates.TemplateResponse("teachers.html", {"request": request, "teachers": teachers})
+async def get_teachers(request: Request, cursor: str | None = None, last_name: str | None = None):
+    teachers, next_cursor = await _page(db.list_teachers, svc.TEACHER_KEYS, cursor, last_name=last_name)
+    context = {
+        "request": request,
+        "teachers": teachers,
+        "next_cursor": next_cursor,
+        "last_name": last_name,
+    }
+    return templates.TemplateResponse("teachers.html", context)
 
 
 @app.post("/teachers/add")
@@ -24,29 +67,26 @@ async def add_teacher(
     last_name: str = Form(...),
     email: str | None = Form(None),
 ):
-    svc.add_teacher(first_name, last_name, email)
+    await db.add_teacher(first_name, last_name, email)
     return RedirectResponse("/teachers", status_code=303)
 
 
 @app.get("/teachers/{teacher_id}")
 async def teacher_detail(request: Request, teacher_id: int):
-    teacher = svc.get_teacher(teacher_id)
-    courses = svc.get_teacher_courses(teacher_id)
-    students = svc.get_teacher_students(teacher_id)
-    evaluations = svc.get_teacher_evaluations(teacher_id)
+    dashboard = await db.get_teacher_dashboard(teacher_id)
     context = {
         "request": request,
-        "teacher": teacher,
-        "courses": courses,
-        "students": students,
-        "evaluations": evaluations,
+        "teacher": dashboard.teacher,
+        "courses": dashboard.courses,
+        "students": dashboard.students,
+        "evaluations": dashboard.evaluations,
     }
     return templates.TemplateResponse("teacher_detail.html", context)
 
 
 @app.get("/teachers/{teacher_id}/edit")
 async def edit_teacher_form(request: Request, teacher_id: int):
-    teacher = svc.get_teacher(teacher_id)
+    teacher = await db.get_teacher(teacher_id)
     return templates.TemplateResponse("teacher_edit.html", {"request": request, "teacher": teacher})
 
 
@@ -57,45 +97,125 @@ async def edit_teacher(
     last_name: str = Form(...),
     email: str | None = Form(None),
 ):
-    svc.update_teacher(teacher_id, first_name, last_name, email)
+    await db.update_teacher(teacher_id, first_name, last_name, email)
     return RedirectResponse(f"/teachers/{teacher_id}", status_code=303)
 
 
 @app.post("/teachers/{teacher_id}/delete")
 async def delete_teacher(teacher_id: int):
-    svc.delete_teacher(teacher_id)
+    await db.delete_teacher(teacher_id)
     return RedirectResponse("/teachers", status_code=303)
 
 
 @app.get("/teachers/{teacher_id}/courses/{course_id}/grades")
 async def course_grades(request: Request, teacher_id: int, course_id: int):
-    enrollments = svc.get_enrollments_for_course(course_id)
-    course = next((c for c in svc.get_teacher_courses(teacher_id) if c["id"] == course_id), None)
+    return await _course_grades_page(request, teacher_id, course_id)
+
+
+def _check_teacher_course(course, teacher_id: int) -> None:
+    if course is None or course["teacher_id"] != teacher_id:
+        raise HTTPException(status_code=404, detail="Course not found")
+
+
+async def _course_grades_page(
+    request: Request,
+    teacher_id: int,
+    course_id: int,
+    submitted: dict | None = None,
+    errors: dict | None = None,
+):
+    course, enrollments = await asyncio.gather(
+        db.get_course(course_id), db.get_enrollments_for_course(course_id)
+    )
+    _check_teacher_course(course, teacher_id)
+    errors = errors or {}
+    grid = {str(e["id"]) for e in enrollments}
     context = {
         "request": request,
         "enrollments": enrollments,
         "course": course,
         "teacher_id": teacher_id,
+        "grades": svc.GRADES,
+        "submitted": submitted or {},
+        "errors": errors,
+        # Errors for fields that match no row of the grid, such as an
+        # enrollment of another course, are listed under the summary.
+        "other_errors": {key: msg for key, msg in errors.items() if key not in grid},
     }
-    return templates.TemplateResponse("course_grades.html", context)
+    status_code = 422 if errors else 200
+    return templates.TemplateResponse("course_grades.html", context, status_code=status_code)
 
 
 @app.post("/teachers/{teacher_id}/courses/{course_id}/grades")
-async def post_course_grade(
-    teacher_id: int,
-    course_id: int,
-    enrollment_id: int = Form(...),
-    grade: str = Form(...),
-):
-    svc.record_grade(enrollment_id, grade, "completed")
+async def post_course_grades(request: Request, teacher_id: int, course_id: int):
+    """Save the whole grade grid: one ``grade-<enrollment id>`` field per student.
+
+    Blank fields are left alone; a submission without any grade is
+    rejected. If any grade is rejected the grid is shown again with the
+    submitted values and an error next to each rejected row; errors for
+    enrollments that are not in the grid are listed above it.
+    """
+    _check_teacher_course(await db.get_course(course_id), teacher_id)
+    form = await request.form()
+    submitted = {key: value for key, value in form.items() if key.startswith("grade-")}
+    records = [
+        {"enrollment_id": key[len("grade-"):], "grade": value}
+        for key, value in submitted.items()
+        if value.strip()
+    ]
+    if not records:
+        raise HTTPException(status_code=400, detail="no grade-<enrollment id> fields submitted")
+    results = await db.record_grades(records, course_id)
+    errors = {
+        record["enrollment_id"]: str(result)
+        for record, result in zip(records, results)
+        if result is not None
+    }
+    if errors:
+        return await _course_grades_page(request, teacher_id, course_id, submitted, errors)
     return RedirectResponse(
         f"/teachers/{teacher_id}/courses/{course_id}/grades", status_code=303
     )
 
+
+@app.post("/api/courses/{course_id}/grades")
+async def record_course_grades(request: Request, course_id: int):
+    """Record a course's grades in one transaction.
+
+    The body is a JSON array of ``{"enrollment_id", "grade", "status"}``
+    objects (``status`` defaults to ``completed``); the answer has one
+    result per object, with status 200, 404 for an enrollment outside the
+    course or 422 for an invalid record.
+    """
+    try:
+        records = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="body must be JSON")
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise HTTPException(status_code=400, detail="body must be an array of grade objects")
+    results = await db.record_grades(records, course_id)
+    return [
+        {"enrollment_id": record.get("enrollment_id"), "status": 200}
+        if result is None
+        else {
+            "enrollment_id": record.get("enrollment_id"),
+            "status": 404 if isinstance(result, LookupError) else 422,
+            "detail": str(result),
+        }
+        for record, result in zip(records, results)
+    ]
+
+
 @app.get("/students")
-async def get_students(request: Request):
-    students = svc.list_students()
-    return templates.TemplateResponse("students.html", {"request": request, "students": students})
+async def get_students(request: Request, cursor: str | None = None, last_name: str | None = None):
+    students, next_cursor = await _page(db.list_students, svc.STUDENT_KEYS, cursor, last_name=last_name)
+    context = {
+        "request": request,
+        "students": students,
+        "next_cursor": next_cursor,
+        "last_name": last_name,
+    }
+    return templates.TemplateResponse("students.html", context)
 
 
 @app.post("/students/add")
@@ -105,13 +225,13 @@ async def add_student(
     student_number: str = Form(...),
     email: str | None = Form(None),
 ):
-    svc.add_student(first_name, last_name, student_number, email)
+    await db.add_student(first_name, last_name, student_number, email)
     return RedirectResponse("/students", status_code=303)
 
 
 @app.get("/students/{student_id}/edit")
 async def edit_student_form(request: Request, student_id: int):
-    student = svc.get_student(student_id)
+    student = await db.get_student(student_id)
     return templates.TemplateResponse("student_edit.html", {"request": request, "student": student})
 
 
@@ -123,71 +243,63 @@ async def edit_student(
     student_number: str = Form(...),
     email: str | None = Form(None),
 ):
-    svc.update_student(student_id, first_name, last_name, student_number, email)
+    await db.update_student(student_id, first_name, last_name, student_number, email)
     return RedirectResponse("/students", status_code=303)
 
 
 @app.post("/students/{student_id}/delete")
 async def delete_student(student_id: int):
-    svc.delete_student(student_id)
+    await db.delete_student(student_id)
     return RedirectResponse("/students", status_code=303)
 
 
 @app.get("/students/{student_id}/enrollments")
 async def student_enrollments(request: Request, student_id: int):
-    student = svc.get_student(student_id)
-    enrollments = svc.get_student_enrollments(student_id)
+    student = await db.get_student(student_id)
+    enrollments = await db.get_student_enrollments(student_id)
     context = {"request": request, "student": student, "enrollments": enrollments}
     return templates.TemplateResponse("student_enrollments.html", context)
 
 
 @app.get("/students/{student_id}/grades")
 async def student_grades(request: Request, student_id: int):
-    student = svc.get_student(student_id)
-    grades = svc.get_student_grades(student_id)
+    student = await db.get_student(student_id)
+    grades = await db.get_student_grades(student_id)
     context = {"request": request, "student": student, "grades": grades}
     return templates.TemplateResponse("student_grades.html", context)
 
 
 @app.get("/courses")
 async def get_courses(request: Request):
-    courses = svc.list_courses()
-    teachers = svc.list_teachers()
-    students = svc.list_students()
-    context = {
-        "request": request,
-        "courses": courses,
-        "teachers": teachers,
-        "students": students,
-    }
-    return templates.TemplateResponse("courses.html", context)
+    courses = await db.list_courses()
+    return templates.TemplateResponse("courses.html", {"request": request, "courses": courses})
 
 
 @app.post("/courses/add")
 async def post_course(name: str = Form(...), credits: int = Form(...), teacher_id: int | None = Form(None)):
-    svc.add_course(name, credits, teacher_id)
+    await db.add_course(name, credits, teacher_id)
     return RedirectResponse("/courses", status_code=303)
 
 
 @app.post("/enroll")
 async def enroll(student_id: int = Form(...), course_id: int = Form(...), semester: str = Form(...)):
-    svc.enroll_student_in_course(student_id, course_id, semester)
+    await db.enroll_student_in_course(student_id, course_id, semester)
     return RedirectResponse("/courses", status_code=303)
 
 
 @app.get("/progress")
 async def progress(request: Request, student_id: int | None = None, program_id: int | None = None):
-    students = svc.list_students()
-    programs = svc.list_programs()
+    programs = await db.list_programs()
+    student = await db.get_student(student_id) if student_id is not None else None
     context = {
         "request": request,
-        "students": students,
+        "student": student,
         "programs": programs,
         "student_id": student_id,
         "program_id": program_id,
     }
     if student_id is not None and program_id is not None:
-        passed, remaining, failed = svc.get_student_progress(student_id, program_id)
+        passed, remaining, failed = await db.get_student_progress(student_id, program_id)
         context.update({"passed": passed, "remaining": remaining, "failed": failed})
     return templates.TemplateResponse("student_progress.html", context)
 
@@ -197,13 +309,50 @@ async def analytics(request: Request):
     return templates.TemplateResponse("analytics.html", {"request": request})
 
 
+async def _not_modified(request: Request, response: Response, *tables: str):
+    token, _ = await db.get_data_version(*tables)
+    return conditional_response(request, response, token)
+
+
+@app.get("/api/search")
+async def search(type: str, q: str, limit: int = svc.SEARCH_LIMIT):
+    """Typeahead suggestions for the teacher, student and course pickers."""
+    limit = max(1, min(limit, svc.MAX_SEARCH_LIMIT))
+    try:
+        rows = await db.search(type, q, limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return [{"id": row["id"], "label": row["label"]} for row in rows]
+
+
 @app.get("/api/analytics/popular-courses")
-async def popular_courses():
-    data = svc.get_most_popular_courses()
+async def popular_courses(request: Request, response: Response):
+    not_modified = await _not_modified(request, response, "course", "enrollment")
+    if not_modified is not None:
+        return not_modified
+    data = await db.get_most_popular_courses()
     return [{"name": row["name"], "count": row["cnt"]} for row in data]
 
 
 @app.get("/api/analytics/popular-teachers")
-async def popular_teachers():
-    data = svc.get_most_popular_teachers()
+async def popular_teachers(request: Request, response: Response):
+    not_modified = await _not_modified(request, response, "teacher", "enrollment")
+    if not_modified is not None:
+        return not_modified
+    data = await db.get_most_popular_teachers()
     return [{"name": row["name"], "count": row["cnt"]} for row in data]
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return metrics_response()
+
+
+@app.get("/admin/profiles", include_in_schema=False)
+async def profiles(top: int = 20) -> Response:
+    return profiles_response(top)
+
+
+@app.get("/api/analytics/cache")
+async def analytics_cache_stats():
+    return svc.analytics_cache.stats()
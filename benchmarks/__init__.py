@@ -0,0 +1,8 @@
+"""Performance benchmarks for the school information system.
+
+Run from the repository root::
+
+    python -m benchmarks generate school.db --size medium
+    python -m benchmarks run --sizes small medium --output head.json
+    python -m benchmarks compare base.json head.json
+"""
@@ -0,0 +1,78 @@
+import argparse
+import json
+import sys
+from dataclasses import replace
+
+from benchmarks import loadtest
+from benchmarks.compare import THRESHOLD, compare, format_table
+from benchmarks.generate import SIZES, generate
+from benchmarks.run import GROUPS, REPEAT, run
+
+COUNTS = ("teachers", "courses", "programs", "students", "enrollments")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="School benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("generate", help="write a synthetic database")
+    p.add_argument("path")
+    p.add_argument("--size", choices=sorted(SIZES), default="small")
+    p.add_argument("--seed", type=int, default=0)
+    for count in COUNTS:
+        p.add_argument(f"--{count}", type=int, help=f"override the number of {count}")
+
+    p = sub.add_parser("run", help="time queries, writes, CLI commands and endpoints")
+    p.add_argument("--sizes", nargs="+", choices=sorted(SIZES), default=["small"])
+    p.add_argument("--groups", nargs="+", choices=GROUPS, default=list(GROUPS))
+    p.add_argument("--repeat", type=int, default=REPEAT)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--workdir", help="directory for the generated databases (default: temp)")
+    p.add_argument("--output", help="JSON report to write (default: standard output)")
+
+    p = sub.add_parser("compare", help="compare the medians of two reports")
+    p.add_argument("base")
+    p.add_argument("head")
+    p.add_argument("--threshold", type=float, default=THRESHOLD,
+                   help="relative change reported as slower/faster (default: %(default)s)")
+    p.add_argument("--fail-on-regression", action="store_true",
+                   help="exit with status 1 when any case got slower")
+
+    p = sub.add_parser("loadtest", help="drive uvicorn servers with concurrent virtual users")
+    p.add_argument("scenario", choices=sorted(loadtest.SCENARIOS))
+    p.add_argument("--users", type=int, default=100)
+    p.add_argument("--duration", type=float, default=20.0, help="seconds")
+    p.add_argument("--size", choices=sorted(SIZES), default="medium")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--db", help="existing database to use instead of a generated one")
+    p.add_argument("--output", help="also write the JSON report to this file")
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        overrides = {c: getattr(args, c) for c in COUNTS if getattr(args, c) is not None}
+        dataset = replace(SIZES[args.size], **overrides)
+        seconds = generate(args.path, dataset, args.seed)
+        print(f"{dataset} written to {args.path} in {seconds:.2f}s")
+    elif args.command == "run":
+        report = run(args.sizes, args.groups, args.repeat, args.seed, args.workdir)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as stream:
+                json.dump(report, stream, indent=2)
+        else:
+            json.dump(report, sys.stdout, indent=2)
+    elif args.command == "loadtest":
+        report = loadtest.run(args.scenario, args.users, args.duration, args.size, args.seed, args.db)
+        print(loadtest.format_report(report))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as stream:
+                json.dump(report, stream, indent=2)
+    elif args.command == "compare":
+        rows = compare(args.base, args.head, args.threshold)
+        print(format_table(rows))
+        if args.fail_on_regression and any(row["verdict"] == "slower" for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
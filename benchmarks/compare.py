@@ -0,0 +1,49 @@
+"""Compare two benchmark reports written by ``python -m benchmarks run``."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Medians this much slower (or faster) than the baseline are flagged.
+THRESHOLD = 0.10
+
+Key = Tuple[str, str, str]
+
+
+def load(path: str | Path) -> Dict[Key, dict]:
+    with open(path, encoding="utf-8") as stream:
+        report = json.load(stream)
+    return {(r["size"], r["group"], r["name"]): r for r in report["results"]}
+
+
+def compare(base: str | Path, head: str | Path, threshold: float = THRESHOLD) -> List[dict]:
+    """Return one row per case present in both reports, with the median ratio."""
+    before, after = load(base), load(head)
+    rows = []
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key]["median_ms"], after[key]["median_ms"]
+        ratio = new / old if old else float("inf")
+        if ratio > 1 + threshold:
+            verdict = "slower"
+        elif ratio < 1 - threshold:
+            verdict = "faster"
+        else:
+            verdict = ""
+        size, group, name = key
+        rows.append({
+            "size": size, "group": group, "name": name,
+            "base_ms": old, "head_ms": new, "ratio": ratio, "verdict": verdict,
+        })
+    return rows
+
+
+def format_table(rows: List[dict]) -> str:
+    lines = [f"{'size':8} {'group':7} {'case':45} {'base ms':>10} {'head ms':>10} {'ratio':>7}"]
+    for row in rows:
+        lines.append(
+            f"{row['size']:8} {row['group']:7} {row['name']:45} {row['base_ms']:10.3f}"
+            f" {row['head_ms']:10.3f} {row['ratio']:7.2f} {row['verdict']}".rstrip()
+        )
+    return "\n".join(lines)
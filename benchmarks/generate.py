@@ -0,0 +1,161 @@
+"""Deterministic synthetic school datasets for benchmarking.
+
+The same :class:`Dataset` and seed always produce identical data apart
+from the ``table_version`` timestamps, which record when the rows were
+written, so timings taken on different commits run against the same rows.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+import school_db
+
+FIRST_NAMES = (
+    "Ada", "Alan", "Anna", "Ben", "Chloe", "Dan", "Eva", "Farid", "Grace", "Hugo",
+    "Ines", "Jon", "Karim", "Lea", "Marta", "Nadia", "Omar", "Paul", "Rita", "Sam",
+    "Tara", "Ugo", "Vera", "Wen", "Yara", "Zoe",
+)
+LAST_NAMES = (
+    "Adams", "Benali", "Carter", "Dubois", "Evans", "Fischer", "Garcia", "Haddad",
+    "Ito", "Jensen", "Khan", "Lopez", "Martin", "Nguyen", "Okafor", "Petit",
+    "Quinn", "Rossi", "Silva", "Tanaka", "Urban", "Vidal", "Weber", "Young",
+)
+SUBJECTS = (
+    "Algebra", "Biology", "Chemistry", "Databases", "Economics", "French",
+    "Geography", "History", "Informatics", "Law", "Literature", "Mechanics",
+    "Music", "Philosophy", "Physics", "Statistics",
+)
+LEVELS = ("I", "II", "III", "Advanced", "Applied", "Seminar")
+SEMESTERS = ("2021A", "2021B", "2022A", "2022B", "2023A", "2023B", "2024A")
+# The last semester is in progress: its enrollments have no grade yet.
+CURRENT_SEMESTER = SEMESTERS[-1]
+
+# Roughly the shape of a real transcript: most passes are B or C and about
+# one completed course in ten is failed.
+GRADES = ("A", "B", "C", "D", "E", "F")
+GRADE_WEIGHTS = (14, 28, 26, 14, 8, 10)
+
+
+@dataclass(frozen=True)
+class Dataset:
+    """Row counts of a synthetic school."""
+
+    teachers: int
+    courses: int
+    programs: int
+    students: int
+    enrollments: int
+    courses_per_program: int = 12
+
+
+SIZES = {
+    "small": Dataset(teachers=20, courses=60, programs=4, students=500, enrollments=4_000),
+    "medium": Dataset(teachers=200, courses=600, programs=20, students=10_000, enrollments=100_000),
+    "large": Dataset(teachers=1_000, courses=3_000, programs=60, students=100_000, enrollments=1_000_000),
+}
+
+
+def _person(rng: random.Random) -> tuple[str, str]:
+    return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+
+def _enrollments(rng: random.Random, dataset: Dataset, program_courses: list[list[int]],
+                 student_programs: list[list[int]]) -> Iterator[tuple]:
+    """Spread ``dataset.enrollments`` rows over the students.
+
+    Students mostly take courses of their own programs, with some
+    electives, and never take the same course twice in one semester.
+    """
+    per_student, extra = divmod(dataset.enrollments, dataset.students)
+    for student in range(1, dataset.students + 1):
+        wanted = per_student + (1 if student <= extra else 0)
+        own = [c for p in student_programs[student - 1] for c in program_courses[p - 1]]
+        taken: set[tuple[int, str]] = set()
+        while len(taken) < min(wanted, dataset.courses * len(SEMESTERS)):
+            if own and rng.random() < 0.8:
+                course = rng.choice(own)
+            else:
+                course = rng.randint(1, dataset.courses)
+            semester = rng.choice(SEMESTERS)
+            if (course, semester) in taken:
+                continue
+            taken.add((course, semester))
+            if semester == CURRENT_SEMESTER:
+                status, grade = "enrolled", None
+            else:
+                grade = rng.choices(GRADES, GRADE_WEIGHTS)[0]
+                status = "failed" if grade == "F" else "completed"
+            yield student, course, semester, status, grade
+
+
+def generate(path: str | Path, dataset: Dataset, seed: int = 0) -> float:
+    """Create a fresh database at ``path`` filled with ``dataset``.
+
+    Rows are inserted with ``executemany`` in a single transaction under
+    the ``fast-bulk`` profile; the triggers maintaining counters, search
+    and statistics fire as they would in production. Returns the number
+    of seconds taken.
+    """
+    path = Path(path)
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    conn = school_db.get_connection(str(path), profile="fast-bulk")
+    try:
+        school_db.migrate(conn)
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO teacher (id, first_name, last_name, email) VALUES (?, ?, ?, ?)",
+            ((i, *name, f"{name[0]}.{name[1]}{i}@school.test".lower())
+             for i, name in ((i, _person(rng)) for i in range(1, dataset.teachers + 1))),
+        )
+        conn.executemany(
+            "INSERT INTO course (id, name, credits, teacher_id) VALUES (?, ?, ?, ?)",
+            ((i, f"{rng.choice(SUBJECTS)} {rng.choice(LEVELS)} {i}", rng.choice((2, 3, 3, 4, 6)),
+              rng.randint(1, dataset.teachers) if rng.random() < 0.95 else None)
+             for i in range(1, dataset.courses + 1)),
+        )
+        conn.executemany(
+            "INSERT INTO program (id, name, description) VALUES (?, ?, ?)",
+            ((i, f"Program {i}", f"Synthetic program {i}") for i in range(1, dataset.programs + 1)),
+        )
+        per_program = min(dataset.courses_per_program, dataset.courses)
+        program_courses = [
+            sorted(rng.sample(range(1, dataset.courses + 1), per_program))
+            for _ in range(dataset.programs)
+        ]
+        conn.executemany(
+            "INSERT INTO program_course (program_id, course_id) VALUES (?, ?)",
+            ((p, c) for p, courses in enumerate(program_courses, start=1) for c in courses),
+        )
+        conn.executemany(
+            "INSERT INTO student (id, first_name, last_name, student_number, email)"
+            " VALUES (?, ?, ?, ?, ?)",
+            ((i, *name, f"S{i:07d}", f"s{i:07d}@students.test" if rng.random() < 0.9 else None)
+             for i, name in ((i, _person(rng)) for i in range(1, dataset.students + 1))),
+        )
+        student_programs = [
+            rng.sample(range(1, dataset.programs + 1), min(dataset.programs, 2 if rng.random() < 0.1 else 1))
+            if dataset.programs else []
+            for _ in range(dataset.students)
+        ]
+        conn.executemany(
+            "INSERT INTO student_program (student_id, program_id, start_date) VALUES (?, ?, ?)",
+            ((s, p, f"{rng.choice((2021, 2022, 2023))}-09-01")
+             for s, programs in enumerate(student_programs, start=1) for p in programs),
+        )
+        conn.executemany(
+            "INSERT INTO enrollment (student_id, course_id, semester, status, grade)"
+            " VALUES (?, ?, ?, ?, ?)",
+            _enrollments(rng, dataset, program_courses, student_programs),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return time.perf_counter() - started
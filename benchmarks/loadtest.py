@@ -0,0 +1,376 @@
+"""Registration-day load tests against locally started uvicorn servers.
+
+Both web apps are started as separate uvicorn processes on one synthetic
+database, as in production, and hammered by asyncio "virtual users" that
+each keep one HTTP/1.1 connection open and send requests back to back::
+
+    python -m benchmarks loadtest registration-rush --users 200 --duration 30
+
+A scenario is a weighted mix of steps. The report gives throughput,
+latency percentiles and error counts per step; server tracebacks that
+mention ``database is locked`` are counted from the uvicorn logs.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from benchmarks.generate import SIZES, generate
+
+ROOT = Path(__file__).resolve().parents[1]
+APPS = {"api": "api:app", "app": "app:app"}
+LOCKED = "database is locked"
+# Dataset semesters end in 2024, so registrations for this one never
+# collide with generated rows.
+RUSH_SEMESTER = "2025A"
+
+
+@dataclass
+class Request:
+    app: str
+    method: str
+    path: str
+    body: bytes = b""
+    content_type: Optional[str] = None
+
+
+def _json(app: str, path: str, payload: dict) -> Request:
+    return Request(app, "POST", path, json.dumps(payload).encode(), "application/json")
+
+
+def _form(app: str, path: str, fields: dict) -> Request:
+    return Request(app, "POST", path, urlencode(fields).encode(), "application/x-www-form-urlencoded")
+
+
+class Fixture:
+    """Ids from the generated database that scenario steps draw from."""
+
+    def __init__(self, db_path: str) -> None:
+        conn = sqlite3.connect(db_path)
+        try:
+            self.students = conn.execute("SELECT COUNT(*) FROM student").fetchone()[0]
+            self.courses = conn.execute("SELECT COUNT(*) FROM course").fetchone()[0]
+            self.programs = conn.execute("SELECT COUNT(*) FROM program").fetchone()[0]
+            self.graded: List[Tuple[int, int, int]] = conn.execute(
+                "SELECT c.teacher_id, e.course_id, e.id FROM enrollment e"
+                " JOIN course c ON c.id = e.course_id"
+                " WHERE c.teacher_id IS NOT NULL AND e.semester = '2024A'"
+            ).fetchall()
+            self.teachers = [row[0] for row in conn.execute(
+                "SELECT id FROM teacher ORDER BY enrollment_count DESC LIMIT 50")]
+        finally:
+            conn.close()
+        self._registrations = itertools.count()
+
+    def registration(self) -> Tuple[int, int]:
+        """A (student, course) pair not registered for ``RUSH_SEMESTER`` yet.
+
+        Pair ``k`` is student ``k mod S`` with course ``k div S + student``
+        (mod C), so pairs never repeat within the first ``S * C`` calls.
+        """
+        k = next(self._registrations)
+        student, round_ = k % self.students, k // self.students
+        return student + 1, (round_ + student) % self.courses + 1
+
+
+Step = Callable[[Fixture, random.Random], Request]
+
+
+def _register_api(f: Fixture, rng: random.Random) -> Request:
+    student, course = f.registration()
+    return _json("api", "/enrollments",
+                 {"student_id": student, "course_id": course, "semester": RUSH_SEMESTER})
+
+
+def _register_app(f: Fixture, rng: random.Random) -> Request:
+    student, course = f.registration()
+    return _form("app", "/enroll",
+                 {"student_id": student, "course_id": course, "semester": RUSH_SEMESTER})
+
+
+def _browse_courses(f: Fixture, rng: random.Random) -> Request:
+    return Request("api", "GET", f"/courses?limit=50&name={rng.choice('ABCDEFGHILMP')}")
+
+
+def _student_enrollments(f: Fixture, rng: random.Random) -> Request:
+    return Request("app", "GET", f"/students/{rng.randint(1, f.students)}/enrollments")
+
+
+def _post_grade(f: Fixture, rng: random.Random) -> Request:
+    teacher, course, enrollment = rng.choice(f.graded)
+    return _form("app", f"/teachers/{teacher}/courses/{course}/grades",
+                 {f"grade-{enrollment}": rng.choice("ABBCCCDEF")})
+
+
+def _grade_sheet(f: Fixture, rng: random.Random) -> Request:
+    teacher, course, _ = rng.choice(f.graded)
+    return Request("app", "GET", f"/teachers/{teacher}/courses/{course}/grades")
+
+
+def _teacher_page(f: Fixture, rng: random.Random) -> Request:
+    return Request("app", "GET", f"/teachers/{rng.choice(f.teachers)}")
+
+
+def _popular_courses(f: Fixture, rng: random.Random) -> Request:
+    return Request("app", "GET", "/api/analytics/popular-courses")
+
+
+def _popular_teachers(f: Fixture, rng: random.Random) -> Request:
+    return Request("app", "GET", "/api/analytics/popular-teachers")
+
+
+def _progress(f: Fixture, rng: random.Random) -> Request:
+    return Request("app", "GET", f"/progress?student_id={rng.randint(1, f.students)}"
+                                 f"&program_id={rng.randint(1, f.programs)}")
+
+
+# name -> [(weight, step name, step)]
+SCENARIOS: Dict[str, List[Tuple[int, str, Step]]] = {
+    "registration-rush": [
+        (45, "POST api /enrollments", _register_api),
+        (45, "POST app /enroll", _register_app),
+        (5, "GET api /courses", _browse_courses),
+        (5, "GET app /students/{id}/enrollments", _student_enrollments),
+    ],
+    "grade-entry-burst": [
+        (80, "POST app grade", _post_grade),
+        (20, "GET app grade sheet", _grade_sheet),
+    ],
+    "dashboard-polling": [
+        (35, "GET app popular-courses", _popular_courses),
+        (35, "GET app popular-teachers", _popular_teachers),
+        (20, "GET app /teachers/{id}", _teacher_page),
+        (10, "GET app /progress", _progress),
+    ],
+}
+
+
+class Connection:
+    """A minimal keep-alive HTTP/1.1 client connection."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host, self.port = host, port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, req: Request) -> Tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = [f"{req.method} {req.path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        if req.method != "GET":
+            head.append(f"Content-Length: {len(req.body)}")
+        if req.content_type:
+            head.append(f"Content-Type: {req.content_type}")
+        self.writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + req.body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("server closed the connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding") == "chunked":
+            body = bytearray()
+            while size := int((await self.reader.readline()).split(b";")[0], 16):
+                body += await self.reader.readexactly(size)
+                await self.reader.readline()
+            await self.reader.readline()
+        else:
+            body = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection") == "close":
+            await self.close()
+        return status, bytes(body)
+
+
+@dataclass
+class StepStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: Counter = field(default_factory=Counter)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _summary(latencies: List[float], errors: Counter, seconds: float) -> dict:
+    requests = len(latencies)
+    failed = sum(errors.values())
+    ms = [value * 1000 for value in latencies] or [0.0]
+    return {
+        "requests": requests,
+        "throughput_rps": round(requests / seconds, 1),
+        "p50_ms": round(_percentile(ms, 50), 2),
+        "p95_ms": round(_percentile(ms, 95), 2),
+        "p99_ms": round(_percentile(ms, 99), 2),
+        "mean_ms": round(statistics.fmean(ms), 2),
+        "max_ms": round(max(ms), 2),
+        "errors": dict(errors),
+        "error_rate": round(failed / requests, 4) if requests else 0.0,
+    }
+
+
+async def _user(ports: Dict[str, int], steps, fixture: Fixture, rng: random.Random,
+                deadline: float, stats: Dict[str, StepStats]) -> None:
+    connections = {app: Connection("127.0.0.1", port) for app, port in ports.items()}
+    weights = [weight for weight, _, _ in steps]
+    try:
+        while time.perf_counter() < deadline:
+            _, name, step = rng.choices(steps, weights)[0]
+            req = step(fixture, rng)
+            conn = connections[req.app]
+            started = time.perf_counter()
+            try:
+                status, body = await conn.request(req)
+            except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+                await conn.close()
+                error: Optional[str] = type(exc).__name__
+            else:
+                error = None
+                if status >= 400:
+                    error = LOCKED if LOCKED.encode() in body else f"HTTP {status}"
+            stats[name].latencies.append(time.perf_counter() - started)
+            if error:
+                stats[name].errors[error] += 1
+    finally:
+        for conn in connections.values():
+            await conn.close()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(app: str, port: int, db_path: str, log) -> subprocess.Popen:
+    env = {**os.environ, "SCHOOL_DB_PATH": db_path}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", APPS[app], "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def _wait_for(port: int, server: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"uvicorn did not listen on port {port} within {timeout}s")
+
+
+async def _drive(scenario: str, ports: Dict[str, int], fixture: Fixture,
+                 users: int, duration: float, seed: int) -> Tuple[Dict[str, StepStats], float]:
+    steps = SCENARIOS[scenario]
+    stats = {name: StepStats() for _, name, _ in steps}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        _user(ports, steps, fixture, random.Random(seed * 100_003 + n), deadline, stats)
+        for n in range(users)
+    ))
+    return stats, time.perf_counter() - started
+
+
+def run(
+    scenario: str,
+    users: int = 100,
+    duration: float = 20.0,
+    size: str = "medium",
+    seed: int = 0,
+    db_path: Optional[str] = None,
+) -> dict:
+    """Run ``scenario`` against fresh uvicorn servers and return a report.
+
+    A database of the given ``size`` is generated unless ``db_path``
+    names an existing one; the servers use whatever ``SCHOOL_DB_*``
+    settings are in the environment.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        if db_path is None:
+            db_path = str(Path(tmp) / "loadtest.db")
+            generate(db_path, SIZES[size], seed)
+        fixture = Fixture(db_path)
+        ports = {app: _free_port() for app in APPS}
+        log_path = Path(tmp) / "uvicorn.log"
+        with open(log_path, "wb") as log:
+            servers = [_start_server(app, port, db_path, log) for app, port in ports.items()]
+            try:
+                for port, server in zip(ports.values(), servers):
+                    _wait_for(port, server)
+                stats, seconds = asyncio.run(
+                    _drive(scenario, ports, fixture, users, duration, seed))
+            finally:
+                for server in servers:
+                    server.terminate()
+                for server in servers:
+                    try:
+                        server.wait(timeout=10)
+                    except subprocess.TimeoutExpired:
+                        server.kill()
+        server_log = log_path.read_text(errors="replace")
+
+    latencies = [value for s in stats.values() for value in s.latencies]
+    errors = sum((s.errors for s in stats.values()), Counter())
+    return {
+        "scenario": scenario,
+        "users": users,
+        "duration_s": round(seconds, 2),
+        "seed": seed,
+        "settings": {k: v for k, v in os.environ.items() if k.startswith("SCHOOL_")},
+        "total": _summary(latencies, errors, seconds),
+        "steps": {name: _summary(s.latencies, s.errors, seconds) for name, s in stats.items()},
+        "server_locked_errors": server_log.count(LOCKED),
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"{report['scenario']}: {report['users']} users for {report['duration_s']}s,"
+        f" {report['server_locked_errors']} '{LOCKED}' errors in the server logs",
+        f"{'step':38} {'reqs':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}",
+    ]
+    rows = [*report["steps"].items(), ("total", report["total"])]
+    for name, s in rows:
+        lines.append(
+            f"{name:38} {s['requests']:7} {s['throughput_rps']:8.1f} {s['p50_ms']:8.1f}"
+            f" {s['p95_ms']:8.1f} {s['p99_ms']:8.1f} {s['error_rate']:7.2%}"
+        )
+        for error, count in sorted(s["errors"].items()):
+            lines.append(f"    {error}: {count}")
+    return "\n".join(lines)
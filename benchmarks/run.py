@@ -0,0 +1,374 @@
+"""Time the service layer, the CLI and the HTTP endpoints on synthetic data.
+
+Each case is run once to warm up and then ``repeat`` times; the recorded
+statistics are per call, in milliseconds. Write cases insert fresh rows
+on every run, so later cases see a database that grew slightly — the
+growth is the same on every commit, which keeps results comparable.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import itertools
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Optional
+
+import school_db
+import school_service as svc
+from benchmarks.generate import SIZES, Dataset, generate
+
+GROUPS = ("service", "cli", "http")
+REPEAT = 5
+
+
+@dataclass
+class Case:
+    group: str
+    name: str
+    run: Callable[[], Any]
+    # Called before every timed run, outside the timing.
+    setup: Optional[Callable[[], None]] = None
+
+
+@dataclass
+class Result:
+    size: str
+    group: str
+    name: str
+    runs: int
+    min_ms: float
+    median_ms: float
+    mean_ms: float
+    max_ms: float
+    rows: Optional[int]
+
+
+def _rows(value: Any) -> Optional[int]:
+    if isinstance(value, (list, tuple)):
+        return len(value)
+    return None
+
+
+def _drain(rows: Iterable) -> int:
+    return sum(1 for _ in rows)
+
+
+def time_case(case: Case, size: str, repeat: int = REPEAT) -> Result:
+    if case.setup:
+        case.setup()
+    case.run()
+    timings = []
+    value = None
+    for _ in range(repeat):
+        if case.setup:
+            case.setup()
+        started = time.perf_counter()
+        value = case.run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return Result(
+        size=size,
+        group=case.group,
+        name=case.name,
+        runs=repeat,
+        min_ms=round(min(timings), 4),
+        median_ms=round(statistics.median(timings), 4),
+        mean_ms=round(statistics.fmean(timings), 4),
+        max_ms=round(max(timings), 4),
+        rows=value if isinstance(value, int) and not isinstance(value, bool) else _rows(value),
+    )
+
+
+class Sample:
+    """Ids of existing rows to query, picked the same way on every run."""
+
+    def __init__(self, dataset: Dataset) -> None:
+        self.teacher_id = max(1, dataset.teachers // 2)
+        self.student_id = max(1, dataset.students // 2)
+        self.program_id = 1
+        with school_db.db_connection() as conn:
+            self.course_id = conn.execute(
+                "SELECT course_id FROM program_course WHERE program_id = 1"
+                " ORDER BY course_id LIMIT 1"
+            ).fetchone()[0]
+            self.enrollment_id = conn.execute(
+                "SELECT id FROM enrollment WHERE student_id = ? ORDER BY id LIMIT 1",
+                (self.student_id,),
+            ).fetchone()[0]
+        self.student_ids = list(range(1, min(dataset.students, 100) + 1))
+        self.course_ids = list(range(1, min(dataset.courses, 100) + 1))
+        second_page = svc.list_students(limit=svc.PAGE_SIZE)
+        self.student_cursor = svc.page_cursor(second_page, svc.PAGE_SIZE, svc.STUDENT_KEYS)
+        self._serial = itertools.count(1)
+
+    def serial(self) -> int:
+        """A number never handed out before, for rows that must be unique."""
+        return next(self._serial)
+
+
+def service_cases(sample: Sample) -> List[Case]:
+    s = sample
+
+    def case(name: str, run: Callable[[], Any], setup: Optional[Callable[[], None]] = None) -> Case:
+        return Case("service", name, run, setup)
+
+    def new_student() -> int:
+        n = s.serial()
+        return svc.add_student("Bench", "Student", f"B{n:09d}", None)
+
+    def enroll_new() -> int:
+        return svc.enroll_student_in_course(s.student_id, s.course_id, f"B{s.serial()}")
+
+    def enroll_batch() -> list:
+        semester = f"B{s.serial()}"
+        return svc.enroll_students_in_courses(
+            [(student_id, s.course_id, semester) for student_id in s.student_ids]
+        )
+
+    def import_students() -> int:
+        base = s.serial() * 1000
+        records = (
+            {"first_name": "Bulk", "last_name": "Import", "student_number": f"I{base + i:09d}"}
+            for i in range(1000)
+        )
+        return svc.import_records("students", records).inserted
+
+    # Rows created by a case's setup for its timed run to consume.
+    fresh: List[int] = []
+
+    def add_fresh() -> None:
+        fresh.append(new_student())
+
+    def add_fresh_course() -> None:
+        fresh.append(svc.add_course("Bench", 3, None))
+
+    cases = [
+        case("list_teachers", lambda: svc.list_teachers()),
+        case("list_teachers[last_name]", lambda: svc.list_teachers(last_name="Ma")),
+        case("get_teacher", lambda: svc.get_teacher(s.teacher_id)),
+        case("get_teacher_courses", lambda: svc.get_teacher_courses(s.teacher_id)),
+        case("get_teacher_students", lambda: svc.get_teacher_students(s.teacher_id)),
+        case("get_teacher_evaluations", lambda: svc.get_teacher_evaluations(s.teacher_id)),
+        case("get_teacher_dashboard", lambda: svc.get_teacher_dashboard(s.teacher_id)),
+        case("list_courses", lambda: svc.list_courses()),
+        case("list_courses[teacher_id]", lambda: svc.list_courses(teacher_id=s.teacher_id)),
+        case("get_course", lambda: svc.get_course(s.course_id)),
+        case("get_courses_by_ids", lambda: svc.get_courses_by_ids(s.course_ids)),
+        case("get_enrollments_for_course", lambda: svc.get_enrollments_for_course(s.course_id)),
+        case("list_programs", lambda: svc.list_programs()),
+        case("get_program", lambda: svc.get_program(s.program_id)),
+        case("list_students", lambda: svc.list_students()),
+        case("list_students[page 2]", lambda: svc.list_students(after=s.student_cursor)),
+        case("list_students[last_name]", lambda: svc.list_students(last_name="Ng")),
+        case("get_student", lambda: svc.get_student(s.student_id)),
+        case("get_students_by_ids", lambda: svc.get_students_by_ids(s.student_ids)),
+        case("get_student_enrollments", lambda: svc.get_student_enrollments(s.student_id)),
+        case("get_student_grades", lambda: svc.get_student_grades(s.student_id)),
+        case("get_enrollment", lambda: svc.get_enrollment(s.enrollment_id)),
+        case("get_student_progress", lambda: svc.get_student_progress(s.student_id, s.program_id)),
+        case("get_program_progress", lambda: svc.get_program_progress(s.program_id)),
+        case("search[student]", lambda: svc.search("student", "ma")),
+        case("search[teacher]", lambda: svc.search("teacher", "ngu")),
+        case("search[course]", lambda: svc.search("course", "phys")),
+        case("get_data_version", lambda: svc.get_data_version("course", "enrollment")),
+        case("get_most_popular_courses", svc.get_most_popular_courses, svc.analytics_cache.clear),
+        case("get_most_popular_courses[cached]", svc.get_most_popular_courses),
+        case("get_most_popular_teachers", svc.get_most_popular_teachers, svc.analytics_cache.clear),
+        case("get_best_students", svc.get_best_students, svc.analytics_cache.clear),
+        case("get_at_risk_students", svc.get_at_risk_students, svc.analytics_cache.clear),
+        *(
+            case(f"export[{entity}]", lambda export=export: _drain(export()))
+            for entity, export in svc.EXPORTS.items()
+        ),
+        case("add_teacher", lambda: svc.add_teacher("Bench", "Teacher", None)),
+        case("update_teacher", lambda: svc.update_teacher(s.teacher_id, "Bench", "Teacher", None)),
+        case("add_course", lambda: svc.add_course("Bench course", 3, s.teacher_id)),
+        case("add_program", lambda: svc.add_program("Bench program", None)),
+        case("assign_course_to_program",
+             lambda: svc.assign_course_to_program(s.program_id, fresh.pop()), add_fresh_course),
+        case("add_student", new_student),
+        case("add_students[100]", lambda: svc.add_students(
+            [("Bench", "Batch", f"C{s.serial():09d}", None) for _ in range(100)])),
+        case("update_student", lambda: svc.update_student(
+            s.student_id, "Bench", "Student", f"S{s.student_id:07d}", None)),
+        case("delete_student", lambda: svc.delete_student(fresh.pop()), add_fresh),
+        case("enroll_student_in_program",
+             lambda: svc.enroll_student_in_program(fresh.pop(), s.program_id), add_fresh),
+        case("enroll_student_in_course", enroll_new),
+        case("enroll_students_in_courses[100]", enroll_batch),
+        case("record_grade", lambda: svc.record_grade(s.enrollment_id, "B", "completed")),
+        case("import_records[students x1000]", import_students),
+        case("rebuild_enrollment_counts", svc.rebuild_enrollment_counts),
+        case("rebuild_student_stats", svc.rebuild_student_stats),
+    ]
+    return cases
+
+
+def cli_cases(sample: Sample) -> List[Case]:
+    """Run ``main.py`` commands in-process with their output discarded.
+
+    In-process runs measure the command itself rather than interpreter
+    start-up, which would dwarf the differences worth tracking.
+    """
+    import main
+
+    s = sample
+
+    def command(*argv: Any) -> Callable[[], None]:
+        def run() -> None:
+            saved = sys.argv
+            sys.argv = ["main.py", *map(str, argv)]
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    main.main()
+            finally:
+                sys.argv = saved
+        return run
+
+    return [
+        Case("cli", "list-teachers", command("list-teachers")),
+        Case("cli", "list-courses", command("list-courses")),
+        Case("cli", "list-students", command("list-students")),
+        Case("cli", "student-progress", command("student-progress", s.student_id, s.program_id)),
+        Case("cli", "program-progress", command("program-progress", s.program_id)),
+        Case("cli", "popular-courses", command("popular-courses"), svc.analytics_cache.clear),
+        Case("cli", "best-students", command("best-students"), svc.analytics_cache.clear),
+        Case("cli", "export enrollments", command("export", "enrollments", "--output", os.devnull)),
+        Case("cli", "add-teacher", command("add-teacher", "Bench", "Cli", "cli@bench.test")),
+        Case("cli", "record-grade", command("record-grade", s.enrollment_id, "A", "completed")),
+    ]
+
+
+def http_cases(sample: Sample, stack: contextlib.ExitStack) -> List[Case]:
+    """Drive both FastAPI apps through the in-process test client.
+
+    Returns no cases when FastAPI (or its test client) is not installed.
+    """
+    try:
+        from fastapi.testclient import TestClient
+        import api
+        import app
+    except ImportError as exc:
+        print(f"skipping http benchmarks: {exc}", file=sys.stderr)
+        return []
+
+    s = sample
+    api_client = stack.enter_context(TestClient(api.app))
+    app_client = stack.enter_context(TestClient(app.app))
+
+    def call(client, method: str, url: str, **kwargs: Any) -> Callable[[], int]:
+        def run() -> int:
+            response = client.request(method, url, **kwargs)
+            response.raise_for_status()
+            return len(response.content)
+        return run
+
+    def post_enrollment() -> int:
+        body = {"student_id": s.student_id, "course_id": s.course_id, "semester": f"H{s.serial()}"}
+        return call(api_client, "POST", "/enrollments", json=body)()
+
+    ids = ",".join(map(str, s.student_ids))
+    cases = [
+        ("api GET /teachers", call(api_client, "GET", "/teachers")),
+        ("api GET /courses", call(api_client, "GET", "/courses")),
+        ("api GET /students", call(api_client, "GET", "/students")),
+        ("api GET /students?ids", call(api_client, "GET", f"/students?ids={ids}")),
+        ("api GET /programs/{id}/progress",
+         call(api_client, "GET", f"/programs/{s.program_id}/progress")),
+        ("api GET /export/enrollments", call(api_client, "GET", "/export/enrollments")),
+        ("api POST /teachers",
+         call(api_client, "POST", "/teachers", json={"first_name": "Bench", "last_name": "Api"})),
+        ("api POST /enrollments", post_enrollment),
+        ("app GET /teachers", call(app_client, "GET", "/teachers")),
+        ("app GET /teachers/{id}", call(app_client, "GET", f"/teachers/{s.teacher_id}")),
+        ("app GET /teachers/{id}/courses/{id}/grades",
+         call(app_client, "GET", f"/teachers/{s.teacher_id}/courses/{s.course_id}/grades")),
+        ("app GET /students", call(app_client, "GET", "/students")),
+        ("app GET /courses", call(app_client, "GET", "/courses")),
+        ("app GET /progress",
+         call(app_client, "GET", f"/progress?student_id={s.student_id}&program_id={s.program_id}")),
+        ("app GET /api/search", call(app_client, "GET", "/api/search?type=student&q=ma")),
+        ("app GET /api/analytics/popular-courses",
+         call(app_client, "GET", "/api/analytics/popular-courses")),
+    ]
+    return [Case("http", name, run) for name, run in cases]
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    sizes: Iterable[str],
+    groups: Iterable[str] = GROUPS,
+    repeat: int = REPEAT,
+    seed: int = 0,
+    workdir: Optional[str] = None,
+    datasets: Optional[dict] = None,
+) -> dict:
+    """Benchmark every requested group on each dataset size.
+
+    Returns a JSON-serialisable report; ``datasets`` maps extra size
+    names to custom :class:`Dataset` instances.
+    """
+    datasets = {**SIZES, **(datasets or {})}
+    groups = list(groups)
+    report = {
+        "meta": {
+            "commit": _commit(),
+            "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "profile": school_db.PROFILE,
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "datasets": {},
+        "results": [],
+    }
+    saved_db = school_db.DB_NAME
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for size in sizes:
+            dataset = datasets[size]
+            path = str(Path(tmp) / f"{size}.db")
+            seconds = generate(path, dataset, seed)
+            report["datasets"][size] = {**asdict(dataset), "generate_seconds": round(seconds, 3)}
+            print(f"{size}: generated in {seconds:.2f}s", file=sys.stderr)
+            school_db.DB_NAME = path
+            svc.analytics_cache.clear()
+            try:
+                with contextlib.ExitStack() as stack:
+                    sample = Sample(dataset)
+                    cases: List[Case] = []
+                    if "service" in groups:
+                        cases += service_cases(sample)
+                    if "cli" in groups:
+                        cases += cli_cases(sample)
+                    if "http" in groups:
+                        cases += http_cases(sample, stack)
+                    for case in cases:
+                        result = time_case(case, size, repeat)
+                        report["results"].append(asdict(result))
+                        print(f"  {case.group:7} {case.name:45} {result.median_ms:10.3f} ms",
+                              file=sys.stderr)
+            finally:
+                school_db.close_pools()
+                school_db.DB_NAME = saved_db
+    return report
@@ -1,8 +1,14 @@
 import argparse
+import sys
 from datetime import datetime
 
-from school_db import get_connection, init_db
+import school_profiler
+from school_db import PROFILE, current_settings, db_connection, ensure_schema
+from school_io import FORMATS, read_records, write_rows
 from school_service import (
+    EXPORTS,
+    IMPORT_BATCH_SIZE,
+    IMPORT_ENTITIES,
     add_course,
     add_program,
     add_student,
@@ -14,12 +20,17 @@ from school_service import (
     get_best_students,
     get_most_popular_courses,
     get_most_popular_teachers,
+    rebuild_enrollment_counts,
+    rebuild_student_stats,
     get_student_progress,
+    iter_program_progress,
+    import_records,
     list_courses,
     list_programs,
     list_students,
     list_teachers,
     record_grade,
+    record_grades,
 )
 
 
@@ -29,6 +40,8 @@ def main() -> None:
 
     sub.add_parser("init-db")
 
+    sub.add_parser("db-settings", help="show the active SQLite performance profile")
+
     p = sub.add_parser("add-teacher")
     p.add_argument("first")
     p.add_argument("last")
@@ -76,27 +89,73 @@ def main() -> None:
     p.add_argument("grade")
     p.add_argument("status")
 
+    p = sub.add_parser("record-grades", help="record many grades from a CSV or JSONL file")
+    p.add_argument("file", help="records with enrollment_id, grade and optionally status")
+    p.add_argument("--course-id", type=int, help="reject enrollments of other courses")
+    p.add_argument("--format", choices=FORMATS, help="default: from file extension")
+
     p = sub.add_parser("student-progress")
     p.add_argument("student_id", type=int)
     p.add_argument("program_id", type=int)
 
+    p = sub.add_parser("program-progress", help="progress of every student in a program")
+    p.add_argument("program_id", type=int)
+    p.add_argument("--format", choices=FORMATS, default="csv")
+
     p = sub.add_parser("popular-courses")
     p.add_argument("limit", type=int, nargs="?", default=5)
 
     p = sub.add_parser("popular-teachers")
     p.add_argument("limit", type=int, nargs="?", default=5)
 
+    sub.add_parser("rebuild-counters", help="recompute enrollment counters and student statistics")
+
     p = sub.add_parser("best-students")
     p.add_argument("limit", type=int, nargs="?", default=5)
 
     p = sub.add_parser("at-risk-students")
     p.add_argument("limit", type=int, nargs="?", default=5)
 
+    p = sub.add_parser("import", help="bulk load records from a CSV or JSONL file")
+    p.add_argument("entity", choices=IMPORT_ENTITIES)
+    p.add_argument("file")
+    p.add_argument("--format", choices=FORMATS, help="default: from file extension")
+    p.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    p = sub.add_parser("export", help="stream all records of an entity as CSV or NDJSON")
+    p.add_argument("entity", choices=sorted(EXPORTS))
+    p.add_argument("--format", choices=FORMATS, default="csv")
+    p.add_argument("--output", help="file to write (default: standard output)")
+
+    p = sub.add_parser("profile-report", help="hottest functions of the profiled web requests")
+    p.add_argument("--dir", default=school_profiler.PROFILE_DIR)
+    p.add_argument("--route", help="only routes containing this text")
+    p.add_argument("--top", type=int, default=15)
+
     args = parser.parse_args()
 
+    if args.command == "profile-report":
+        entries = [
+            entry for entry in school_profiler.load(args.dir)
+            if args.route is None or args.route in entry["route"]
+        ]
+        if not entries:
+            sys.exit(f"no profiles found in {args.dir}")
+        print(school_profiler.format_summary(
+            school_profiler.summarize(entry, args.top) for entry in entries
+        ))
+        return
+
+    if args.command is not None:
+        version = ensure_schema()
+
     if args.command == "init-db":
-        conn = get_connection()
-        init_db(conn)
+        print(f"schema version {version}")
+    elif args.command == "db-settings":
+        print(f"profile={PROFILE}")
+        with db_connection() as conn:
+            for pragma, value in current_settings(conn).items():
+                print(f"{pragma}={value}")
     elif args.command == "add-teacher":
         add_teacher(args.first, args.last, args.email)
     elif args.command == "list-teachers":
@@ -126,21 +185,50 @@ def main() -> None:
         enroll_student_in_course(args.student_id, args.course_id, args.semester)
     elif args.command == "record-grade":
         record_grade(args.enrollment_id, args.grade, args.status)
+    elif args.command == "record-grades":
+        results = record_grades(read_records(args.file, args.format), args.course_id)
+        for line, result in enumerate(results, start=1):
+            if result is not None:
+                print(f"rejected record {line}: {result}", file=sys.stderr)
+        rejected = sum(result is not None for result in results)
+        print(f"recorded={len(results) - rejected} rejected={rejected}")
     elif args.command == "student-progress":
         passed, remaining, failed = get_student_progress(args.student_id, args.program_id)
         print(f"passed={passed} remaining={remaining} failed={failed}")
+    elif args.command == "program-progress":
+        write_rows(iter_program_progress(args.program_id), sys.stdout, args.format)
     elif args.command == "popular-courses":
         for row in get_most_popular_courses(args.limit):
             print(dict(row))
     elif args.command == "popular-teachers":
         for row in get_most_popular_teachers(args.limit):
             print(dict(row))
+    elif args.command == "rebuild-counters":
+        rebuild_enrollment_counts()
+        rebuild_student_stats()
     elif args.command == "best-students":
         for row in get_best_students(args.limit):
             print(dict(row))
     elif args.command == "at-risk-students":
         for row in get_at_risk_students(args.limit):
             print(dict(row))
+    elif args.command == "import":
+        result = import_records(
+            args.entity, read_records(args.file, args.format), args.batch_size
+        )
+        for line, reason in sorted(result.rejected):
+            print(f"rejected record {line}: {reason}", file=sys.stderr)
+        print(
+            f"inserted={result.inserted} rejected={len(result.rejected)} "
+            f"seconds={result.seconds:.2f} rows_per_sec={result.rows_per_second:.0f}"
+        )
+    elif args.command == "export":
+        rows = EXPORTS[args.entity]()
+        if args.output:
+            with open(args.output, "w", newline="", encoding="utf-8") as stream:
+                write_rows(rows, stream, args.format)
+        else:
+            write_rows(rows, sys.stdout, args.format)
     else:
         parser.print_help()
 
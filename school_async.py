@@ -0,0 +1,68 @@
+"""Asyncio facade over :mod:`school_service` for the FastAPI web UI.
+
+SQLite calls block, so running them directly in ``async def`` handlers
+stalls the event loop. :class:`AsyncService` runs every service function
+on a dedicated, bounded thread pool instead::
+
+    db = AsyncService()
+    teachers = await db.list_teachers(limit=50)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from types import ModuleType
+from typing import Any, Callable
+
+import school_db
+import school_service
+
+# Each worker holds one pooled connection while it runs, so more workers
+# than pooled connections would only queue inside the pool.
+DB_WORKERS = int(os.environ.get("SCHOOL_DB_WORKERS", str(school_db.POOL_SIZE)))
+
+
+class AsyncService:
+    """Expose the functions of ``service`` as coroutines run on a thread pool."""
+
+    def __init__(self, service: ModuleType = school_service, workers: int = DB_WORKERS) -> None:
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self._service = service
+        self.workers = workers
+        self._executor: ThreadPoolExecutor | None = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="school-db"
+            )
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``fn(*args, **kwargs)`` on the pool, preserving context variables."""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        return await loop.run_in_executor(self._get_executor(), call)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._service, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return await self.run(attr, *args, **kwargs)
+
+        setattr(self, name, call)
+        return call
+
+    def shutdown(self) -> None:
+        """Wait for running calls to finish and stop the worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,101 @@
+"""Small in-process cache for expensive, frequently repeated queries."""
+
+from __future__ import annotations
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds.
+
+    :meth:`cached` memoizes a function by its arguments. :meth:`clear`
+    drops every entry; a result that was being computed while the cache
+    was cleared is returned to its caller but not stored, so a write
+    that invalidates the cache can never be masked by an older read.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        """Return ``(True, value)`` for a live entry, else ``(False, None)``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any, generation: int | None = None) -> None:
+        """Store ``value`` unless the cache was cleared since ``generation``."""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
+
+    def cached(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """Decorate ``fn`` so that results are cached per argument tuple.
+
+        List results are copied on the way out so callers cannot modify
+        the cached value.
+        """
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not self.enabled:
+                return fn(*args, **kwargs)
+            key = (fn.__qualname__, args, tuple(sorted(kwargs.items())))
+            hit, value = self.get(key)
+            if not hit:
+                generation = self._generation
+                value = fn(*args, **kwargs)
+                self.set(key, value, generation)
+            return list(value) if isinstance(value, list) else value
+
+        return wrapper
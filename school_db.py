@@ -1,34 +1,718 @@
+import contextvars
+import os
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future
 from contextlib import contextmanager
 from pathlib import Path
+from typing import Any, Callable, Iterator, NamedTuple, TypeVar
 
-DB_NAME = 'school.db'
+import school_profiler
+import school_slowlog
 
+T = TypeVar('T')
 
-def get_connection(db_path: str | Path | None = None) -> sqlite3.Connection:
-    """Return a SQLite connection with Row factory."""
+DB_NAME = os.environ.get('SCHOOL_DB_PATH', 'school.db')
+POOL_SIZE = int(os.environ.get('SCHOOL_DB_POOL_SIZE', '5'))
+POOL_TIMEOUT = float(os.environ.get('SCHOOL_DB_POOL_TIMEOUT', '30'))
+# Group commit: writes submitted with write_grouped() within this many
+# milliseconds of each other (up to GROUP_COMMIT_MAX_OPS) share one
+# transaction, and so one fsync. 0 commits every write on its own.
+GROUP_COMMIT_MS = float(os.environ.get('SCHOOL_DB_GROUP_COMMIT_MS', '0'))
+GROUP_COMMIT_MAX_OPS = int(os.environ.get('SCHOOL_DB_GROUP_COMMIT_MAX_OPS', '500'))
+
+# Connection settings applied as PRAGMAs to every new connection, in order.
+# All profiles use WAL so that writers do not block readers; they differ in
+# how much durability they trade for write throughput. busy_timeout comes
+# first so that switching to WAL waits for other connections' locks instead
+# of failing at once with "database is locked".
+PROFILES: dict[str, dict[str, str | int]] = {
+    'durable': {
+        'busy_timeout': 5000,
+        'journal_mode': 'wal',
+        'synchronous': 'full',
+        'cache_size': -16000,
+        'mmap_size': 0,
+        'temp_store': 'default',
+    },
+    'balanced': {
+        'busy_timeout': 5000,
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'memory',
+    },
+    'fast-bulk': {
+        'busy_timeout': 30000,
+        'journal_mode': 'wal',
+        'synchronous': 'off',
+        'cache_size': -256000,
+        'mmap_size': 1024 * 1024 * 1024,
+        'temp_store': 'memory',
+    },
+}
+PROFILE = os.environ.get('SCHOOL_DB_PROFILE', 'balanced')
+
+
+def profile_settings(profile: str | None = None) -> dict[str, str | int]:
+    """Return the PRAGMA settings of ``profile`` (defaults to ``PROFILE``)."""
+    name = PROFILE if profile is None else profile
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"unknown database profile {name!r}; choose from {', '.join(PROFILES)}"
+        ) from None
+
+
+def apply_profile(
+    conn: sqlite3.Connection, profile: str | None = None, readonly: bool = False
+) -> None:
+    """Apply the PRAGMAs of a performance profile to ``conn``.
+
+    Read-only connections skip ``journal_mode``: it is a property of the
+    database file, set by the read-write connections.
+    """
+    for pragma, value in profile_settings(profile).items():
+        if readonly and pragma == 'journal_mode':
+            continue
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+
+def current_settings(conn: sqlite3.Connection) -> dict[str, str | int]:
+    """Read back the profile PRAGMAs as SQLite reports them for ``conn``."""
+    return {
+        pragma: conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+        for pragma in PROFILES['balanced']
+    }
+
+
+def get_connection(
+    db_path: str | Path | None = None, profile: str | None = None, readonly: bool = False
+) -> sqlite3.Connection:
+    """Return a new SQLite connection with Row factory and profile applied.
+
+    The connection may be used from any thread so that it can be handed
+    out by a :class:`ConnectionPool`; callers must not share it between
+    threads concurrently. ``readonly`` connections are opened with the
+    ``mode=ro`` URI parameter, so SQLite itself rejects writes on them.
+    """
     if db_path is None:
         db_path = DB_NAME
-    conn = sqlite3.connect(db_path)
+    target, uri = str(db_path), False
+    if readonly:
+        target, uri = f"{Path(db_path).absolute().as_uri()}?mode=ro", True
+    conn = sqlite3.connect(
+        target, check_same_thread=False, uri=uri, factory=school_slowlog.connection_factory()
+    )
     conn.row_factory = sqlite3.Row
+    apply_profile(conn, profile, readonly)
     return conn
 
 
+class ConnectionPool:
+    """Bounded pool of long-lived connections to a single database file.
+
+    Connections are opened lazily up to ``size``; once that many are in
+    use, :meth:`acquire` blocks for up to ``timeout`` seconds. Idle
+    connections are pinged before being handed out and replaced if they
+    no longer work.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        size: int = POOL_SIZE,
+        timeout: float = POOL_TIMEOUT,
+        readonly: bool = False,
+    ) -> None:
+        if size < 1:
+            raise ValueError("pool size must be at least 1")
+        self.db_path = str(db_path)
+        self.size = size
+        self.timeout = timeout
+        self.readonly = readonly
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _open(self) -> sqlite3.Connection | None:
+        with self._lock:
+            if self._opened >= self.size:
+                return None
+            self._opened += 1
+        try:
+            return get_connection(self.db_path, readonly=self.readonly)
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._opened -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check a connection out of the pool."""
+        while True:
+            if self._closed:
+                raise RuntimeError("connection pool is closed")
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+                if conn is not None:
+                    return conn
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(
+                        f"no database connection available after {self.timeout}s"
+                    ) from None
+            if self._is_healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Return a connection to the pool, rolling back any open transaction."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        if self._closed:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Close idle connections; connections in use are closed on release."""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+class _Op(NamedTuple):
+    context: contextvars.Context
+    fn: Callable[..., Any]
+    args: tuple
+    kwargs: dict
+    future: Future
+    group: bool
+
+
+# Queued by Writer.close() to stop the writer thread.
+_STOP = object()
+
+
+class _GroupedConnection:
+    """The writer's connection as seen by one write of a group commit.
+
+    ``commit`` only ends the write: the group is committed once all of its
+    writes ran. ``rollback`` undoes this write alone.
+    """
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        self._conn.execute("ROLLBACK TO grouped_write")
+
+
+class Writer:
+    """The single connection through which every write to a database goes.
+
+    Callables submitted with :meth:`run` are executed one at a time, in
+    order, on the writer's own thread, so writers never wait on each
+    other's locks. :meth:`run` returns only after the callable finished
+    (and committed), so a read started afterwards sees the write.
+
+    Callables submitted with :meth:`run_grouped` may be group committed:
+    when ``group_commit_ms`` is set, the writer keeps collecting grouped
+    writes for that long (or until ``group_commit_max_ops``), runs each in
+    its own savepoint and commits them in one transaction. A write that
+    raises is rolled back to its savepoint and its error goes to its
+    caller only. Grouped callables must do a single unit of work and not
+    open transactions themselves.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        group_commit_ms: float | None = None,
+        group_commit_max_ops: int | None = None,
+    ) -> None:
+        self.db_path = str(db_path)
+        self.group_commit_ms = GROUP_COMMIT_MS if group_commit_ms is None else group_commit_ms
+        self.group_commit_max_ops = (
+            GROUP_COMMIT_MAX_OPS if group_commit_max_ops is None else group_commit_max_ops
+        )
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def on_writer_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("database writer is closed")
+            if self._thread is None:
+                # Opened here so that a database that cannot be opened fails
+                # the caller instead of the writer thread.
+                conn = get_connection(self.db_path)
+                self._thread = threading.Thread(
+                    target=self._loop, args=(conn,), name=f"school-writer:{self.db_path}",
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> Future:
+        """Queue ``fn(*args, **kwargs)`` and return a future for its result."""
+        return self._submit(fn, args, kwargs, group=False)
+
+    def _submit(self, fn: Callable[..., Any], args: tuple, kwargs: dict, group: bool) -> Future:
+        self._start()
+        future: Future = Future()
+        self._queue.put(_Op(contextvars.copy_context(), fn, args, kwargs, future, group))
+        return future
+
+    def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run ``fn`` on the writer thread and return its result or raise its error."""
+        if self.on_writer_thread():
+            return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    def run_grouped(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Like :meth:`run`, but ``fn`` may share its commit with other grouped writes."""
+        if self.on_writer_thread():
+            return fn(*args, **kwargs)
+        return self._submit(fn, args, kwargs, group=True).result()
+
+    def _loop(self, conn: sqlite3.Connection) -> None:
+        _writer_state.conn = conn
+        pending = None
+        try:
+            while True:
+                op = pending if pending is not None else self._queue.get()
+                pending = None
+                if op is _STOP:
+                    break
+                if op.group and self.group_commit_ms > 0:
+                    batch, pending = self._collect(op)
+                    self._run_group(conn, batch)
+                else:
+                    self._run_one(conn, op)
+        finally:
+            _writer_state.conn = None
+            conn.close()
+
+    def _collect(self, first: _Op) -> tuple[list[_Op], Any]:
+        """Gather grouped writes arriving within the window after ``first``.
+
+        Returns the group and the item that ended it early, if any.
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.group_commit_ms / 1000
+        while len(batch) < self.group_commit_max_ops:
+            timeout = deadline - time.monotonic()
+            try:
+                op = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if op is _STOP or not op.group:
+                return batch, op
+            batch.append(op)
+        return batch, None
+
+    def _run_one(self, conn: sqlite3.Connection, op: _Op) -> None:
+        if not op.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = op.context.run(op.fn, *op.args, **op.kwargs)
+        except BaseException as exc:
+            op.future.set_exception(exc)
+        else:
+            op.future.set_result(result)
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+
+    def _run_group(self, conn: sqlite3.Connection, batch: list[_Op]) -> None:
+        ops = [op for op in batch if op.future.set_running_or_notify_cancel()]
+        if not ops:
+            return
+        outcomes: list[tuple[bool, Any]] = []
+        aborted: BaseException | None = None
+        _writer_state.conn = _GroupedConnection(conn)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op in ops:
+                conn.execute("SAVEPOINT grouped_write")
+                try:
+                    result = op.context.run(op.fn, *op.args, **op.kwargs)
+                except BaseException as exc:
+                    conn.execute("ROLLBACK TO grouped_write")
+                    conn.execute("RELEASE grouped_write")
+                    outcomes.append((False, exc))
+                else:
+                    conn.execute("RELEASE grouped_write")
+                    outcomes.append((True, result))
+            conn.commit()
+        except BaseException as exc:
+            aborted = exc
+            if conn.in_transaction:
+                conn.rollback()
+        finally:
+            _writer_state.conn = conn
+        # If the group could not be committed, every write that had not
+        # failed on its own fails with the error that aborted the group.
+        outcomes += [(False, aborted)] * (len(ops) - len(outcomes))
+        for op, (ok, value) in zip(ops, outcomes):
+            if ok and aborted is None:
+                op.future.set_result(value)
+            else:
+                op.future.set_exception(value if not ok else aborted)
+
+    def close(self) -> None:
+        """Finish the queued writes and close the connection."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            if thread is not threading.current_thread():
+                thread.join()
+
+
+class Database:
+    """Reader pool and writer of one database file.
+
+    Reads use read-only connections (``mode=ro``); in WAL mode they never
+    block on, or are blocked by, the writer. Writes are serialized
+    through the :class:`Writer`.
+    """
+
+    def __init__(self, db_path: str | Path) -> None:
+        self.db_path = str(db_path)
+        self.readers = ConnectionPool(self.db_path, readonly=True)
+        self.writer = Writer(self.db_path)
+
+    def close(self) -> None:
+        self.writer.close()
+        self.readers.close()
+
+
+# Set on a writer thread to the connection it owns.
+_writer_state = threading.local()
+
+_pools: dict[str, ConnectionPool] = {}
+_databases: dict[str, Database] = {}
+_pools_lock = threading.Lock()
+
+
+def _key(db_path: str | Path | None) -> str:
+    return str(DB_NAME if db_path is None else db_path)
+
+
+def get_pool(db_path: str | Path | None = None) -> ConnectionPool:
+    """Return the shared read-write pool for ``db_path`` (defaults to ``DB_NAME``).
+
+    Used for migrations and maintenance; service code goes through
+    :func:`read_connection` and :func:`write`.
+    """
+    key = _key(db_path)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(key)
+    return pool
+
+
+def get_database(db_path: str | Path | None = None) -> Database:
+    """Return the shared :class:`Database` for ``db_path`` (defaults to ``DB_NAME``)."""
+    key = _key(db_path)
+    database = _databases.get(key)
+    if database is None:
+        with _pools_lock:
+            database = _databases.get(key)
+            if database is None:
+                database = _databases[key] = Database(key)
+    return database
+
+
+def close_pools() -> None:
+    """Close every pool and writer; used on application shutdown and in tests."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        databases = list(_databases.values())
+        _pools.clear()
+        _databases.clear()
+    for database in databases:
+        database.close()
+    for pool in pools:
+        pool.close()
+
+
+def _writer_connection(db_path: str | Path | None) -> sqlite3.Connection | None:
+    """The writer's connection if called on the writer thread of ``db_path``."""
+    conn = getattr(_writer_state, 'conn', None)
+    if conn is not None and get_database(db_path).writer.on_writer_thread():
+        return conn
+    return None
+
+
 @contextmanager
-def db_connection(db_path: str | Path | None = None) -> sqlite3.Connection:
-    """Yield a connection that is closed automatically."""
-    conn = get_connection(db_path)
-    try:
+def db_connection(db_path: str | Path | None = None) -> Iterator[sqlite3.Connection]:
+    """Yield a read-write connection.
+
+    Inside :func:`write` this is the writer's own connection; elsewhere a
+    pooled read-write connection for migrations and maintenance, which is
+    returned to the pool afterwards.
+    """
+    school_profiler.attach_current_thread()
+    conn = _writer_connection(db_path)
+    if conn is not None:
+        yield conn
+        return
+    with get_pool(db_path).connection() as conn:
         yield conn
-    finally:
-        conn.close()
 
 
-def init_db(conn: sqlite3.Connection) -> None:
-    """Create all tables if they do not exist."""
-    cur = conn.cursor()
+@contextmanager
+def read_connection(
+    db_path: str | Path | None = None, snapshot: bool = False
+) -> Iterator[sqlite3.Connection]:
+    """Yield a read-only pooled connection.
+
+    Every statement sees the latest committed data, including writes made
+    through :func:`write` that returned before it started. With
+    ``snapshot`` the connection is held in one read transaction so that
+    several queries see the same state. Inside :func:`write` the writer's
+    own connection is used, so a write can read what it just changed.
+    """
+    school_profiler.attach_current_thread()
+    conn = _writer_connection(db_path)
+    if conn is not None:
+        yield conn
+        return
+    with get_database(db_path).readers.connection() as conn:
+        if snapshot:
+            conn.execute("BEGIN")
+        yield conn
+
+
+def write(fn: Callable[..., T], *args: Any, db_path: str | Path | None = None, **kwargs: Any) -> T:
+    """Run ``fn(*args, **kwargs)`` on the writer thread of ``db_path``.
+
+    ``fn`` gets its connection from :func:`db_connection` and must commit;
+    anything left uncommitted is rolled back. Errors are re-raised in the
+    caller.
+    """
+    return get_database(db_path).writer.run(fn, *args, **kwargs)
+
+
+def write_grouped(
+    fn: Callable[..., T], *args: Any, db_path: str | Path | None = None, **kwargs: Any
+) -> T:
+    """Like :func:`write`, but ``fn`` may be group committed with other writes.
+
+    With ``SCHOOL_DB_GROUP_COMMIT_MS`` set, ``fn`` runs in a savepoint of a
+    transaction shared with the grouped writes queued around it; its
+    ``commit()`` is deferred to the group and its errors (such as a UNIQUE
+    violation) are raised in this caller only. ``fn`` must not begin
+    transactions of its own.
+    """
+    return get_database(db_path).writer.run_grouped(fn, *args, **kwargs)
+
+
+# Recomputes the trigger-maintained enrollment counters from scratch.
+REBUILD_ENROLLMENT_COUNTS = (
+    """
+    UPDATE course SET enrollment_count = (
+        SELECT COUNT(*) FROM enrollment e WHERE e.course_id = course.id
+    )
+    """,
+    """
+    UPDATE teacher SET enrollment_count = (
+        SELECT COALESCE(SUM(c.enrollment_count), 0)
+        FROM course c WHERE c.teacher_id = teacher.id
+    )
+    """,
+)
+
+# Per-enrollment contributions to student_stats, for a row alias ``{row}``.
+_STATS_TERMS = {
+    'completed_count': "CASE WHEN {row}.status = 'completed' THEN 1 ELSE 0 END",
+    'grade_points': (
+        "CASE WHEN {row}.status = 'completed' THEN CASE {row}.grade"
+        " WHEN 'A' THEN 5 WHEN 'B' THEN 4 WHEN 'C' THEN 3"
+        " WHEN 'D' THEN 2 WHEN 'E' THEN 1 ELSE 0 END ELSE 0 END"
+    ),
+    'passed': "CASE WHEN {row}.status = 'completed' AND {row}.grade != 'F' THEN 1 ELSE 0 END",
+    'failed': "CASE WHEN {row}.status = 'failed' THEN 1 ELSE 0 END",
+}
+
+
+def _stats_delta(row: str, sign: str) -> str:
+    """Upsert adding (``sign='+'``) or removing one enrollment's contribution.
+
+    An enrollment without a student has no stats row: the triggers running
+    this must be guarded by ``WHEN {row}.student_id IS NOT NULL``, or the
+    NULL key would make SQLite assign a rowid and credit some other student.
+    """
+    columns = ', '.join(_STATS_TERMS)
+    values = ', '.join(
+        f"{sign}({term.format(row=row)})" for term in _STATS_TERMS.values()
+    )
+    updates = ', '.join(f"{col} = {col} + excluded.{col}" for col in _STATS_TERMS)
+    return (
+        f"INSERT INTO student_stats(student_id, {columns})"
+        f" VALUES ({row}.student_id, {values})"
+        f" ON CONFLICT(student_id) DO UPDATE SET {updates};"
+    )
 
-    cur.execute(
+
+# Recomputes student_stats from the enrollment table.
+REBUILD_STUDENT_STATS = (
+    "DELETE FROM student_stats",
+    "INSERT INTO student_stats(student_id, "
+    + ', '.join(_STATS_TERMS)
+    + ") SELECT e.student_id, "
+    + ', '.join(f"SUM({term.format(row='e')})" for term in _STATS_TERMS.values())
+    + " FROM enrollment e WHERE e.student_id IS NOT NULL GROUP BY e.student_id",
+)
+
+# search_index rowids encode the entity as ``id * 4 + code`` so that the
+# sync triggers can address an entry by rowid.
+SEARCH_KINDS = {'teacher': 1, 'student': 2, 'course': 3}
+
+_SEARCH_SOURCES = {
+    'teacher': (
+        ('first_name', 'last_name', 'email'),
+        "{row}.first_name || ' ' || {row}.last_name", "{row}.email", "NULL",
+    ),
+    'student': (
+        ('first_name', 'last_name', 'email', 'student_number'),
+        "{row}.first_name || ' ' || {row}.last_name", "{row}.email", "{row}.student_number",
+    ),
+    'course': (('name',), "{row}.name", "NULL", "NULL"),
+}
+
+
+def _search_sync(table: str) -> tuple[str, ...]:
+    """Backfill and triggers keeping ``search_index`` in step with ``table``."""
+    columns, *values = _SEARCH_SOURCES[table]
+    code = SEARCH_KINDS[table]
+
+    def row_values(row: str) -> str:
+        return ', '.join(value.format(row=row) for value in values)
+
+    return (
+        "INSERT INTO search_index(rowid, name, email, student_number)"
+        f" SELECT t.id * 4 + {code}, {row_values('t')} FROM {table} t",
+        f"""
+        CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO search_index(rowid, name, email, student_number)
+            VALUES (NEW.id * 4 + {code}, {row_values('NEW')});
+        END
+        """,
+        f"""
+        CREATE TRIGGER {table}_search_update AFTER UPDATE OF {', '.join(columns)} ON {table}
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 4 + {code};
+            INSERT INTO search_index(rowid, name, email, student_number)
+            VALUES (NEW.id * 4 + {code}, {row_values('NEW')});
+        END
+        """,
+        f"""
+        CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table}
+        BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 4 + {code};
+        END
+        """,
+    )
+
+
+# Tables whose writes bump their row in ``table_version``; the counters let
+# HTTP handlers answer conditional requests without running their query.
+VERSIONED_TABLES = (
+    'teacher', 'course', 'program', 'student',
+    'program_course', 'student_program', 'enrollment',
+)
+
+
+# Columns whose updates count as a change; the trigger-maintained
+# ``enrollment_count`` of teachers and courses is left out so that
+# enrolling a student does not invalidate the teacher and course lists.
+_VERSIONED_COLUMNS = {
+    'teacher': ('first_name', 'last_name', 'email'),
+    'course': ('name', 'credits', 'teacher_id'),
+}
+
+
+def _version_triggers(table: str) -> tuple[str, ...]:
+    update = 'UPDATE'
+    if table in _VERSIONED_COLUMNS:
+        update += f" OF {', '.join(_VERSIONED_COLUMNS[table])}"
+    return tuple(
+        f"""
+        CREATE TRIGGER {table}_version_{event.split()[0].lower()} AFTER {event} ON {table}
+        BEGIN
+            UPDATE table_version
+            SET version = version + 1, updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+            WHERE name = '{table}';
+        END
+        """
+        for event in ('INSERT', update, 'DELETE')
+    )
+
+
+# Each migration is a sequence of statements that moves the schema from
+# version ``n`` to ``n + 1``; the version is tracked in ``PRAGMA user_version``.
+MIGRATIONS: list[tuple[str, ...]] = [
+    # 1: base schema
+    (
         """
         CREATE TABLE IF NOT EXISTS teacher (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -36,10 +720,7 @@ def init_db(conn: sqlite3.Connection) -> None:
             last_name TEXT NOT NULL,
             email TEXT
         )
-        """
-    )
-
-    cur.execute(
+        """,
         """
         CREATE TABLE IF NOT EXISTS course (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -47,20 +728,14 @@ def init_db(conn: sqlite3.Connection) -> None:
             credits INTEGER NOT NULL,
             teacher_id INTEGER REFERENCES teacher(id)
         )
-        """
-    )
-
-    cur.execute(
+        """,
         """
         CREATE TABLE IF NOT EXISTS program (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
             description TEXT
         )
-        """
-    )
-
-    cur.execute(
+        """,
         """
         CREATE TABLE IF NOT EXISTS student (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -69,20 +744,14 @@ def init_db(conn: sqlite3.Connection) -> None:
             student_number TEXT UNIQUE NOT NULL,
             email TEXT
         )
-        """
-    )
-
-    cur.execute(
+        """,
         """
         CREATE TABLE IF NOT EXISTS program_course (
             program_id INTEGER REFERENCES program(id),
             course_id INTEGER REFERENCES course(id),
             PRIMARY KEY (program_id, course_id)
         )
-        """
-    )
-
-    cur.execute(
+        """,
         """
         CREATE TABLE IF NOT EXISTS student_program (
             student_id INTEGER REFERENCES student(id),
@@ -90,10 +759,7 @@ def init_db(conn: sqlite3.Connection) -> None:
             start_date TEXT,
             PRIMARY KEY (student_id, program_id)
         )
-        """
-    )
-
-    cur.execute(
+        """,
         """
         CREATE TABLE IF NOT EXISTS enrollment (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -104,7 +770,216 @@ def init_db(conn: sqlite3.Connection) -> None:
             grade TEXT,
             UNIQUE(student_id, course_id, semester)
         )
+        """,
+    ),
+    # 2: secondary indexes for the enrollment joins and lookups
+    (
+        "CREATE INDEX IF NOT EXISTS idx_enrollment_course"
+        " ON enrollment(course_id, student_id, status, grade)",
+        "CREATE INDEX IF NOT EXISTS idx_enrollment_student_status"
+        " ON enrollment(student_id, status, grade, course_id)",
+        "CREATE INDEX IF NOT EXISTS idx_course_teacher ON course(teacher_id, name)",
+        "CREATE INDEX IF NOT EXISTS idx_program_course_course"
+        " ON program_course(course_id, program_id)",
+    ),
+    # 3: sort-order indexes for keyset pagination of the list pages
+    (
+        "CREATE INDEX IF NOT EXISTS idx_teacher_name ON teacher(last_name, first_name)",
+        "CREATE INDEX IF NOT EXISTS idx_student_name ON student(last_name, first_name)",
+        "CREATE INDEX IF NOT EXISTS idx_course_name ON course(name)",
+    ),
+    # 4: per-course and per-teacher enrollment counters kept by triggers
+    (
+        "ALTER TABLE course ADD COLUMN enrollment_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE teacher ADD COLUMN enrollment_count INTEGER NOT NULL DEFAULT 0",
+        *REBUILD_ENROLLMENT_COUNTS,
+        "CREATE INDEX idx_course_popularity ON course(enrollment_count DESC, name)",
+        "CREATE INDEX idx_teacher_popularity"
+        " ON teacher(enrollment_count DESC, (first_name || ' ' || last_name))",
         """
-    )
+        CREATE TRIGGER enrollment_count_insert AFTER INSERT ON enrollment
+        BEGIN
+            UPDATE course SET enrollment_count = enrollment_count + 1
+            WHERE id = NEW.course_id;
+            UPDATE teacher SET enrollment_count = enrollment_count + 1
+            WHERE id = (SELECT teacher_id FROM course WHERE id = NEW.course_id);
+        END
+        """,
+        """
+        CREATE TRIGGER enrollment_count_delete AFTER DELETE ON enrollment
+        BEGIN
+            UPDATE course SET enrollment_count = enrollment_count - 1
+            WHERE id = OLD.course_id;
+            UPDATE teacher SET enrollment_count = enrollment_count - 1
+            WHERE id = (SELECT teacher_id FROM course WHERE id = OLD.course_id);
+        END
+        """,
+        """
+        CREATE TRIGGER enrollment_count_move AFTER UPDATE OF course_id ON enrollment
+        WHEN OLD.course_id IS NOT NEW.course_id
+        BEGIN
+            UPDATE course SET enrollment_count = enrollment_count - 1
+            WHERE id = OLD.course_id;
+            UPDATE teacher SET enrollment_count = enrollment_count - 1
+            WHERE id = (SELECT teacher_id FROM course WHERE id = OLD.course_id);
+            UPDATE course SET enrollment_count = enrollment_count + 1
+            WHERE id = NEW.course_id;
+            UPDATE teacher SET enrollment_count = enrollment_count + 1
+            WHERE id = (SELECT teacher_id FROM course WHERE id = NEW.course_id);
+        END
+        """,
+        """
+        CREATE TRIGGER course_teacher_change AFTER UPDATE OF teacher_id ON course
+        WHEN OLD.teacher_id IS NOT NEW.teacher_id
+        BEGIN
+            UPDATE teacher SET enrollment_count = enrollment_count - OLD.enrollment_count
+            WHERE id = OLD.teacher_id;
+            UPDATE teacher SET enrollment_count = enrollment_count + NEW.enrollment_count
+            WHERE id = NEW.teacher_id;
+        END
+        """,
+        """
+        CREATE TRIGGER course_delete_count AFTER DELETE ON course
+        BEGIN
+            UPDATE teacher SET enrollment_count = enrollment_count - OLD.enrollment_count
+            WHERE id = OLD.teacher_id;
+        END
+        """,
+    ),
+    # 5: per-table change counters for conditional HTTP requests
+    (
+        """
+        CREATE TABLE table_version (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+        "INSERT INTO table_version(name, updated_at) VALUES "
+        + ", ".join(
+            f"('{table}', CAST(strftime('%s', 'now') AS INTEGER))"
+            for table in VERSIONED_TABLES
+        ),
+        *(sql for table in VERSIONED_TABLES for sql in _version_triggers(table)),
+    ),
+    # 6: per-student grade statistics kept by triggers for the leaderboards
+    (
+        """
+        CREATE TABLE student_stats (
+            student_id INTEGER PRIMARY KEY,
+            completed_count INTEGER NOT NULL DEFAULT 0,
+            grade_points INTEGER NOT NULL DEFAULT 0,
+            passed INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            avg_grade REAL GENERATED ALWAYS AS (
+                CASE WHEN completed_count > 0
+                     THEN CAST(grade_points AS REAL) / completed_count END
+            ) VIRTUAL
+        )
+        """,
+        *REBUILD_STUDENT_STATS[1:],
+        "CREATE INDEX idx_student_stats_best ON student_stats(avg_grade DESC)"
+        " WHERE completed_count > 0",
+        "CREATE INDEX idx_student_stats_at_risk ON student_stats(failed DESC)"
+        " WHERE failed > passed",
+        f"""
+        CREATE TRIGGER student_stats_insert AFTER INSERT ON enrollment
+        WHEN NEW.student_id IS NOT NULL
+        BEGIN
+            {_stats_delta('NEW', '+')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER student_stats_delete AFTER DELETE ON enrollment
+        WHEN OLD.student_id IS NOT NULL
+        BEGIN
+            {_stats_delta('OLD', '-')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER student_stats_update_remove
+        AFTER UPDATE OF student_id, status, grade ON enrollment
+        WHEN OLD.student_id IS NOT NULL
+        BEGIN
+            {_stats_delta('OLD', '-')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER student_stats_update_add
+        AFTER UPDATE OF student_id, status, grade ON enrollment
+        WHEN NEW.student_id IS NOT NULL
+        BEGIN
+            {_stats_delta('NEW', '+')}
+        END
+        """,
+        """
+        CREATE TRIGGER student_stats_student_delete AFTER DELETE ON student
+        BEGIN
+            DELETE FROM student_stats WHERE student_id = OLD.id;
+        END
+        """,
+    ),
+    # 7: list the students of a program for cohort progress
+    (
+        "CREATE INDEX IF NOT EXISTS idx_student_program_program"
+        " ON student_program(program_id, student_id)",
+    ),
+    # 8: full-text prefix search over names, emails and student numbers
+    (
+        """
+        CREATE VIRTUAL TABLE search_index USING fts5(
+            name, email, student_number,
+            prefix = '2 3',
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """,
+        *(sql for table in SEARCH_KINDS for sql in _search_sync(table)),
+    ),
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """Return the schema version stored in the database file."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply pending migrations and return the resulting schema version.
+
+    Each migration runs in its own ``BEGIN IMMEDIATE`` transaction and the
+    version is re-read under the write lock, so concurrent processes
+    starting up at the same time apply every migration exactly once.
+    When the schema is current this is a single read.
+    """
+    version = schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"database schema version {version} is newer than supported "
+            f"version {SCHEMA_VERSION}"
+        )
+    while version < SCHEMA_VERSION:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = schema_version(conn)
+            if version < SCHEMA_VERSION:
+                for statement in MIGRATIONS[version]:
+                    conn.execute(statement)
+                version += 1
+                conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return version
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    """Create or upgrade all tables to the current schema version."""
+    migrate(conn)
+
 
-    conn.commit()
+def ensure_schema(db_path: str | Path | None = None) -> int:
+    """Migrate the database at ``db_path``; called once at startup."""
+    with db_connection(db_path) as conn:
+        return migrate(conn)
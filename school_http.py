@@ -0,0 +1,152 @@
+"""HTTP helpers shared by the JSON API (``api.py``) and the web UI (``app.py``)."""
+
+from __future__ import annotations
+
+import json
+import sys
+import time
+from typing import Iterable, Mapping, Sequence
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+
+import school_metrics
+import school_profiler
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder gives the same bytes
+    orjson = None
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison of ``etag`` against an ``If-None-Match`` header."""
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def conditional_response(request: Request, response: Response, token: str) -> Response | None:
+    """Validate a GET against a data version token from ``get_data_version``.
+
+    Sets ``ETag`` on ``response`` and returns a ready ``304 Not Modified``
+    response if the client's copy is current, so the handler can skip its
+    query entirely; returns None otherwise. No ``Last-Modified`` is sent:
+    its one-second resolution would let a write made in the same second
+    as a client's fetch go unnoticed.
+    """
+    headers = {"ETag": f'W/"{token}"', "Cache-Control": "no-cache"}
+    response.headers.update(headers)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and _etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return None
+
+
+def route_template(scope) -> str:
+    """The path template of the route handling ``scope``, or ``unmatched``."""
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts and latency per route.
+
+    Requests are labelled with the route template (``/teachers/{teacher_id}``)
+    rather than the raw path so that ids do not multiply the series;
+    paths matching no route are grouped under ``unmatched``.
+    """
+
+    def __init__(self, app, app_name: str) -> None:
+        self.app = app
+        self.app_name = app_name
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_template(scope)
+            method = scope["method"]
+            school_metrics.HTTP_SECONDS.observe(
+                time.perf_counter() - started, self.app_name, method, route
+            )
+            school_metrics.HTTP_REQUESTS.inc(self.app_name, method, route, str(status))
+
+
+class ProfilerMiddleware:
+    """ASGI middleware profiling a random ``SCHOOL_PROFILE_RATE`` of requests."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not school_profiler.should_profile():
+            await self.app(scope, receive, send)
+            return
+        session, token = school_profiler.sampler.start(sys._getframe())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            seconds = school_profiler.sampler.stop(session, token)
+            school_profiler.store.record(
+                f"{scope['method']} {route_template(scope)}", session, seconds
+            )
+
+
+def metrics_response() -> Response:
+    """The ``/metrics`` page, or 404 when ``SCHOOL_METRICS`` is off."""
+    if not school_metrics.ENABLED:
+        return Response("metrics are disabled; set SCHOOL_METRICS=1\n", status_code=404)
+    return Response(school_metrics.render(), media_type=school_metrics.CONTENT_TYPE)
+
+
+def profiles_response(top: int = 20) -> Response:
+    """Hottest functions per profiled route, or 404 when profiling is off."""
+    if not school_profiler.ENABLED:
+        return JSONResponse(
+            {"detail": "profiling is disabled; set SCHOOL_PROFILE_RATE"}, status_code=404
+        )
+    return JSONResponse(school_profiler.store.summary(top))
+
+
+def rows_json(rows: Iterable[Mapping], fields: Sequence[str]) -> bytes:
+    """Encode rows as a JSON array of objects holding ``fields``, in that order.
+
+    The bytes are those FastAPI produces for a response model with the same
+    fields (compact separators, UTF-8 without escaping), without building
+    and validating a model per row.
+    """
+    items = [{field: row[field] for field in fields} for row in rows]
+    if orjson is not None:
+        return orjson.dumps(items)
+    return json.dumps(
+        items, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def rows_response(rows: Iterable[Mapping], fields: Sequence[str], response: Response) -> Response:
+    """A JSON response of ``rows`` carrying the headers set on ``response``.
+
+    FastAPI only copies the injected ``response`` headers (``ETag``,
+    ``X-Next-Cursor``) when a handler returns data, so they are copied here.
+    """
+    fast = Response(rows_json(rows, fields), media_type="application/json")
+    fast.headers.update(response.headers)
+    return fast
@@ -0,0 +1,118 @@
+"""Streaming readers and writers for the CSV and JSON Lines files used by
+bulk import and export."""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from pathlib import Path
+from typing import Iterable, Iterator, Mapping, TextIO
+
+# "jsonl" and "ndjson" are two names for the same one-object-per-line format.
+FORMATS = ("csv", "jsonl", "ndjson")
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "ndjson": "application/x-ndjson",
+}
+CHUNK_BYTES = 64 * 1024
+
+
+def detect_format(path: str | Path) -> str:
+    """Guess the file format from its extension."""
+    suffix = Path(path).suffix.lower()
+    if suffix == ".csv":
+        return "csv"
+    if suffix in (".jsonl", ".ndjson"):
+        return suffix[1:]
+    raise ValueError(f"cannot tell the format of {path}; pass it explicitly")
+
+
+def iter_csv(stream: TextIO) -> Iterator[dict]:
+    """Yield one dictionary per CSV row, keyed by the header line."""
+    yield from csv.DictReader(stream)
+
+
+class RecordError(ValueError):
+    """A line that is not a valid record.
+
+    Readers yield it in place of the record so that one bad line is
+    reported by the importer instead of ending the whole file.
+    """
+
+
+def iter_jsonl(stream: TextIO) -> Iterator[dict | RecordError]:
+    """Yield one dictionary per non-blank JSON line, or a RecordError for a bad line."""
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield RecordError(f"line {number}: invalid JSON: {exc}")
+            continue
+        if not isinstance(record, dict):
+            yield RecordError(f"line {number}: expected a JSON object")
+            continue
+        yield record
+
+
+def read_records(path: str | Path, fmt: str | None = None) -> Iterator[dict | RecordError]:
+    """Stream records from ``path`` without loading the whole file.
+
+    Lines that cannot be parsed are yielded as :class:`RecordError`.
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}; choose from {', '.join(FORMATS)}")
+    with open(path, newline="", encoding="utf-8") as stream:
+        if fmt == "csv":
+            yield from iter_csv(stream)
+        else:
+            yield from iter_jsonl(stream)
+
+
+def _csv_lines(rows: Iterable[Mapping]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.writer(buffer)
+            writer.writerow(row.keys())
+        writer.writerow(row[key] for key in row.keys())
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _json_lines(rows: Iterable[Mapping]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(dict(row), ensure_ascii=False) + "\n"
+
+
+def encode_rows(rows: Iterable[Mapping], fmt: str) -> Iterator[str]:
+    """Encode rows as CSV (with a header line) or JSON Lines.
+
+    Output is yielded in chunks of roughly ``CHUNK_BYTES`` so callers can
+    stream an export of any size in constant memory.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}; choose from {', '.join(FORMATS)}")
+    lines = _csv_lines(rows) if fmt == "csv" else _json_lines(rows)
+    chunk: list[str] = []
+    size = 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield "".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield "".join(chunk)
+
+
+def write_rows(rows: Iterable[Mapping], stream: TextIO, fmt: str) -> None:
+    """Write ``rows`` to ``stream`` in ``fmt`` without materializing them."""
+    for chunk in encode_rows(rows, fmt):
+        stream.write(chunk)
@@ -0,0 +1,197 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+Metrics are off unless ``SCHOOL_METRICS=1``. When they are off nothing is
+instrumented, so the service functions and HTTP handlers run exactly as
+before. When on, :func:`instrument` wraps the public functions of
+:mod:`school_service` to record calls, latency, rows returned and errors,
+and :class:`school_http.MetricsMiddleware` records every HTTP request.
+
+Each process keeps its own registry; scrape every worker separately when
+running uvicorn with several workers.
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import os
+import sqlite3
+import threading
+import time
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+ENABLED = os.environ.get("SCHOOL_METRICS", "0").lower() in ("1", "true", "yes", "on")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds; SQLite lookups sit in the sub-millisecond
+# buckets, lock waits in the upper ones (busy_timeout is 5 s).
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()) -> None:
+        self.name, self.help = name, help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labels, key)} {value:g}" for key, value in items]
+
+
+class Histogram:
+    """Observations counted into cumulative ``le`` buckets per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = BUCKETS) -> None:
+        self.name, self.help = name, help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, *labels: str) -> int:
+        counts = self._values.get(labels)
+        return int(sum(counts[:-1])) if counts else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        lines = []
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = _labels(self.labels, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative:g}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {counts[-1]:.9g}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative:g}")
+        return lines
+
+
+REGISTRY: List[Any] = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+SERVICE_CALLS = register(Counter(
+    "school_service_calls_total", "Calls of school_service functions.", ["function"]))
+SERVICE_ERRORS = register(Counter(
+    "school_service_errors_total",
+    "school_service calls that raised, by error; lock waits that timed out are"
+    " reported as database_locked and pool_timeout.",
+    ["function", "error"]))
+SERVICE_ROWS = register(Counter(
+    "school_service_rows_total", "Rows returned by school_service functions.", ["function"]))
+SERVICE_SECONDS = register(Histogram(
+    "school_service_duration_seconds", "Latency of school_service calls.", ["function"]))
+HTTP_REQUESTS = register(Counter(
+    "school_http_requests_total", "HTTP requests by route and status.",
+    ["app", "method", "route", "status"]))
+HTTP_SECONDS = register(Histogram(
+    "school_http_request_duration_seconds", "HTTP request latency by route.",
+    ["app", "method", "route"]))
+
+
+def error_label(exc: BaseException) -> str:
+    """Name ``exc`` for the errors counter, singling out lock waits."""
+    if isinstance(exc, sqlite3.OperationalError) and "locked" in str(exc):
+        return "database_locked"
+    if isinstance(exc, TimeoutError):
+        return "pool_timeout"
+    return type(exc).__name__
+
+
+def timed(name: str, fn: Callable) -> Callable:
+    """Wrap ``fn`` so every call is recorded under ``function=name``.
+
+    Rows are counted for list results. Generators are timed
+    until they are created, not while they are consumed.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as exc:
+            SERVICE_ERRORS.inc(name, error_label(exc))
+            raise
+        finally:
+            SERVICE_SECONDS.observe(time.perf_counter() - started, name)
+            SERVICE_CALLS.inc(name)
+        if isinstance(result, list):
+            SERVICE_ROWS.inc(name, amount=len(result))
+        return result
+
+    return wrapper
+
+
+def instrument(module: ModuleType, exclude: Iterable[str] = ()) -> None:
+    """Replace the public functions defined in ``module`` with timed wrappers."""
+    skip = set(exclude)
+    for name, fn in list(vars(module).items()):
+        if (
+            name.startswith("_")
+            or name in skip
+            or not inspect.isfunction(fn)
+            or fn.__module__ != module.__name__
+        ):
+            continue
+        setattr(module, name, timed(name, fn))
@@ -0,0 +1,231 @@
+"""Opt-in stack-sampling profiler for web requests.
+
+Set ``SCHOOL_PROFILE_RATE`` to the fraction of requests to profile (for
+example ``0.01``). While a chosen request runs, a background thread
+samples its stacks every ``SCHOOL_PROFILE_INTERVAL_MS`` milliseconds:
+
+* on the event loop thread, only while the request's own middleware frame
+  is on the stack, so interleaved requests are not mixed in;
+* on worker threads once they check out a database connection for the
+  request (see :func:`attach_current_thread`), which covers SQL in the
+  service layer and the pydantic models built around it in ``api.py``.
+
+Samples are aggregated per route as folded stacks (``a;b;c count``) and
+written to ``SCHOOL_PROFILE_DIR`` after every profiled request, one file
+per route and process. ``python main.py profile-report`` prints the
+hottest functions.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Dict, Iterable, List, Optional, Tuple
+
+RATE = float(os.environ.get("SCHOOL_PROFILE_RATE", "0"))
+INTERVAL = float(os.environ.get("SCHOOL_PROFILE_INTERVAL_MS", "2")) / 1000
+PROFILE_DIR = os.environ.get("SCHOOL_PROFILE_DIR", "profiles")
+ENABLED = RATE > 0
+MAX_DEPTH = 128
+
+
+def should_profile() -> bool:
+    return ENABLED and random.random() < RATE
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    marker = "site-packages" + os.sep
+    if marker in path:
+        path = path.split(marker, 1)[1]
+    else:
+        path = os.path.basename(path)
+    # co_qualname is new in Python 3.11; older interpreters get the bare name.
+    return f"{path}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class Session:
+    """Samples collected for one profiled request."""
+
+    def __init__(self, frame: FrameType) -> None:
+        self.frame = frame
+        self.loop_thread = threading.get_ident()
+        self.threads: set[int] = set()
+        self.stacks: Counter = Counter()
+        self.started = time.perf_counter()
+
+    def fold(self, ident: int, leaf: FrameType) -> Optional[str]:
+        """The stack of ``leaf`` as ``root;...;leaf``, or None if not ours."""
+        names = []
+        frame: Optional[FrameType] = leaf
+        on_loop = ident == self.loop_thread
+        while frame is not None and len(names) < MAX_DEPTH:
+            if on_loop and frame is self.frame:
+                break
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        else:
+            if on_loop:
+                return None
+        return ";".join(reversed(names)) or None
+
+
+_current: contextvars.ContextVar[Optional[Session]] = contextvars.ContextVar(
+    "school_profile_session", default=None
+)
+
+
+def attach_current_thread() -> None:
+    """Sample this thread for the profiled request it is working on, if any.
+
+    A context variable lookup when no request is being profiled.
+    """
+    session = _current.get()
+    if session is not None:
+        session.threads.add(threading.get_ident())
+
+
+class Sampler:
+    """Background thread sampling the stacks of the active sessions."""
+
+    def __init__(self, interval: float = INTERVAL) -> None:
+        self.interval = interval
+        self._sessions: List[Session] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, frame: FrameType) -> Tuple[Session, contextvars.Token]:
+        session = Session(frame)
+        with self._lock:
+            self._sessions.append(session)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="school-profiler", daemon=True
+                )
+                self._thread.start()
+        return session, _current.set(session)
+
+    def stop(self, session: Session, token: contextvars.Token) -> float:
+        _current.reset(token)
+        with self._lock:
+            self._sessions.remove(session)
+        return time.perf_counter() - session.started
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                sessions = list(self._sessions)
+                if not sessions:
+                    self._thread = None
+                    return
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                for session in sessions:
+                    if ident == session.loop_thread or ident in session.threads:
+                        stack = session.fold(ident, frame)
+                        if stack:
+                            session.stacks[stack] += 1
+                            break
+
+
+class ProfileStore:
+    """Per-route totals of the profiled requests of this process."""
+
+    def __init__(self, directory: Optional[str] = PROFILE_DIR) -> None:
+        self.directory = directory
+        self.routes: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, session: Session, seconds: float) -> None:
+        with self._lock:
+            entry = self.routes.setdefault(
+                route, {"route": route, "requests": 0, "seconds": 0.0, "stacks": Counter()}
+            )
+            entry["requests"] += 1
+            entry["seconds"] += seconds
+            entry["stacks"].update(session.stacks)
+            if self.directory:
+                self._save(entry)
+
+    def _save(self, entry: dict) -> None:
+        directory = Path(self.directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", entry["route"]).strip("_") or "root"
+        path = directory / f"{slug}.{os.getpid()}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(entry), encoding="utf-8")
+        tmp.replace(path)
+
+    def summary(self, top: int = 20) -> List[dict]:
+        with self._lock:
+            entries = [dict(entry, stacks=Counter(entry["stacks"])) for entry in self.routes.values()]
+        return [summarize(entry, top) for entry in entries]
+
+
+sampler = Sampler()
+store = ProfileStore()
+
+
+def load(directory: str = PROFILE_DIR) -> List[dict]:
+    """Merge the profile files in ``directory`` by route."""
+    routes: Dict[str, dict] = {}
+    for path in sorted(Path(directory).glob("*.json")):
+        data = json.loads(path.read_text(encoding="utf-8"))
+        entry = routes.setdefault(
+            data["route"], {"route": data["route"], "requests": 0, "seconds": 0.0, "stacks": Counter()}
+        )
+        entry["requests"] += data["requests"]
+        entry["seconds"] += data["seconds"]
+        entry["stacks"].update(data["stacks"])
+    return list(routes.values())
+
+
+def hot_functions(stacks: Counter, top: int = 20) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]:
+    """Functions by self samples (leaf of the stack) and by total samples."""
+    own: Counter = Counter()
+    total: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for name in set(frames):
+            total[name] += count
+    return own.most_common(top), total.most_common(top)
+
+
+def summarize(entry: dict, top: int = 20) -> dict:
+    own, total = hot_functions(entry["stacks"], top)
+    requests = entry["requests"]
+    return {
+        "route": entry["route"],
+        "requests": requests,
+        "mean_ms": round(entry["seconds"] / requests * 1000, 2) if requests else 0.0,
+        "samples": sum(entry["stacks"].values()),
+        "self": own,
+        "total": total,
+    }
+
+
+def format_summary(summaries: Iterable[dict]) -> str:
+    lines = []
+    for s in sorted(summaries, key=lambda s: s["samples"], reverse=True):
+        lines.append(f"{s['route']}  requests={s['requests']} mean_ms={s['mean_ms']}"
+                     f" samples={s['samples']}")
+        for title, rows in (("self", s["self"]), ("total", s["total"])):
+            lines.append(f"  by {title}:")
+            for name, count in rows:
+                share = count / s["samples"] if s["samples"] else 0
+                lines.append(f"    {share:6.1%} {count:7}  {name}")
+    return "\n".join(lines)
@@ -1,251 +1,274 @@
 from __future__ import annotations
 
+import base64
+import functools
+import json
+import os
+import re
 import sqlite3
+import sys
+import time
+from dataclasses import dataclass, field
 from datetime import date
-from typing import List, Optional, Tuple
-from school_db import get_connection as _get_connection, init_db
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-def get_connection() -> sqlite3.Connection:
-    """Return a new SQLite connection using project defaults."""
-    return _get_connection()
+import school_metrics
+from school_cache import TTLCache
+from school_io import RecordError
+from school_db import (
+    REBUILD_ENROLLMENT_COUNTS,
+    REBUILD_STUDENT_STATS,
+    SEARCH_KINDS,
+    db_connection,
+    read_connection,
+    write,
+    write_grouped,
+)
 
-from school_db import get_connection as _get_connection, init_db
-from contextlib import contextmanager
+# Ids bound per ``IN (...)`` list, well below SQLite's variable limit
+# (999 on builds older than 3.32).
+LOOKUP_CHUNK_SIZE = 500
 
 
-def get_connection() -> sqlite3.Connection:
-    """Return a new SQLite connection using project defaults."""
-    return _get_connection()
+def _placeholders(values: Sequence) -> str:
+    return ", ".join("?" * len(values))
 
 
-@contextmanager
-def db_connection() -> sqlite3.Connection:
-    """Context manager yielding a SQLite connection.
+def _id_chunks(ids: Iterable[int]) -> Iterator[Tuple[int, ...]]:
+    """The distinct ``ids`` in ascending order, ``LOOKUP_CHUNK_SIZE`` at a time."""
+    ordered = sorted(set(ids))
+    for start in range(0, len(ordered), LOOKUP_CHUNK_SIZE):
+        yield tuple(ordered[start:start + LOOKUP_CHUNK_SIZE])
 
-    Provides backward compatibility for older code that expected a
-    ``db_connection`` helper and ensures connections are properly closed.
+
+def _existing_ids(conn: sqlite3.Connection, table: str, ids: Sequence[int]) -> set[int]:
+    found: set[int] = set()
+    for chunk in _id_chunks(ids):
+        cur = conn.execute(f"SELECT id FROM {table} WHERE id IN ({_placeholders(chunk)})", chunk)
+        found.update(row[0] for row in cur)
+    return found
+
+
+def _insert_each(
+    conn: sqlite3.Connection, sql: str, rows: Iterable[tuple]
+) -> List[int | sqlite3.IntegrityError]:
+    """Run ``sql`` once per row inside a single transaction.
+
+    A constraint violation only skips its own row; the result holds the
+    new row id or the error for every input row, in order.
     """
-    conn = get_connection()
+    results: List[int | sqlite3.IntegrityError] = []
+    conn.execute("BEGIN")
     try:
-        yield conn
-    finally:
-        conn.close()
+        for params in rows:
+            try:
+                cur = conn.execute(sql, params)
+            except sqlite3.IntegrityError as exc:
+                results.append(exc)
+            else:
+                results.append(cur.lastrowid)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return results
 
-# --- CRUD operations ---
 
-def add_teacher(first_name: str, last_name: str, email: str | None = None) -> int:
-    with db_connection() as conn:
-        init_db(conn)
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO teacher(first_name, last_name, email) VALUES (?, ?, ?)",
-            (first_name, last_name, email),
-        )
-        conn.commit()
-        return cur.lastrowid
+# --- Analytics cache ---
 
+# Leaderboards are cached per process for a short time and dropped on every
+# write made through this module. Writes from other processes become
+# visible once the TTL expires.
+ANALYTICS_CACHE_TTL = float(os.environ.get("SCHOOL_ANALYTICS_CACHE_TTL", "30"))
+ANALYTICS_CACHE_SIZE = int(os.environ.get("SCHOOL_ANALYTICS_CACHE_SIZE", "256"))
+analytics_cache = TTLCache(ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL)
 
-def list_teachers() -> List[sqlite3.Row]:
-    with db_connection() as conn:
-        init_db(conn)
-        cur = conn.execute("SELECT * FROM teacher ORDER BY last_name, first_name")
-        return cur.fetchall()
 
+def _invalidates_analytics(fn):
+    """Clear the analytics cache after ``fn`` writes, even if it fails midway."""
 
-def get_teacher(teacher_id: int) -> sqlite3.Row | None:
-    with db_connection() as conn:
-        init_db(conn)
-        cur = conn.execute("SELECT * FROM teacher WHERE id = ?", (teacher_id,))
-        return cur.fetchone()
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            analytics_cache.clear()
 
+    return wrapper
 
-def update_teacher(teacher_id: int, first_name: str, last_name: str, email: str | None) -> None:
-    with db_connection() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE teacher SET first_name = ?, last_name = ?, email = ? WHERE id = ?",
-            (first_name, last_name, email, teacher_id),
-        )
-        conn.commit()
 
+def _serialized(fn):
+    """Run ``fn`` on the database's single writer thread (see ``school_db.write``).
 
-def delete_teacher(teacher_id: int) -> None:
-    with db_connection() as conn:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM teacher WHERE id = ?", (teacher_id,))
-        conn.commit()
+    Inside ``fn``, ``db_connection()`` is the writer's connection.
+    """
 
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return write(fn, *args, **kwargs)
 
-def get_teacher_courses(teacher_id: int) -> List[sqlite3.Row]:
-    with db_connection() as conn:
-        init_db(conn)
-        cur = conn.execute(
-            "SELECT * FROM course WHERE teacher_id = ? ORDER BY name",
-            (teacher_id,),
-        )
-        return cur.fetchall()
+    return wrapper
 
 
-def get_teacher_students(teacher_id: int) -> List[sqlite3.Row]:
-    with db_connection() as conn:
-        init_db(conn)
-        cur = conn.execute(
-            """
-            SELECT DISTINCT s.*
-            FROM student s
-            JOIN enrollment e ON s.id = e.student_id
-            JOIN course c ON e.course_id = c.id
-            WHERE c.teacher_id = ?
-            ORDER BY s.last_name, s.first_name
-            """,
-            (teacher_id,),
-        )
-        return cur.fetchall()
+def _group_committed(fn):
+    """Like ``_serialized``, but ``fn`` may share its commit with other writes.
 
+    For single-statement writes issued at high rates; see
+    ``school_db.write_grouped``.
+    """
 
-def get_teacher_evaluations(teacher_id: int) -> List[sqlite3.Row]:
-    with db_connection() as conn:
-        init_db(conn)
-        cur = conn.execute(
-            """
-            SELECT s.first_name || ' ' || s.last_name AS student_name,
-                   c.name AS course_name,
-                   e.grade
-            FROM enrollment e
-            JOIN student s ON e.student_id = s.id
-            JOIN course c ON e.course_id = c.id
-            WHERE c.teacher_id = ? AND e.grade IS NOT NULL
-            ORDER BY c.name, student_name
-            """,
-            (teacher_id,),
-        )
-        return cur.fetchall()
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return write_grouped(fn, *args, **kwargs)
 
+    return wrapper
 
-def get_enrollments_for_course(course_id: int) -> List[sqlite3.Row]:
-    with db_connection() as conn:
-        init_db(conn)
-        cur = conn.execute(
-            """
-            SELECT e.id, s.first_name || ' ' || s.last_name AS student_name,
-                   e.grade, e.status
-            FROM enrollment e
-            JOIN student s ON e.student_id = s.id
-            WHERE e.course_id = ?
-            ORDER BY student_name
-            """,
-            (course_id,),
-        )
-        return cur.fetchall()
 
+# --- Change tracking ---
 
-def get_teacher(teacher_id: int) -> sqlite3.Row | None:
-    conn = get_connection()
-    cur = conn.execute("SELECT * FROM teacher WHERE id = ?", (teacher_id,))
-    return cur.fetchone()
+def get_data_version(*tables: str) -> Tuple[str, int]:
+    """Return ``(token, last_modified)`` for the given tables.
 
+    The token changes whenever any row of the tables is written, and
+    ``last_modified`` is the Unix time of the latest such write. Reading
+    them is a primary-key lookup per table.
+    """
+    names = sorted(set(tables))
+    with read_connection() as conn:
+        rows = conn.execute(
+            "SELECT version, updated_at FROM table_version"
+            f" WHERE name IN ({_placeholders(names)}) ORDER BY name",
+            names,
+        ).fetchall()
+    if len(rows) != len(names):
+        raise ValueError(f"untracked table in {names}")
+    token = ".".join(f"{version}-{updated_at}" for version, updated_at in rows)
+    return token, max(updated_at for _, updated_at in rows)
 
-def get_teacher(teacher_id: int) -> sqlite3.Row | None:
-    conn = get_connection()
-    cur = conn.execute("SELECT * FROM teacher WHERE id = ?", (teacher_id,))
-    return cur.fetchone()
 
+# --- Keyset pagination ---
 
-def update_teacher(teacher_id: int, first_name: str, last_name: str, email: str | None) -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE teacher SET first_name = ?, last_name = ?, email = ? WHERE id = ?",
-        (first_name, last_name, email, teacher_id),
-    )
-    conn.commit()
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
 
+TEACHER_KEYS = ("last_name", "first_name", "id")
+STUDENT_KEYS = ("last_name", "first_name", "id")
+COURSE_KEYS = ("name", "id")
 
-def delete_teacher(teacher_id: int) -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM teacher WHERE id = ?", (teacher_id,))
-    conn.commit()
 
+def encode_cursor(values: Sequence) -> str:
+    """Encode the sort key of the last row of a page as an opaque token."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-def get_teacher_courses(teacher_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        "SELECT * FROM course WHERE teacher_id = ? ORDER BY name",
-        (teacher_id,),
-    )
-    return cur.fetchall()
 
+def decode_cursor(cursor: str, size: int) -> list:
+    """Decode a token from :func:`encode_cursor`; raise ValueError if invalid."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("invalid cursor") from None
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("invalid cursor")
+    return values
+
+
+def page_cursor(rows: Sequence[sqlite3.Row], limit: int | None, keys: Sequence[str]) -> str | None:
+    """Return the cursor of the page following ``rows``, or None after the last page."""
+    if limit is None or len(rows) < limit:
+        return None
+    return encode_cursor([rows[-1][key] for key in keys])
+
+
+def _prefix(column: str, prefix: str | None) -> List[Tuple[str, tuple]]:
+    """Filter on a case-sensitive prefix as an index-friendly range."""
+    if not prefix:
+        return []
+    return [(f"{column} >= ? AND {column} < ?", (prefix, prefix + "\U0010ffff"))]
+
+
+def _keyset_page(
+    conn: sqlite3.Connection,
+    select: str,
+    keys: Sequence[str],
+    filters: List[Tuple[str, tuple]],
+    after: str | None,
+    limit: int | None,
+) -> List[sqlite3.Row]:
+    """Run ``select`` ordered by ``keys``, starting after the ``after`` cursor."""
+    clauses = [clause for clause, _ in filters]
+    params = [param for _, values in filters for param in values]
+    if after is not None:
+        values = decode_cursor(after, len(keys))
+        clauses.append(f"({', '.join(keys)}) > ({_placeholders(values)})")
+        params.extend(values)
+    sql = select
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY " + ", ".join(keys)
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return conn.execute(sql, params).fetchall()
 
-def get_teacher_students(teacher_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        """
-        SELECT DISTINCT s.*
-        FROM student s
-        JOIN enrollment e ON s.id = e.student_id
-        JOIN course c ON e.course_id = c.id
-        WHERE c.teacher_id = ?
-        ORDER BY s.last_name, s.first_name
-        """,
-        (teacher_id,),
-    )
-    return cur.fetchall()
 
+# --- CRUD operations ---
 
-def get_teacher_evaluations(teacher_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        """
-        SELECT s.first_name || ' ' || s.last_name AS student_name,
-               c.name AS course_name,
-               e.grade
-        FROM enrollment e
-        JOIN student s ON e.student_id = s.id
-        JOIN course c ON e.course_id = c.id
-        WHERE c.teacher_id = ? AND e.grade IS NOT NULL
-        ORDER BY c.name, student_name
-        """,
-        (teacher_id,),
-    )
-    return cur.fetchall()
+@_invalidates_analytics
+@_serialized
+def add_teacher(first_name: str, last_name: str, email: str | None = None) -> int:
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO teacher(first_name, last_name, email) VALUES (?, ?, ?)",
+            (first_name, last_name, email),
+        )
+        conn.commit()
+        return cur.lastrowid
 
 
-def get_enrollments_for_course(course_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        """
-        SELECT e.id, s.first_name || ' ' || s.last_name AS student_name,
-               e.grade, e.status
-        FROM enrollment e
-        JOIN student s ON e.student_id = s.id
-        WHERE e.course_id = ?
-        ORDER BY student_name
-        """,
-        (course_id,),
-    )
-    return cur.fetchall()
+def list_teachers(
+    limit: int | None = None,
+    after: str | None = None,
+    last_name: str | None = None,
+) -> List[sqlite3.Row]:
+    """Return teachers by name, optionally one page after the ``after`` cursor."""
+    with read_connection() as conn:
+        return _keyset_page(
+            conn, "SELECT * FROM teacher", TEACHER_KEYS,
+            _prefix("last_name", last_name), after, limit,
+        )
 
 
-def add_course(name: str, credits: int, teacher_id: int | None) -> int:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE teacher SET first_name = ?, last_name = ?, email = ? WHERE id = ?",
-        (first_name, last_name, email, teacher_id),
-    )
-    conn.commit()
+def get_teacher(teacher_id: int) -> sqlite3.Row | None:
+    with read_connection() as conn:
+        cur = conn.execute("SELECT * FROM teacher WHERE id = ?", (teacher_id,))
+        return cur.fetchone()
+
+
+@_invalidates_analytics
+@_serialized
+def update_teacher(teacher_id: int, first_name: str, last_name: str, email: str | None) -> None:
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE teacher SET first_name = ?, last_name = ?, email = ? WHERE id = ?",
+            (first_name, last_name, email, teacher_id),
+        )
+        conn.commit()
 
 
+@_invalidates_analytics
+@_serialized
 def delete_teacher(teacher_id: int) -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM teacher WHERE id = ?", (teacher_id,))
-    conn.commit()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM teacher WHERE id = ?", (teacher_id,))
+        conn.commit()
 
 
-def get_teacher_courses(teacher_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
+def _teacher_courses(conn: sqlite3.Connection, teacher_id: int) -> List[sqlite3.Row]:
     cur = conn.execute(
         "SELECT * FROM course WHERE teacher_id = ? ORDER BY name",
         (teacher_id,),
@@ -253,24 +276,27 @@ def get_teacher_courses(teacher_id: int) -> List[sqlite3.Row]:
     return cur.fetchall()
 
 
-def get_teacher_students(teacher_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
+def _teacher_students(conn: sqlite3.Connection, teacher_id: int) -> List[sqlite3.Row]:
+    # Filtering by id instead of DISTINCT over the join keeps duplicate
+    # student rows out of the sort.
     cur = conn.execute(
         """
-        SELECT DISTINCT s.*
-        FROM student s
-        JOIN enrollment e ON s.id = e.student_id
-        JOIN course c ON e.course_id = c.id
-        WHERE c.teacher_id = ?
-        ORDER BY s.last_name, s.first_name
+        SELECT *
+        FROM student
+        WHERE id IN (
+            SELECT e.student_id
+            FROM course c
+            JOIN enrollment e ON e.course_id = c.id
+            WHERE c.teacher_id = ?
+        )
+        ORDER BY last_name, first_name
         """,
         (teacher_id,),
     )
     return cur.fetchall()
 
 
-def get_teacher_evaluations(teacher_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
+def _teacher_evaluations(conn: sqlite3.Connection, teacher_id: int) -> List[sqlite3.Row]:
     cur = conn.execute(
         """
         SELECT s.first_name || ' ' || s.last_name AS student_name,
@@ -287,160 +313,68 @@ def get_teacher_evaluations(teacher_id: int) -> List[sqlite3.Row]:
     return cur.fetchall()
 
 
-def get_enrollments_for_course(course_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        """
-        SELECT e.id, s.first_name || ' ' || s.last_name AS student_name,
-               e.grade, e.status
-        FROM enrollment e
-        JOIN student s ON e.student_id = s.id
-        WHERE e.course_id = ?
-        ORDER BY student_name
-        """,
-        (course_id,),
-    )
-    return cur.fetchall()
-
-
-def get_student(student_id: int) -> sqlite3.Row | None:
-    conn = get_connection()
-    cur = conn.execute("SELECT * FROM student WHERE id = ?", (student_id,))
-    return cur.fetchone()
-
-
-def update_student(
-    student_id: int,
-    first_name: str,
-    last_name: str,
-    student_number: str,
-    email: str | None,
-) -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE student SET first_name = ?, last_name = ?, student_number = ?, email = ? WHERE id = ?",
-        (first_name, last_name, student_number, email, student_id),
-    )
-    conn.commit()
-
-
-def delete_student(student_id: int) -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM student WHERE id = ?", (student_id,))
-    conn.commit()
-
-
-def get_student_enrollments(student_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        """
-        SELECT e.*, c.name AS course_name
-        FROM enrollment e
-        JOIN course c ON e.course_id = c.id
-        WHERE e.student_id = ?
-        ORDER BY c.name
-        """,
-        (student_id,),
-    )
-    return cur.fetchall()
-
-
-def get_student_grades(student_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        """
-        SELECT e.*, c.name AS course_name
-        FROM enrollment e
-        JOIN course c ON e.course_id = c.id
-        WHERE e.student_id = ? AND e.grade IS NOT NULL
-        ORDER BY c.name
-        """,
-        (student_id,),
-    )
-    return cur.fetchall()
+def get_teacher_courses(teacher_id: int) -> List[sqlite3.Row]:
+    with read_connection() as conn:
+        return _teacher_courses(conn, teacher_id)
 
 
-def assign_course_to_program(program_id: int, course_id: int) -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE teacher SET first_name = ?, last_name = ?, email = ? WHERE id = ?",
-        (first_name, last_name, email, teacher_id),
-    )
-    conn.commit()
+def get_teacher_students(teacher_id: int) -> List[sqlite3.Row]:
+    with read_connection() as conn:
+        return _teacher_students(conn, teacher_id)
 
 
-def delete_teacher(teacher_id: int) -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM teacher WHERE id = ?", (teacher_id,))
-    conn.commit()
+def get_teacher_evaluations(teacher_id: int) -> List[sqlite3.Row]:
+    with read_connection() as conn:
+        return _teacher_evaluations(conn, teacher_id)
 
 
-def get_teacher_courses(teacher_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        "SELECT * FROM course WHERE teacher_id = ? ORDER BY name",
-        (teacher_id,),
-    )
-    return cur.fetchall()
+@dataclass
+class TeacherDashboard:
+    """Everything the teacher detail page shows, read in one snapshot."""
 
+    teacher: sqlite3.Row | None
+    courses: List[sqlite3.Row]
+    students: List[sqlite3.Row]
+    evaluations: List[sqlite3.Row]
 
-def get_teacher_students(teacher_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        """
-        SELECT DISTINCT s.*
-        FROM student s
-        JOIN enrollment e ON s.id = e.student_id
-        JOIN course c ON e.course_id = c.id
-        WHERE c.teacher_id = ?
-        ORDER BY s.last_name, s.first_name
-        """,
-        (teacher_id,),
-    )
-    return cur.fetchall()
 
+def get_teacher_dashboard(teacher_id: int) -> TeacherDashboard:
+    """Load a teacher with their courses, students and evaluations.
 
-def get_teacher_evaluations(teacher_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        """
-        SELECT s.first_name || ' ' || s.last_name AS student_name,
-               c.name AS course_name,
-               e.grade
-        FROM enrollment e
-        JOIN student s ON e.student_id = s.id
-        JOIN course c ON e.course_id = c.id
-        WHERE c.teacher_id = ? AND e.grade IS NOT NULL
-        ORDER BY c.name, student_name
-        """,
-        (teacher_id,),
-    )
-    return cur.fetchall()
+    Returns what ``get_teacher``, ``get_teacher_courses``,
+    ``get_teacher_students`` and ``get_teacher_evaluations`` return, read
+    on one connection in a single read transaction.
+    """
+    with read_connection(snapshot=True) as conn:
+        cur = conn.execute("SELECT * FROM teacher WHERE id = ?", (teacher_id,))
+        return TeacherDashboard(
+            teacher=cur.fetchone(),
+            courses=_teacher_courses(conn, teacher_id),
+            students=_teacher_students(conn, teacher_id),
+            evaluations=_teacher_evaluations(conn, teacher_id),
+        )
 
 
 def get_enrollments_for_course(course_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        """
-        SELECT e.id, s.first_name || ' ' || s.last_name AS student_name,
-               e.grade, e.status
-        FROM enrollment e
-        JOIN student s ON e.student_id = s.id
-        WHERE e.course_id = ?
-        ORDER BY student_name
-        """,
-        (course_id,),
-    )
-    return cur.fetchall()
+    with read_connection() as conn:
+        cur = conn.execute(
+            """
+            SELECT e.id, s.first_name || ' ' || s.last_name AS student_name,
+                   e.grade, e.status
+            FROM enrollment e
+            JOIN student s ON e.student_id = s.id
+            WHERE e.course_id = ?
+            ORDER BY student_name
+            """,
+            (course_id,),
+        )
+        return cur.fetchall()
 
 
+@_invalidates_analytics
+@_serialized
 def add_course(name: str, credits: int, teacher_id: int | None) -> int:
     with db_connection() as conn:
-        init_db(conn)
         cur = conn.cursor()
         cur.execute(
             "INSERT INTO course(name, credits, teacher_id) VALUES (?, ?, ?)",
@@ -450,20 +384,56 @@ def add_course(name: str, credits: int, teacher_id: int | None) -> int:
         return cur.lastrowid
 
 
-def list_courses() -> List[sqlite3.Row]:
-    with db_connection() as conn:
-        init_db(conn)
+def list_courses(
+    limit: int | None = None,
+    after: str | None = None,
+    name: str | None = None,
+    teacher_id: int | None = None,
+) -> List[sqlite3.Row]:
+    """Return courses by name, optionally one page after the ``after`` cursor."""
+    filters = _prefix("c.name", name)
+    if teacher_id is not None:
+        filters.append(("c.teacher_id = ?", (teacher_id,)))
+    with read_connection() as conn:
+        return _keyset_page(
+            conn,
+            "SELECT c.*, t.first_name || ' ' || t.last_name AS teacher_name "
+            "FROM course c LEFT JOIN teacher t ON c.teacher_id = t.id",
+            ["c." + key for key in COURSE_KEYS],
+            filters, after, limit,
+        )
+
+
+def get_course(course_id: int) -> sqlite3.Row | None:
+    with read_connection() as conn:
         cur = conn.execute(
             "SELECT c.*, t.first_name || ' ' || t.last_name AS teacher_name "
             "FROM course c LEFT JOIN teacher t ON c.teacher_id = t.id"
-            " ORDER BY c.name"
+            " WHERE c.id = ?",
+            (course_id,),
         )
-        return cur.fetchall()
+        return cur.fetchone()
+
+
+def get_courses_by_ids(course_ids: Sequence[int]) -> List[sqlite3.Row]:
+    """Return the courses with the given ids (in id order), one query per chunk."""
+    rows: List[sqlite3.Row] = []
+    with read_connection() as conn:
+        for chunk in _id_chunks(course_ids):
+            cur = conn.execute(
+                "SELECT c.*, t.first_name || ' ' || t.last_name AS teacher_name "
+                "FROM course c LEFT JOIN teacher t ON c.teacher_id = t.id"
+                f" WHERE c.id IN ({_placeholders(chunk)}) ORDER BY c.id",
+                chunk,
+            )
+            rows.extend(cur.fetchall())
+    return rows
 
 
+@_invalidates_analytics
+@_serialized
 def add_program(name: str, description: str | None = None) -> int:
     with db_connection() as conn:
-        init_db(conn)
         cur = conn.cursor()
         cur.execute(
             "INSERT INTO program(name, description) VALUES (?, ?)",
@@ -474,15 +444,21 @@ def add_program(name: str, description: str | None = None) -> int:
 
 
 def list_programs() -> List[sqlite3.Row]:
-    with db_connection() as conn:
-        init_db(conn)
+    with read_connection() as conn:
         cur = conn.execute("SELECT * FROM program ORDER BY name")
         return cur.fetchall()
 
 
+def get_program(program_id: int) -> sqlite3.Row | None:
+    with read_connection() as conn:
+        cur = conn.execute("SELECT * FROM program WHERE id = ?", (program_id,))
+        return cur.fetchone()
+
+
+@_invalidates_analytics
+@_serialized
 def add_student(first_name: str, last_name: str, student_number: str, email: str | None = None) -> int:
     with db_connection() as conn:
-        init_db(conn)
         cur = conn.cursor()
         cur.execute(
             "INSERT INTO student(first_name, last_name, student_number, email) VALUES (?, ?, ?, ?)",
@@ -492,20 +468,59 @@ def add_student(first_name: str, last_name: str, student_number: str, email: str
         return cur.lastrowid
 
 
-def list_students() -> List[sqlite3.Row]:
-    with db_connection() as conn:
-        init_db(conn)
-        cur = conn.execute("SELECT * FROM student ORDER BY last_name, first_name")
-        return cur.fetchall()
+def list_students(
+    limit: int | None = None,
+    after: str | None = None,
+    last_name: str | None = None,
+    student_number: str | None = None,
+) -> List[sqlite3.Row]:
+    """Return students by name, optionally one page after the ``after`` cursor."""
+    filters = _prefix("last_name", last_name) + _prefix("student_number", student_number)
+    with read_connection() as conn:
+        return _keyset_page(
+            conn, "SELECT * FROM student", STUDENT_KEYS, filters, after, limit,
+        )
 
 
 def get_student(student_id: int) -> sqlite3.Row | None:
-    with db_connection() as conn:
-        init_db(conn)
+    with read_connection() as conn:
         cur = conn.execute("SELECT * FROM student WHERE id = ?", (student_id,))
         return cur.fetchone()
 
 
+def get_students_by_ids(student_ids: Sequence[int]) -> List[sqlite3.Row]:
+    """Return the students with the given ids (in id order), one query per chunk."""
+    rows: List[sqlite3.Row] = []
+    with read_connection() as conn:
+        for chunk in _id_chunks(student_ids):
+            cur = conn.execute(
+                f"SELECT * FROM student WHERE id IN ({_placeholders(chunk)}) ORDER BY id",
+                chunk,
+            )
+            rows.extend(cur.fetchall())
+    return rows
+
+
+@_invalidates_analytics
+@_serialized
+def add_students(
+    students: Iterable[Tuple[str, str, str, str | None]]
+) -> List[int | sqlite3.IntegrityError]:
+    """Insert ``(first_name, last_name, student_number, email)`` tuples.
+
+    All rows are written in one transaction; each entry of the result is
+    the new student id or the constraint error that rejected that row.
+    """
+    with db_connection() as conn:
+        return _insert_each(
+            conn,
+            "INSERT INTO student(first_name, last_name, student_number, email) VALUES (?, ?, ?, ?)",
+            students,
+        )
+
+
+@_invalidates_analytics
+@_serialized
 def update_student(
     student_id: int,
     first_name: str,
@@ -522,6 +537,8 @@ def update_student(
         conn.commit()
 
 
+@_invalidates_analytics
+@_serialized
 def delete_student(student_id: int) -> None:
     with db_connection() as conn:
         cur = conn.cursor()
@@ -530,8 +547,7 @@ def delete_student(student_id: int) -> None:
 
 
 def get_student_enrollments(student_id: int) -> List[sqlite3.Row]:
-    with db_connection() as conn:
-        init_db(conn)
+    with read_connection() as conn:
         cur = conn.execute(
             """
             SELECT e.*, c.name AS course_name
@@ -546,8 +562,7 @@ def get_student_enrollments(student_id: int) -> List[sqlite3.Row]:
 
 
 def get_student_grades(student_id: int) -> List[sqlite3.Row]:
-    with db_connection() as conn:
-        init_db(conn)
+    with read_connection() as conn:
         cur = conn.execute(
             """
             SELECT e.*, c.name AS course_name
@@ -561,117 +576,8 @@ def get_student_grades(student_id: int) -> List[sqlite3.Row]:
         return cur.fetchall()
 
 
-def get_student(student_id: int) -> sqlite3.Row | None:
-    conn = get_connection()
-    cur = conn.execute("SELECT * FROM student WHERE id = ?", (student_id,))
-    return cur.fetchone()
-
-
-def get_student(student_id: int) -> sqlite3.Row | None:
-    conn = get_connection()
-    cur = conn.execute("SELECT * FROM student WHERE id = ?", (student_id,))
-    return cur.fetchone()
-
-def update_student(
-    student_id: int,
-    first_name: str,
-    last_name: str,
-    student_number: str,
-    email: str | None,
-) -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE student SET first_name = ?, last_name = ?, student_number = ?, email = ? WHERE id = ?",
-        (first_name, last_name, student_number, email, student_id),
-    )
-    conn.commit()
-
-
-def delete_student(student_id: int) -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM student WHERE id = ?", (student_id,))
-    conn.commit()
-
-
-def get_student_enrollments(student_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        """
-        SELECT e.*, c.name AS course_name
-        FROM enrollment e
-        JOIN course c ON e.course_id = c.id
-        WHERE e.student_id = ?
-        ORDER BY c.name
-        """,
-        (student_id,),
-    )
-    return cur.fetchall()
-
-
-def get_student_grades(student_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        """
-        SELECT e.*, c.name AS course_name
-        FROM enrollment e
-        JOIN course c ON e.course_id = c.id
-        WHERE e.student_id = ? AND e.grade IS NOT NULL
-        ORDER BY c.name
-        """,
-        (student_id,),
-    )
-    return cur.fetchall()
-
-
-def assign_course_to_program(program_id: int, course_id: int) -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE student SET first_name = ?, last_name = ?, student_number = ?, email = ? WHERE id = ?",
-        (first_name, last_name, student_number, email, student_id),
-    )
-    conn.commit()
-
-
-def delete_student(student_id: int) -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM student WHERE id = ?", (student_id,))
-    conn.commit()
-
-
-def get_student_enrollments(student_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        """
-        SELECT e.*, c.name AS course_name
-        FROM enrollment e
-        JOIN course c ON e.course_id = c.id
-        WHERE e.student_id = ?
-        ORDER BY c.name
-        """,
-        (student_id,),
-    )
-    return cur.fetchall()
-
-
-def get_student_grades(student_id: int) -> List[sqlite3.Row]:
-    conn = get_connection()
-    cur = conn.execute(
-        """
-        SELECT e.*, c.name AS course_name
-        FROM enrollment e
-        JOIN course c ON e.course_id = c.id
-        WHERE e.student_id = ? AND e.grade IS NOT NULL
-        ORDER BY c.name
-        """,
-        (student_id,),
-    )
-    return cur.fetchall()
-
-
+@_invalidates_analytics
+@_serialized
 def assign_course_to_program(program_id: int, course_id: int) -> None:
     with db_connection() as conn:
         cur = conn.cursor()
@@ -682,6 +588,8 @@ def assign_course_to_program(program_id: int, course_id: int) -> None:
         conn.commit()
 
 
+@_invalidates_analytics
+@_serialized
 def enroll_student_in_program(student_id: int, program_id: int, start_date: Optional[date] = None) -> None:
     with db_connection() as conn:
         cur = conn.cursor()
@@ -692,6 +600,8 @@ def enroll_student_in_program(student_id: int, program_id: int, start_date: Opti
         conn.commit()
 
 
+@_invalidates_analytics
+@_group_committed
 def enroll_student_in_course(student_id: int, course_id: int, semester: str) -> int:
     with db_connection() as conn:
         cur = conn.cursor()
@@ -703,6 +613,50 @@ def enroll_student_in_course(student_id: int, course_id: int, semester: str) ->
         return cur.lastrowid
 
 
+@_invalidates_analytics
+@_serialized
+def enroll_students_in_courses(
+    enrollments: Sequence[Tuple[int, int, str]]
+) -> List[int | LookupError | sqlite3.IntegrityError]:
+    """Insert ``(student_id, course_id, semester)`` enrollments in one transaction.
+
+    Each entry of the result is the new enrollment id, a ``LookupError`` if
+    the student or course does not exist, or the ``IntegrityError`` raised
+    for a duplicate enrollment.
+    """
+    student_ids = sorted({student_id for student_id, _, _ in enrollments})
+    course_ids = sorted({course_id for _, course_id, _ in enrollments})
+    with db_connection() as conn:
+        known_students = _existing_ids(conn, "student", student_ids)
+        known_courses = _existing_ids(conn, "course", course_ids)
+        results: List[int | LookupError | sqlite3.IntegrityError | None] = []
+        valid = []
+        for student_id, course_id, semester in enrollments:
+            if student_id not in known_students:
+                results.append(LookupError("Student not found"))
+            elif course_id not in known_courses:
+                results.append(LookupError("Course not found"))
+            else:
+                results.append(None)
+                valid.append((student_id, course_id, semester, 'enrolled'))
+        inserted = iter(
+            _insert_each(
+                conn,
+                "INSERT INTO enrollment(student_id, course_id, semester, status) VALUES (?, ?, ?, ?)",
+                valid,
+            )
+        )
+        return [next(inserted) if result is None else result for result in results]
+
+
+def get_enrollment(enrollment_id: int) -> sqlite3.Row | None:
+    with read_connection() as conn:
+        cur = conn.execute("SELECT * FROM enrollment WHERE id = ?", (enrollment_id,))
+        return cur.fetchone()
+
+
+@_invalidates_analytics
+@_group_committed
 def record_grade(enrollment_id: int, grade: str, status: str) -> None:
     with db_connection() as conn:
         cur = conn.cursor()
@@ -713,12 +667,382 @@ def record_grade(enrollment_id: int, grade: str, status: str) -> None:
         conn.commit()
 
 
+# --- Grade entry ---
+
+GRADES = ("A", "B", "C", "D", "E", "F")
+GRADE_STATUSES = ("completed", "failed")
+
+
+def _grade_params(record: dict) -> Tuple[int, str, str]:
+    """Validate one grade record as ``(enrollment_id, grade, status)``."""
+    if isinstance(record, RecordError):
+        raise record
+    enrollment_id = _integer(record, "enrollment_id")
+    grade = _text(record, "grade").upper()
+    if grade not in GRADES:
+        raise ValueError(f"grade must be one of {', '.join(GRADES)}, got {grade!r}")
+    status = _text(record, "status", False) or "completed"
+    if status not in GRADE_STATUSES:
+        raise ValueError(f"status must be one of {', '.join(GRADE_STATUSES)}, got {status!r}")
+    return enrollment_id, grade, status
+
+
+def _enrollment_courses(conn: sqlite3.Connection, ids: Sequence[int]) -> Dict[int, int]:
+    """Map each existing enrollment id in ``ids`` to its course id."""
+    courses: Dict[int, int] = {}
+    for chunk in _id_chunks(ids):
+        cur = conn.execute(
+            f"SELECT id, course_id FROM enrollment WHERE id IN ({_placeholders(chunk)})",
+            chunk,
+        )
+        courses.update(cur.fetchall())
+    return courses
+
+
+@_invalidates_analytics
+@_serialized
+def record_grades(
+    records: Iterable[dict], course_id: int | None = None
+) -> List[ValueError | LookupError | None]:
+    """Record many grades with one ``executemany`` in a single transaction.
+
+    Records hold ``enrollment_id``, ``grade`` and optionally ``status``
+    (``completed`` by default). With ``course_id`` every enrollment must
+    belong to that course. Each entry of the result is None for a recorded
+    grade, or the ``ValueError`` or ``LookupError`` that rejected its
+    record; rejected records do not stop the others.
+    """
+    results: List[ValueError | LookupError | None] = []
+    params: List[Tuple[int, str, str] | None] = []
+    for record in records:
+        try:
+            params.append(_grade_params(record))
+            results.append(None)
+        except ValueError as exc:
+            params.append(None)
+            results.append(exc)
+    ids = sorted({item[0] for item in params if item is not None})
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            courses = _enrollment_courses(conn, ids)
+            updates = []
+            for index, item in enumerate(params):
+                if item is None:
+                    continue
+                enrollment_id, grade, status = item
+                if enrollment_id not in courses:
+                    results[index] = LookupError(f"enrollment {enrollment_id} not found")
+                elif course_id is not None and courses[enrollment_id] != course_id:
+                    results[index] = LookupError(
+                        f"enrollment {enrollment_id} is not in course {course_id}"
+                    )
+                else:
+                    updates.append((grade, status, enrollment_id))
+            conn.executemany("UPDATE enrollment SET grade = ?, status = ? WHERE id = ?", updates)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return results
+
+
+# --- Search ---
+
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+
+def _match_query(text: str) -> str | None:
+    """Turn user input into an FTS5 query matching every word as a prefix."""
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search(kind: str, text: str, limit: int = SEARCH_LIMIT) -> List[sqlite3.Row]:
+    """Return up to ``limit`` teachers, students or courses matching ``text``.
+
+    Every word of ``text`` must prefix-match the name, email or student
+    number. Rows have ``id`` and a display ``label``, best matches first.
+    """
+    if kind not in SEARCH_KINDS:
+        raise ValueError(f"cannot search {kind!r}; choose from {', '.join(SEARCH_KINDS)}")
+    query = _match_query(text)
+    if query is None:
+        return []
+    with read_connection() as conn:
+        cur = conn.execute(
+            """
+            SELECT rowid / 4 AS id,
+                   name || COALESCE(' (' || student_number || ')', '') AS label
+            FROM search_index
+            WHERE search_index MATCH ? AND rowid % 4 = ?
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (query, SEARCH_KINDS[kind], limit),
+        )
+        return cur.fetchall()
+
+
+# --- Bulk import ---
+
+IMPORT_ENTITIES = ("teachers", "students", "courses", "enrollments")
+IMPORT_BATCH_SIZE = 1000
+
+
+@dataclass
+class ImportResult:
+    """Outcome of :func:`import_records`."""
+
+    inserted: int = 0
+    rejected: List[Tuple[int, str]] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        total = self.inserted + len(self.rejected)
+        return total / self.seconds if self.seconds else 0.0
+
+
+def _text(record: dict, key: str, required: bool = True) -> str | None:
+    value = record.get(key)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise ValueError(f"missing {key}")
+        return None
+    return str(value).strip()
+
+
+def _integer(record: dict, key: str, required: bool = True) -> int | None:
+    value = _text(record, key, required)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{key} must be an integer, got {value!r}") from None
+
+
+def _lookup(
+    record: dict, id_key: str, name_key: str, index: Dict[str, int | None]
+) -> int:
+    """Resolve a reference given either by id or by its natural key."""
+    ref_id = _integer(record, id_key, required=False)
+    if ref_id is not None:
+        return ref_id
+    name = _text(record, name_key, required=False)
+    if name is None:
+        raise ValueError(f"missing {id_key} or {name_key}")
+    if name not in index:
+        raise ValueError(f"unknown {name_key} {name!r}")
+    ref_id = index[name]
+    if ref_id is None:
+        raise ValueError(f"ambiguous {name_key} {name!r}")
+    return ref_id
+
+
+def _build_index(conn: sqlite3.Connection, sql: str) -> Dict[str, int | None]:
+    """Map natural keys to ids; keys shared by several rows map to None."""
+    index: Dict[str, int | None] = {}
+    for key, row_id in conn.execute(sql):
+        index[key] = None if key in index else row_id
+    return index
+
+
+def _importer(conn: sqlite3.Connection, entity: str):
+    """Return ``(insert_sql, record_to_params)`` for ``entity``."""
+    if entity == "teachers":
+        return (
+            "INSERT INTO teacher(first_name, last_name, email) VALUES (?, ?, ?)",
+            lambda r: (_text(r, "first_name"), _text(r, "last_name"), _text(r, "email", False)),
+        )
+    if entity == "students":
+        return (
+            "INSERT INTO student(first_name, last_name, student_number, email)"
+            " VALUES (?, ?, ?, ?)",
+            lambda r: (
+                _text(r, "first_name"),
+                _text(r, "last_name"),
+                _text(r, "student_number"),
+                _text(r, "email", False),
+            ),
+        )
+    if entity == "courses":
+        return (
+            "INSERT INTO course(name, credits, teacher_id) VALUES (?, ?, ?)",
+            lambda r: (_text(r, "name"), _integer(r, "credits"), _integer(r, "teacher_id", False)),
+        )
+    if entity == "enrollments":
+        students = _build_index(conn, "SELECT student_number, id FROM student")
+        courses = _build_index(conn, "SELECT name, id FROM course")
+        return (
+            "INSERT INTO enrollment(student_id, course_id, semester, status, grade)"
+            " VALUES (?, ?, ?, ?, ?)",
+            lambda r: (
+                _lookup(r, "student_id", "student_number", students),
+                _lookup(r, "course_id", "course_name", courses),
+                _text(r, "semester"),
+                _text(r, "status", False) or "enrolled",
+                _text(r, "grade", False),
+            ),
+        )
+    raise ValueError(f"cannot import {entity!r}; choose from {', '.join(IMPORT_ENTITIES)}")
+
+
+def _insert_batch(
+    conn: sqlite3.Connection,
+    sql: str,
+    batch: List[Tuple[int, tuple]],
+    result: ImportResult,
+) -> None:
+    """Insert one batch in a single transaction.
+
+    The batch goes through ``executemany``; if a constraint rejects any row
+    it is replayed row by row so that only the offending rows are dropped.
+    """
+    conn.execute("BEGIN")
+    try:
+        conn.execute("SAVEPOINT batch")
+        try:
+            conn.executemany(sql, [params for _, params in batch])
+            conn.execute("RELEASE batch")
+            result.inserted += len(batch)
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK TO batch")
+            conn.execute("RELEASE batch")
+            for line, params in batch:
+                try:
+                    conn.execute(sql, params)
+                except sqlite3.IntegrityError as exc:
+                    result.rejected.append((line, str(exc)))
+                else:
+                    result.inserted += 1
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def _write_batch(sql: str, batch: List[Tuple[int, tuple]], result: ImportResult) -> None:
+    with db_connection() as conn:
+        _insert_batch(conn, sql, batch, result)
+
+
+@_invalidates_analytics
+def import_records(
+    entity: str, records: Iterable[dict], batch_size: int = IMPORT_BATCH_SIZE
+) -> ImportResult:
+    """Stream ``records`` into ``entity`` in batched transactions.
+
+    Records are dictionaries keyed by column name, numbered from 1 in the
+    order they are consumed. Enrollments may reference students by
+    ``student_number`` and courses by ``course_name`` instead of by id.
+    Rows that fail validation or a constraint, and lines the reader could
+    not parse (:class:`school_io.RecordError`), are reported in
+    :attr:`ImportResult.rejected` and do not stop the import.
+
+    Records are parsed on the calling thread and each batch is a separate
+    write, so other writes are not held up for the whole import.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    result = ImportResult()
+    started = time.perf_counter()
+    with read_connection() as conn:
+        sql, to_params = _importer(conn, entity)
+    batch: List[Tuple[int, tuple]] = []
+    for line, record in enumerate(records, start=1):
+        try:
+            if isinstance(record, RecordError):
+                raise record
+            batch.append((line, to_params(record)))
+        except ValueError as exc:
+            result.rejected.append((line, str(exc)))
+            continue
+        if len(batch) >= batch_size:
+            write(_write_batch, sql, batch, result)
+            batch = []
+    if batch:
+        write(_write_batch, sql, batch, result)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+# --- Streaming export ---
+
+EXPORT_CHUNK_SIZE = 1000
+
+
+def _iter_by_id(
+    sql: str, chunk_size: int = EXPORT_CHUNK_SIZE, params: dict | None = None, key: str = "id"
+) -> Iterator[sqlite3.Row]:
+    """Yield the rows of ``sql`` in ``key`` order, one short connection checkout per chunk.
+
+    ``sql`` must select the ``key`` column, keep keys above ``:after`` and
+    end with ``ORDER BY <key> LIMIT :limit``; ``params`` are bound
+    alongside. No connection is held while the consumer works through a
+    chunk, so a client that stops reading a stream does not keep a pool slot.
+    """
+    after = 0
+    while True:
+        with read_connection() as conn:
+            rows = conn.execute(sql, {**(params or {}), "after": after, "limit": chunk_size}).fetchall()
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1][key]
+
+
+def iter_teachers(chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[sqlite3.Row]:
+    return _iter_by_id(
+        "SELECT * FROM teacher WHERE id > :after ORDER BY id LIMIT :limit", chunk_size
+    )
+
+
+def iter_students(chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[sqlite3.Row]:
+    return _iter_by_id(
+        "SELECT * FROM student WHERE id > :after ORDER BY id LIMIT :limit", chunk_size
+    )
+
+
+def iter_courses(chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[sqlite3.Row]:
+    return _iter_by_id(
+        "SELECT * FROM course WHERE id > :after ORDER BY id LIMIT :limit", chunk_size
+    )
+
+
+def iter_enrollments(chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[sqlite3.Row]:
+    """Yield enrollments with the student number and course name alongside the ids."""
+    return _iter_by_id(
+        """
+        SELECT e.*, s.student_number, c.name AS course_name
+        FROM enrollment e
+        LEFT JOIN student s ON e.student_id = s.id
+        LEFT JOIN course c ON e.course_id = c.id
+        WHERE e.id > :after
+        ORDER BY e.id
+        LIMIT :limit
+        """,
+        chunk_size,
+    )
+
+
+EXPORTS = {
+    "teachers": iter_teachers,
+    "students": iter_students,
+    "courses": iter_courses,
+    "enrollments": iter_enrollments,
+}
+
+
 # --- Query functions ---
 
 def get_student_progress(student_id: int, program_id: int) -> Tuple[int, int, int]:
     """Return (passed, remaining, failed_attempts)."""
-    with db_connection() as conn:
-        init_db(conn)
+    with read_connection(snapshot=True) as conn:
         cur = conn.cursor()
 
         # total courses in program
@@ -754,15 +1078,57 @@ def get_student_progress(student_id: int, program_id: int) -> Tuple[int, int, in
         return passed, remaining, failed
 
 
+# Progress of the students of a program after ``:after`` by id, in one grouped
+# query; counts follow get_student_progress.
+_PROGRAM_PROGRESS_SQL = """
+    SELECT sp.student_id, s.student_number,
+           s.first_name || ' ' || s.last_name AS name,
+           SUM(CASE WHEN e.status = 'completed' AND e.grade != 'F' THEN 1 ELSE 0 END) AS passed,
+           MAX(
+               (SELECT COUNT(*) FROM program_course WHERE program_id = :program_id)
+               - SUM(CASE WHEN e.status = 'completed' AND e.grade != 'F' THEN 1 ELSE 0 END),
+               0
+           ) AS remaining,
+           SUM(CASE WHEN e.status = 'failed' THEN 1 ELSE 0 END) AS failed
+    FROM student_program sp
+    JOIN student s ON s.id = sp.student_id
+    LEFT JOIN program_course pc ON pc.program_id = sp.program_id
+    LEFT JOIN enrollment e ON e.student_id = sp.student_id AND e.course_id = pc.course_id
+    WHERE sp.program_id = :program_id AND sp.student_id > :after
+    GROUP BY sp.student_id
+    ORDER BY sp.student_id
+    LIMIT :limit
+"""
+
+
+def get_program_progress(program_id: int) -> List[sqlite3.Row]:
+    """Return (student_id, student_number, name, passed, remaining, failed)
+    for every student of the program."""
+    with read_connection() as conn:
+        cur = conn.execute(
+            _PROGRAM_PROGRESS_SQL, {"program_id": program_id, "after": 0, "limit": -1}
+        )
+        return cur.fetchall()
+
+
+def iter_program_progress(
+    program_id: int, chunk_size: int = EXPORT_CHUNK_SIZE
+) -> Iterator[sqlite3.Row]:
+    """Like :func:`get_program_progress` but streamed in chunks."""
+    return _iter_by_id(
+        _PROGRAM_PROGRESS_SQL, chunk_size, {"program_id": program_id}, key="student_id"
+    )
+
+
+@analytics_cache.cached
 def get_most_popular_courses(limit: int = 5) -> List[sqlite3.Row]:
-    with db_connection() as conn:
-        init_db(conn)
+    """Return the courses with most enrollments from the trigger-kept counters."""
+    with read_connection() as conn:
         cur = conn.execute(
             """
-            SELECT c.id, c.name, COUNT(e.id) AS cnt
-            FROM course c LEFT JOIN enrollment e ON c.id = e.course_id
-            GROUP BY c.id
-            ORDER BY cnt DESC, c.name
+            SELECT id, name, enrollment_count AS cnt
+            FROM course
+            ORDER BY enrollment_count DESC, name
             LIMIT ?
             """,
             (limit,),
@@ -770,17 +1136,15 @@ def get_most_popular_courses(limit: int = 5) -> List[sqlite3.Row]:
         return cur.fetchall()
 
 
+@analytics_cache.cached
 def get_most_popular_teachers(limit: int = 5) -> List[sqlite3.Row]:
-    with db_connection() as conn:
-        init_db(conn)
+    """Return the teachers with most enrollments from the trigger-kept counters."""
+    with read_connection() as conn:
         cur = conn.execute(
             """
-            SELECT t.id, t.first_name || ' ' || t.last_name AS name, COUNT(e.id) AS cnt
-            FROM teacher t
-            LEFT JOIN course c ON t.id = c.teacher_id
-            LEFT JOIN enrollment e ON c.id = e.course_id
-            GROUP BY t.id
-            ORDER BY cnt DESC, name
+            SELECT id, first_name || ' ' || last_name AS name, enrollment_count AS cnt
+            FROM teacher
+            ORDER BY enrollment_count DESC, name
             LIMIT ?
             """,
             (limit,),
@@ -788,20 +1152,43 @@ def get_most_popular_teachers(limit: int = 5) -> List[sqlite3.Row]:
         return cur.fetchall()
 
 
-def get_best_students(limit: int = 5) -> List[sqlite3.Row]:
+@_invalidates_analytics
+@_serialized
+def rebuild_enrollment_counts() -> None:
+    """Recompute the per-course and per-teacher enrollment counters."""
+    _run_script(REBUILD_ENROLLMENT_COUNTS)
+
+
+@_invalidates_analytics
+@_serialized
+def rebuild_student_stats() -> None:
+    """Recompute the per-student grade statistics behind the leaderboards."""
+    _run_script(REBUILD_STUDENT_STATS)
+
+
+def _run_script(statements: Sequence[str]) -> None:
     with db_connection() as conn:
-        init_db(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+@analytics_cache.cached
+def get_best_students(limit: int = 5) -> List[sqlite3.Row]:
+    """Return students by average grade over completed courses, best first."""
+    with read_connection() as conn:
         cur = conn.execute(
             """
-            SELECT s.id, s.first_name || ' ' || s.last_name AS name,
-                   AVG(CASE e.grade
-                           WHEN 'A' THEN 5 WHEN 'B' THEN 4 WHEN 'C' THEN 3
-                           WHEN 'D' THEN 2 WHEN 'E' THEN 1 ELSE 0 END) AS avg_grade
-            FROM student s
-            JOIN enrollment e ON s.id = e.student_id AND e.status = 'completed'
-            GROUP BY s.id
-            HAVING COUNT(e.id) > 0
-            ORDER BY avg_grade DESC
+            SELECT s.id, s.first_name || ' ' || s.last_name AS name, st.avg_grade
+            FROM student_stats st
+            JOIN student s ON s.id = st.student_id
+            WHERE st.completed_count > 0
+            ORDER BY st.avg_grade DESC
             LIMIT ?
             """,
             (limit,),
@@ -809,21 +1196,28 @@ def get_best_students(limit: int = 5) -> List[sqlite3.Row]:
         return cur.fetchall()
 
 
+@analytics_cache.cached
 def get_at_risk_students(limit: int = 5) -> List[sqlite3.Row]:
-    with db_connection() as conn:
-        init_db(conn)
+    """Return students with more failed than passed courses, most failures first."""
+    with read_connection() as conn:
         cur = conn.execute(
             """
             SELECT s.id, s.first_name || ' ' || s.last_name AS name,
-                   SUM(CASE WHEN e.status = 'failed' THEN 1 ELSE 0 END) AS failed,
-                   SUM(CASE WHEN e.status = 'completed' AND e.grade != 'F' THEN 1 ELSE 0 END) AS passed
-            FROM student s
-            LEFT JOIN enrollment e ON s.id = e.student_id
-            GROUP BY s.id
-            HAVING failed > passed
-            ORDER BY failed DESC
+                   st.failed, st.passed
+            FROM student_stats st
+            JOIN student s ON s.id = st.student_id
+            WHERE st.failed > st.passed
+            ORDER BY st.failed DESC
             LIMIT ?
             """,
             (limit,),
         )
         return cur.fetchall()
+
+
+# Pure helpers that never touch the database are left unwrapped.
+if school_metrics.ENABLED:
+    school_metrics.instrument(
+        sys.modules[__name__],
+        exclude=("encode_cursor", "decode_cursor", "page_cursor"),
+    )
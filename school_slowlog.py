@@ -0,0 +1,231 @@
+"""Slow-query log for the SQLite connections opened by :mod:`school_db`.
+
+Set ``SCHOOL_SLOW_QUERY_MS`` to log every statement whose execution plus
+fetching takes at least that many milliseconds. Each entry is one JSON
+line in ``SCHOOL_SLOW_QUERY_LOG`` (rotated at
+``SCHOOL_SLOW_QUERY_MAX_BYTES``) holding the SQL, its parameters, the
+duration, the rows returned or changed, the calling ``school_service``
+function and the ``EXPLAIN QUERY PLAN`` output::
+
+    {"duration_ms": 412.7, "rows": 3120, "caller": "get_teacher_students",
+     "sql": "SELECT DISTINCT s.id, ...", "params": [17],
+     "plan": ["SCAN e", "SEARCH c USING INTEGER PRIMARY KEY (rowid=?)"], ...}
+
+With ``SCHOOL_SLOW_QUERY_REDACT=1`` parameters are logged as their type
+names only. When no threshold is set connections are plain
+:class:`sqlite3.Connection` objects and nothing is timed.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Any, Iterable, Optional
+
+_threshold = os.environ.get("SCHOOL_SLOW_QUERY_MS")
+THRESHOLD_MS: Optional[float] = float(_threshold) if _threshold else None
+LOG_PATH = os.environ.get("SCHOOL_SLOW_QUERY_LOG", "slow_queries.jsonl")
+MAX_BYTES = int(os.environ.get("SCHOOL_SLOW_QUERY_MAX_BYTES", str(10 * 1024 * 1024)))
+BACKUPS = int(os.environ.get("SCHOOL_SLOW_QUERY_BACKUPS", "5"))
+REDACT = os.environ.get("SCHOOL_SLOW_QUERY_REDACT", "0").lower() in ("1", "true", "yes", "on")
+ENABLED = THRESHOLD_MS is not None
+
+# Frames of this module are attributed to the service function calling it.
+CALLER_MODULE = "school_service"
+
+logger = logging.getLogger("school_db.slow_queries")
+logger.propagate = False
+_handler_lock = threading.Lock()
+
+
+def _ensure_handler() -> None:
+    if logger.handlers:
+        return
+    with _handler_lock:
+        if not logger.handlers:
+            handler = RotatingFileHandler(
+                LOG_PATH, maxBytes=MAX_BYTES, backupCount=BACKUPS, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+
+def _caller() -> Optional[str]:
+    """Name of the public ``school_service`` function on the stack.
+
+    Private helpers (``_keyset_page``) are skipped, and the ``wrapper``
+    frames of the service decorators stand for the function they wrap.
+    The innermost helper is only reported when no public function is on
+    the stack, as for a generator consumed after its function returned.
+    """
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        if frame.f_globals.get("__name__") == CALLER_MODULE:
+            name = frame.f_code.co_name
+            if name == "wrapper":
+                name = getattr(frame.f_locals.get("fn"), "__name__", name)
+            if not name.startswith("_") and name != "wrapper":
+                return name
+            fallback = fallback or name
+        frame = frame.f_back
+    return fallback
+
+
+def _params(params: Any) -> Any:
+    if params is None:
+        return None
+    if REDACT:
+        if isinstance(params, dict):
+            return {key: type(value).__name__ for key, value in params.items()}
+        return [type(value).__name__ for value in params]
+    if isinstance(params, dict):
+        return {key: _jsonable(value) for key, value in params.items()}
+    return [_jsonable(value) for value in params]
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    return value
+
+
+class SlowQueryCursor(sqlite3.Cursor):
+    """Cursor timing its statement across ``execute`` and every fetch.
+
+    The statement is judged once it is finished: when a fetch runs out of
+    rows, on ``close`` or when the cursor is garbage collected (which is
+    how single-row lookups end).
+    """
+
+    _started: Optional[float] = None
+
+    def _begin(self, sql: str, params: Any, many: bool) -> None:
+        self._finish()
+        self._sql = sql
+        self._params = None if many else params
+        self._many = many
+        self._elapsed = 0.0
+        self._rows = 0
+        self._caller = _caller()
+        self._started = time.perf_counter()
+
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._elapsed += time.perf_counter() - started
+
+    def execute(self, sql: str, params: Any = ()) -> "SlowQueryCursor":
+        self._begin(sql, params, many=False)
+        self._timed(super().execute, sql, params)
+        return self
+
+    def executemany(self, sql: str, seq_of_params: Iterable) -> "SlowQueryCursor":
+        self._begin(sql, None, many=True)
+        self._timed(super().executemany, sql, seq_of_params)
+        self._finish()
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size: Optional[int] = None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        self._rows += len(rows)
+        if not rows or len(rows) < (self.arraysize if size is None else size):
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        self._rows += 1
+        return row
+
+    def close(self) -> None:
+        self._finish()
+        super().close()
+
+    def __del__(self) -> None:
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+    def _finish(self) -> None:
+        if self._started is None:
+            return
+        self._started = None
+        duration_ms = self._elapsed * 1000
+        if duration_ms < THRESHOLD_MS:
+            return
+        # Statements without a result set report the rows they changed.
+        rows = self._rows if self.description is not None else self.rowcount
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "duration_ms": round(duration_ms, 3),
+            "rows": rows,
+            "caller": self._caller,
+            "sql": re.sub(r"\s+", " ", self._sql).strip(),
+            "params": _params(self._params),
+            "executemany": self._many,
+            "plan": None if self._many else _query_plan(self.connection, self._sql, self._params),
+        }
+        _ensure_handler()
+        logger.info(json.dumps(entry, default=str))
+
+
+def _query_plan(conn: sqlite3.Connection, sql: str, params: Any) -> Optional[list]:
+    """The ``EXPLAIN QUERY PLAN`` details for ``sql``, indented by depth."""
+    try:
+        rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params or ()).fetchall()
+    except sqlite3.Error:
+        return None
+    depth = {0: -1}
+    plan = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        plan.append("  " * depth[node_id] + detail)
+    return plan
+
+
+class SlowQueryConnection(sqlite3.Connection):
+    """Connection whose statements run on :class:`SlowQueryCursor`."""
+
+    def cursor(self, factory=SlowQueryCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql: str, params: Any = ()) -> SlowQueryCursor:
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql: str, seq_of_params: Iterable) -> SlowQueryCursor:
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+def connection_factory() -> type[sqlite3.Connection]:
+    return SlowQueryConnection if ENABLED else sqlite3.Connection
@@ -0,0 +1,57 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import school_db
+import school_service as svc
+
+HAS_FASTAPI = importlib.util.find_spec("fastapi") is not None
+
+
+@unittest.skipUnless(HAS_FASTAPI, "fastapi is not installed")
+class FastJsonTest(unittest.TestCase):
+    def setUp(self):
+        from fastapi.testclient import TestClient
+
+        import api
+
+        self.api = api
+        self.dbfile = tempfile.NamedTemporaryFile(delete=False)
+        self.dbfile.close()
+        patcher = mock.patch.object(school_db, "DB_NAME", self.dbfile.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        school_db.ensure_schema()
+        t_id = svc.add_teacher("Zoë", 'O"Neil \\ \n', None)
+        svc.add_teacher("Ann", "Smith", "ann@example.com")
+        svc.add_course("Física 😀", 5, t_id)
+        svc.add_course("Untaught", 3, None)
+        for n in range(5):
+            svc.add_student("Ödön", f"Nagy {n}", f"S{n}", None if n % 2 else f"s{n}@example.com")
+        self.client = TestClient(api.app)
+
+    def tearDown(self):
+        school_db.close_pools()
+        os.remove(self.dbfile.name)
+
+    def get(self, url, fast):
+        endpoints = {"teachers", "courses", "students"} if fast else set()
+        with mock.patch.object(self.api, "FAST_JSON", endpoints):
+            return self.client.get(url)
+
+    def test_fast_path_matches_the_response_models(self):
+        for url in ("/teachers", "/courses", "/courses?ids=1,2", "/students?limit=2",
+                    "/students?ids=3,1", "/students?last_name=Nagy"):
+            with self.subTest(url=url):
+                slow, fast = self.get(url, False), self.get(url, True)
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, slow.content)
+                self.assertEqual(fast.headers["content-type"], slow.headers["content-type"])
+                for header in ("etag", "x-next-cursor"):
+                    self.assertEqual(fast.headers.get(header), slow.headers.get(header))
+
+
+if __name__ == "__main__":
+    unittest.main()
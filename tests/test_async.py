@@ -0,0 +1,62 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import school_db
+import school_service as svc
+from school_async import AsyncService
+
+
+class AsyncServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.dbfile = tempfile.NamedTemporaryFile(delete=False)
+        self.dbfile.close()
+        patcher = mock.patch.object(school_db, "DB_NAME", self.dbfile.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        school_db.ensure_schema()
+        self.db = AsyncService(svc, workers=2)
+
+    def tearDown(self):
+        self.db.shutdown()
+        school_db.close_pools()
+        os.remove(self.dbfile.name)
+
+    def test_service_functions_run_off_the_event_loop(self):
+        async def scenario():
+            loop_thread = threading.get_ident()
+            await self.db.add_teacher("Ada", "King", None)
+            teachers = await self.db.list_teachers()
+            worker_thread = await self.db.run(threading.get_ident)
+            return teachers, loop_thread, worker_thread
+
+        teachers, loop_thread, worker_thread = asyncio.run(scenario())
+        self.assertEqual([row["last_name"] for row in teachers], ["King"])
+        self.assertNotEqual(loop_thread, worker_thread)
+
+    def test_concurrency_is_bounded_by_workers(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def slow():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.pop()
+
+        async def scenario():
+            await asyncio.gather(*(self.db.run(slow) for _ in range(6)))
+
+        asyncio.run(scenario())
+        self.assertEqual(max(peak), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from benchmarks.generate import Dataset, generate
+
+TINY = Dataset(teachers=3, courses=8, programs=2, students=20, enrollments=90, courses_per_program=4)
+
+
+def dump(path):
+    """SQL dump of ``path`` minus table_version, whose rows carry wall-clock times."""
+    conn = sqlite3.connect(path)
+    try:
+        return [line for line in conn.iterdump() if '"table_version"' not in line]
+    finally:
+        conn.close()
+
+
+class GenerateTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_same_seed_gives_identical_databases(self):
+        generate(self.path("a.db"), TINY, seed=7)
+        generate(self.path("b.db"), TINY, seed=7)
+        generate(self.path("c.db"), TINY, seed=8)
+        self.assertEqual(dump(self.path("a.db")), dump(self.path("b.db")))
+        self.assertNotEqual(dump(self.path("a.db")), dump(self.path("c.db")))
+
+    def test_row_counts_match_the_dataset(self):
+        generate(self.path("a.db"), TINY)
+        conn = sqlite3.connect(self.path("a.db"))
+        try:
+            for table, expected in (("teacher", 3), ("course", 8), ("program", 2),
+                                    ("student", 20), ("enrollment", 90), ("program_course", 8)):
+                count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                self.assertEqual(count, expected, table)
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,337 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import school_db
+import school_service as svc
+import school_slowlog
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.dbfile = tempfile.NamedTemporaryFile(delete=False)
+        self.dbfile.close()
+
+    def tearDown(self):
+        school_db.close_pools()
+        os.remove(self.dbfile.name)
+
+    def test_connections_are_reused(self):
+        pool = school_db.ConnectionPool(self.dbfile.name, size=2)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            self.assertIs(first, second)
+        pool.close()
+
+    def test_acquire_times_out_when_exhausted(self):
+        pool = school_db.ConnectionPool(self.dbfile.name, size=1, timeout=0.05)
+        conn = pool.acquire()
+        with self.assertRaises(TimeoutError):
+            pool.acquire()
+        pool.release(conn)
+        pool.close()
+
+    def test_broken_connection_is_replaced(self):
+        pool = school_db.ConnectionPool(self.dbfile.name, size=1)
+        conn = pool.acquire()
+        pool.release(conn)
+        conn.close()
+        with pool.connection() as fresh:
+            self.assertIsNot(fresh, conn)
+            self.assertEqual(fresh.execute("SELECT 1").fetchone()[0], 1)
+        pool.close()
+
+    def test_release_rolls_back_open_transaction(self):
+        pool = school_db.ConnectionPool(self.dbfile.name, size=1)
+        with pool.connection() as conn:
+            conn.execute("CREATE TABLE t (x)")
+            conn.commit()
+            conn.execute("INSERT INTO t VALUES (1)")
+        with pool.connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM t").fetchone()[0], 0)
+        pool.close()
+
+    def test_closed_pool_rejects_acquire(self):
+        pool = school_db.get_pool(self.dbfile.name)
+        school_db.close_pools()
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+
+
+class ProfileTest(unittest.TestCase):
+    def setUp(self):
+        self.dbfile = tempfile.NamedTemporaryFile(delete=False)
+        self.dbfile.close()
+
+    def tearDown(self):
+        os.remove(self.dbfile.name)
+
+    def test_profile_is_applied_to_new_connections(self):
+        conn = school_db.get_connection(self.dbfile.name, profile="durable")
+        try:
+            settings = school_db.current_settings(conn)
+        finally:
+            conn.close()
+        self.assertEqual(settings["journal_mode"], "wal")
+        self.assertEqual(settings["synchronous"], 2)
+        self.assertEqual(settings["busy_timeout"], 5000)
+
+    def test_switch_to_wal_waits_for_a_held_lock(self):
+        for name, settings in school_db.PROFILES.items():
+            with self.subTest(profile=name):
+                self.assertEqual(next(iter(settings)), "busy_timeout")
+        holder = sqlite3.connect(self.dbfile.name, isolation_level=None, check_same_thread=False)
+        holder.execute("CREATE TABLE t (x)")
+        holder.execute("BEGIN EXCLUSIVE")
+        release = threading.Timer(0.2, holder.execute, ("COMMIT",))
+        release.start()
+        try:
+            conn = school_db.get_connection(self.dbfile.name)
+        finally:
+            release.join()
+            holder.close()
+        try:
+            self.assertEqual(school_db.current_settings(conn)["journal_mode"], "wal")
+        finally:
+            conn.close()
+
+    def test_unknown_profile_is_rejected(self):
+        with self.assertRaises(ValueError):
+            school_db.profile_settings("turbo")
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.dbfile = tempfile.NamedTemporaryFile(delete=False)
+        self.dbfile.close()
+
+    def tearDown(self):
+        school_db.close_pools()
+        os.remove(self.dbfile.name)
+
+    def test_fresh_database_is_migrated_to_latest(self):
+        version = school_db.ensure_schema(self.dbfile.name)
+        self.assertEqual(version, school_db.SCHEMA_VERSION)
+        with school_db.db_connection(self.dbfile.name) as conn:
+            self.assertEqual(school_db.schema_version(conn), school_db.SCHEMA_VERSION)
+            tables = {
+                row[0]
+                for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            }
+        self.assertTrue({"teacher", "student", "enrollment"} <= tables)
+
+    def test_migrate_is_read_only_when_current(self):
+        school_db.ensure_schema(self.dbfile.name)
+        with school_db.db_connection(self.dbfile.name) as conn:
+            statements = []
+            conn.set_trace_callback(statements.append)
+            school_db.migrate(conn)
+            conn.set_trace_callback(None)
+        self.assertEqual(statements, ["PRAGMA user_version"])
+
+    def test_newer_schema_is_rejected(self):
+        with school_db.db_connection(self.dbfile.name) as conn:
+            conn.execute(f"PRAGMA user_version = {school_db.SCHEMA_VERSION + 1}")
+            with self.assertRaises(RuntimeError):
+                school_db.migrate(conn)
+
+
+class ReaderWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.dbfile = tempfile.NamedTemporaryFile(delete=False)
+        self.dbfile.close()
+        school_db.ensure_schema(self.dbfile.name)
+
+    def tearDown(self):
+        school_db.close_pools()
+        os.remove(self.dbfile.name)
+
+    def insert_teacher(self, last_name):
+        with school_db.db_connection(self.dbfile.name) as conn:
+            cur = conn.execute(
+                "INSERT INTO teacher (first_name, last_name) VALUES ('T', ?)", (last_name,)
+            )
+            conn.commit()
+            return cur.lastrowid, threading.get_ident()
+
+    def write(self, fn, *args):
+        return school_db.write(fn, *args, db_path=self.dbfile.name)
+
+    def count_teachers(self, conn):
+        return conn.execute("SELECT COUNT(*) FROM teacher").fetchone()[0]
+
+    def test_readers_are_read_only(self):
+        with school_db.read_connection(self.dbfile.name) as conn:
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("INSERT INTO teacher (first_name, last_name) VALUES ('a', 'b')")
+
+    def test_concurrent_writes_are_serialized_and_readable_at_once(self):
+        threads_used, seen, errors = set(), [], []
+
+        def client(n):
+            try:
+                for i in range(20):
+                    teacher_id, thread = self.write(self.insert_teacher, f"L{n}-{i}")
+                    threads_used.add(thread)
+                    with school_db.read_connection(self.dbfile.name) as conn:
+                        row = conn.execute("SELECT id FROM teacher WHERE id = ?", (teacher_id,)).fetchone()
+                    seen.append(row is not None)
+            except Exception as exc:
+                errors.append(exc)
+
+        clients = [threading.Thread(target=client, args=(n,)) for n in range(8)]
+        for t in clients:
+            t.start()
+        for t in clients:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(threads_used), 1)
+        self.assertEqual(seen, [True] * 160)
+
+    def test_errors_reach_the_caller_and_the_writer_carries_on(self):
+        def fail():
+            with school_db.db_connection(self.dbfile.name) as conn:
+                conn.execute("INSERT INTO teacher (first_name, last_name) VALUES ('x', 'y')")
+                conn.execute("INSERT INTO teacher (id, first_name, last_name) VALUES (1, 'a', 'b')")
+                conn.execute("INSERT INTO teacher (id, first_name, last_name) VALUES (1, 'a', 'b')")
+
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.write(fail)
+        self.write(self.insert_teacher, "after")
+        with school_db.read_connection(self.dbfile.name) as conn:
+            self.assertEqual(self.count_teachers(conn), 1)
+
+    def test_writer_that_cannot_open_its_database_raises(self):
+        missing = os.path.join(self.dbfile.name + ".d", "school.db")
+        for _ in range(2):
+            with self.assertRaises(sqlite3.OperationalError):
+                school_db.write(self.insert_teacher, "x", db_path=missing)
+
+    def test_snapshot_reads_ignore_later_commits(self):
+        with school_db.read_connection(self.dbfile.name, snapshot=True) as conn:
+            before = self.count_teachers(conn)
+            self.write(self.insert_teacher, "new")
+            self.assertEqual(self.count_teachers(conn), before)
+        with school_db.read_connection(self.dbfile.name) as conn:
+            self.assertEqual(self.count_teachers(conn), before + 1)
+
+
+class GroupCommitTest(unittest.TestCase):
+    def setUp(self):
+        self.dbfile = tempfile.NamedTemporaryFile(delete=False)
+        self.dbfile.close()
+        patchers = (
+            mock.patch.object(school_db, "DB_NAME", self.dbfile.name),
+            mock.patch.object(school_db, "GROUP_COMMIT_MS", 50),
+        )
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        school_db.ensure_schema()
+        teacher_id = svc.add_teacher("T", "One", None)
+        self.course_id = svc.add_course("Course", 5, teacher_id)
+        self.student_ids = [svc.add_student("S", str(n), f"S{n:03}", None) for n in range(10)]
+
+    def tearDown(self):
+        school_db.close_pools()
+        os.remove(self.dbfile.name)
+
+    def test_concurrent_writes_share_commits_and_keep_their_own_errors(self):
+        groups = []
+        run_group = school_db.Writer._run_group
+
+        def counting(writer, conn, batch):
+            groups.append(len(batch))
+            run_group(writer, conn, batch)
+
+        # The first student is enrolled twice, so one of those calls must
+        # fail with the UNIQUE violation while the others commit.
+        students = [self.student_ids[0], *self.student_ids]
+        results, barrier = {}, threading.Barrier(len(students))
+
+        def enroll(n, student_id):
+            barrier.wait()
+            try:
+                results[n] = svc.enroll_student_in_course(student_id, self.course_id, "2024A")
+            except sqlite3.IntegrityError as exc:
+                results[n] = exc
+
+        with mock.patch.object(school_db.Writer, "_run_group", counting):
+            threads = [threading.Thread(target=enroll, args=item) for item in enumerate(students)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        errors = [r for r in results.values() if isinstance(r, sqlite3.IntegrityError)]
+        ids = [r for r in results.values() if isinstance(r, int)]
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(sum(groups), 11)
+        self.assertLess(len(groups), 11)
+        enrolled = svc.get_enrollments_for_course(self.course_id)
+        self.assertEqual(sorted(row["id"] for row in enrolled), sorted(ids))
+
+    def test_grouped_write_is_visible_once_it_returns(self):
+        enrollment_id = svc.enroll_student_in_course(self.student_ids[0], self.course_id, "2024A")
+        svc.record_grade(enrollment_id, "B", "completed")
+        self.assertEqual(svc.get_enrollment(enrollment_id)["grade"], "B")
+
+
+class SlowQueryLogTest(unittest.TestCase):
+    def setUp(self):
+        self.dbfile = tempfile.NamedTemporaryFile(delete=False)
+        self.dbfile.close()
+        patchers = (
+            mock.patch.object(school_db, "DB_NAME", self.dbfile.name),
+            mock.patch.multiple(school_slowlog, ENABLED=True, THRESHOLD_MS=0.0),
+        )
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.entries = []
+        handler = logging.Handler()
+        handler.emit = lambda record: self.entries.append(json.loads(record.getMessage()))
+        school_slowlog.logger.addHandler(handler)
+        school_slowlog.logger.setLevel(logging.INFO)
+        self.addCleanup(school_slowlog.logger.removeHandler, handler)
+        school_db.ensure_schema()
+
+    def tearDown(self):
+        school_db.close_pools()
+        os.remove(self.dbfile.name)
+
+    def logged(self, caller):
+        return [entry for entry in self.entries if entry["caller"] == caller]
+
+    def test_statements_are_logged_with_caller_rows_and_plan(self):
+        t_id = svc.add_teacher("Ada", "Lovelace", "ada@example.com")
+        svc.get_teacher(t_id)
+        svc.list_teachers()
+
+        (lookup,) = [e for e in self.logged("get_teacher") if "FROM teacher" in e["sql"]]
+        self.assertEqual(lookup["params"], [t_id])
+        self.assertEqual(lookup["rows"], 1)
+        self.assertTrue(lookup["plan"][0].startswith("SEARCH teacher"))
+        (insert,) = [e for e in self.logged("add_teacher") if e["sql"].startswith("INSERT")]
+        self.assertEqual(insert["rows"], 1)
+        self.assertTrue([e for e in self.logged("list_teachers") if "FROM teacher" in e["sql"]])
+        callers = {e["caller"] for e in self.entries if e["caller"]}
+        helpers = [name for name in callers if name.startswith("_") or name == "wrapper"]
+        self.assertEqual(helpers, [])
+
+    def test_parameters_can_be_redacted(self):
+        with mock.patch.object(school_slowlog, "REDACT", True):
+            svc.add_teacher("Ada", "Lovelace", "ada@example.com")
+        (insert,) = [e for e in self.logged("add_teacher") if e["sql"].startswith("INSERT")]
+        self.assertEqual(insert["params"], ["str", "str", "str"])
+
+
+if __name__ == "__main__":
+    unittest.main()
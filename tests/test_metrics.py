@@ -0,0 +1,59 @@
+import sqlite3
+import types
+import unittest
+
+import school_metrics as metrics
+
+
+class MetricsTest(unittest.TestCase):
+    def test_render_counter_and_histogram(self):
+        counter = metrics.Counter("demo_total", "Demo.", ["kind"])
+        counter.inc('say "hi"')
+        counter.inc('say "hi"', amount=2)
+        histogram = metrics.Histogram("demo_seconds", "Demo.", ["kind"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, "a")
+        histogram.observe(0.5, "a")
+        histogram.observe(3, "a")
+
+        self.assertEqual(counter.samples(), ['demo_total{kind="say \\"hi\\""} 3'])
+        self.assertEqual(histogram.samples(), [
+            'demo_seconds_bucket{kind="a",le="0.1"} 1',
+            'demo_seconds_bucket{kind="a",le="1"} 2',
+            'demo_seconds_bucket{kind="a",le="+Inf"} 3',
+            'demo_seconds_sum{kind="a"} 3.55',
+            'demo_seconds_count{kind="a"} 3',
+        ])
+
+    def test_instrument_records_calls_rows_and_errors(self):
+        module = types.ModuleType("fake_service")
+
+        def list_things():
+            return [1, 2, 3]
+
+        def locked():
+            raise sqlite3.OperationalError("database is locked")
+
+        def _private():
+            return []
+
+        for fn in (list_things, locked, _private):
+            fn.__module__ = module.__name__
+            setattr(module, fn.__name__, fn)
+        calls = metrics.SERVICE_CALLS.value("list_things")
+        rows = metrics.SERVICE_ROWS.value("list_things")
+        errors = metrics.SERVICE_ERRORS.value("locked", "database_locked")
+
+        metrics.instrument(module)
+        module.list_things()
+        with self.assertRaises(sqlite3.OperationalError):
+            module.locked()
+
+        self.assertIs(module._private, _private)
+        self.assertEqual(metrics.SERVICE_CALLS.value("list_things"), calls + 1)
+        self.assertEqual(metrics.SERVICE_ROWS.value("list_things"), rows + 3)
+        self.assertEqual(metrics.SERVICE_ERRORS.value("locked", "database_locked"), errors + 1)
+        self.assertIn('school_service_duration_seconds_count{function="locked"}', metrics.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import contextvars
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+import school_profiler as profiler
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def worker(seconds):
+    profiler.attach_current_thread()
+    busy_loop(seconds)
+
+
+class ProfilerTest(unittest.TestCase):
+    def profile(self):
+        sampler = profiler.Sampler(interval=0.001)
+        session, token = sampler.start(sys._getframe())
+        try:
+            busy_loop(0.05)
+            context = contextvars.copy_context()
+            thread = threading.Thread(target=context.run, args=(worker, 0.05))
+            thread.start()
+            thread.join()
+        finally:
+            seconds = sampler.stop(session, token)
+        return session, seconds
+
+    def test_samples_request_and_attached_worker_threads(self):
+        session, _ = self.profile()
+        own, total = profiler.hot_functions(session.stacks)
+        names = [name for name, _ in total]
+        self.assertIn("test_profiler.py:busy_loop", names)
+        self.assertIn("test_profiler.py:worker", names)
+        # Frames below the profiled frame are not part of the request.
+        self.assertNotIn("test_profiler.py:ProfilerTest.test_samples_request_and_attached_worker_threads", names)
+        self.assertEqual(own[0][0], "test_profiler.py:busy_loop")
+
+    def test_store_files_merge_into_a_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = profiler.ProfileStore(directory)
+            for _ in range(2):
+                session, seconds = self.profile()
+                store.record("GET /teachers/{teacher_id}", session, seconds)
+            entries = profiler.load(directory)
+        self.assertEqual([entry["route"] for entry in entries], ["GET /teachers/{teacher_id}"])
+        self.assertEqual(entries[0]["requests"], 2)
+        report = profiler.format_summary(profiler.summarize(entry) for entry in entries)
+        self.assertIn("busy_loop", report)
+
+    def test_frames_are_named_without_co_qualname(self):
+        # Code objects only carry co_qualname from Python 3.11 on.
+        code = SimpleNamespace(co_filename="/srv/school/app.py", co_name="handler")
+        self.assertEqual(profiler._frame_name(SimpleNamespace(f_code=code)), "app.py:handler")
+
+
+if __name__ == "__main__":
+    unittest.main()
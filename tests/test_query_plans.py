@@ -0,0 +1,105 @@
+import os
+import re
+import tempfile
+import unittest
+from unittest import mock
+
+import school_db
+import school_service as svc
+
+# Lookups scoped to one teacher, course or student must be answered
+# entirely from indexes.
+INDEXED_LOOKUPS = [
+    ("get_teacher", (1,)),
+    ("get_teacher_courses", (1,)),
+    ("get_teacher_students", (1,)),
+    ("get_teacher_evaluations", (1,)),
+    ("get_teacher_dashboard", (1,)),
+    ("get_enrollments_for_course", (1,)),
+    ("get_course", (1,)),
+    ("get_student", (1,)),
+    ("get_student_enrollments", (1,)),
+    ("get_student_grades", (1,)),
+    ("get_student_progress", (1, 1)),
+    ("get_enrollment", (1,)),
+    ("get_students_by_ids", ([1, 2],)),
+    ("get_courses_by_ids", ([1, 2],)),
+    ("get_program_progress", (1,)),
+]
+
+# Keyset pages and counter-backed leaderboards must be read in index order
+# so that their cost does not grow with the table.
+CURSOR = svc.encode_cursor(["Smith", "Ann", 10])
+KEYSET_PAGES = [
+    ("list_teachers", (50, CURSOR)),
+    ("list_students", (50, CURSOR)),
+    ("list_students", (50, None, "Sm")),
+    ("list_courses", (50, svc.encode_cursor(["Math", 3]))),
+    ("list_courses", (50, None, None, 7)),
+    ("get_most_popular_courses", (5,)),
+    ("get_most_popular_teachers", (5,)),
+    ("get_best_students", (5,)),
+    ("get_at_risk_students", (5,)),
+]
+
+# Any SCAN, with or without an index, visits every row of its table. Lookups
+# must not scan at all; ordered pages may walk an index (their LIMIT stops
+# the walk) but never the bare table.
+ANY_SCAN = re.compile(r"^SCAN ")
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+class QueryPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.dbfile = tempfile.NamedTemporaryFile(delete=False)
+        self.dbfile.close()
+        patcher = mock.patch.object(school_db, "DB_NAME", self.dbfile.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        school_db.ensure_schema()
+        svc.analytics_cache.clear()
+
+    def tearDown(self):
+        school_db.close_pools()
+        os.remove(self.dbfile.name)
+
+    def query_plans(self, name, args):
+        """Run a service function and return the plan of every statement it ran."""
+        statements = []
+        svc.analytics_cache.clear()
+        with school_db.read_connection() as conn:
+            conn.set_trace_callback(statements.append)
+        try:
+            getattr(svc, name)(*args)
+        finally:
+            with school_db.read_connection() as conn:
+                conn.set_trace_callback(None)
+        plans = []
+        with school_db.read_connection() as conn:
+            for sql in statements:
+                if sql.strip() == "SELECT 1":
+                    continue
+                rows = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+                plans.append((sql, [row["detail"] for row in rows]))
+        self.assertTrue(plans, f"{name} ran no statements")
+        return plans
+
+    def test_lookups_use_indexes(self):
+        for name, args in INDEXED_LOOKUPS:
+            for sql, details in self.query_plans(name, args):
+                with self.subTest(function=name, sql=sql):
+                    scans = [d for d in details if ANY_SCAN.match(d)]
+                    self.assertEqual(scans, [], details)
+
+    def test_ordered_reads_need_no_sort(self):
+        for name, args in KEYSET_PAGES:
+            for sql, details in self.query_plans(name, args):
+                with self.subTest(function=name, sql=sql):
+                    self.assertFalse(
+                        [d for d in details if FULL_SCAN.match(d) or "TEMP B-TREE" in d],
+                        details,
+                    )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,12 @@
+import io
 import os
+import sqlite3
 import tempfile
 import unittest
+from unittest import mock
 
 import school_db
+import school_io
 import school_service as svc
 
 
@@ -11,10 +15,12 @@ class ServiceTest(unittest.TestCase):
         self.dbfile = tempfile.NamedTemporaryFile(delete=False)
         self.dbfile.close()
         school_db.DB_NAME = self.dbfile.name
-        conn = school_db.get_connection()
-        school_db.init_db(conn)
+        with school_db.db_connection() as conn:
+            school_db.init_db(conn)
+        svc.analytics_cache.clear()
 
     def tearDown(self):
+        school_db.close_pools()
         os.remove(self.dbfile.name)
 
     def test_add_teacher_and_list(self):
@@ -51,6 +57,312 @@ class ServiceTest(unittest.TestCase):
         svc.delete_student(s_id)
         self.assertEqual(len(svc.list_students()), 0)
 
+    def test_import_records_resolves_references_and_rejects_bad_rows(self):
+        svc.add_course("Physics", 4, None)
+        students = [
+            {"first_name": "Ann", "last_name": "Lee", "student_number": "S1"},
+            {"first_name": "Ben", "last_name": "Ode", "student_number": "S2", "email": ""},
+            {"first_name": "Dup", "last_name": "Lee", "student_number": "S1"},
+            {"first_name": "", "last_name": "Nameless", "student_number": "S3"},
+        ]
+        result = svc.import_records("students", students, batch_size=2)
+        self.assertEqual(result.inserted, 2)
+        self.assertEqual(sorted(line for line, _ in result.rejected), [3, 4])
+
+        enrollments = [
+            {"student_number": "S1", "course_name": "Physics", "semester": "2024S"},
+            {"student_number": "S2", "course_name": "Physics", "semester": "2024S"},
+            {"student_number": "S9", "course_name": "Physics", "semester": "2024S"},
+        ]
+        result = svc.import_records("enrollments", enrollments)
+        self.assertEqual(result.inserted, 2)
+        self.assertEqual(result.rejected, [(3, "unknown student_number 'S9'")])
+        self.assertEqual(svc.get_most_popular_courses(1)[0]["cnt"], 2)
+
+    def test_import_reports_malformed_json_lines_and_goes_on(self):
+        lines = [
+            '{"first_name": "Ann", "last_name": "Lee", "student_number": "S1"}',
+            '{"first_name": "Ben", "last_name":',
+            '["not", "an", "object"]',
+            '{"first_name": "Cy", "last_name": "Ode", "student_number": "S2"}',
+        ]
+        result = svc.import_records("students", school_io.iter_jsonl(io.StringIO("\n".join(lines))), 1)
+        self.assertEqual(result.inserted, 2)
+        self.assertEqual([line for line, _ in result.rejected], [2, 3])
+        self.assertIn("line 2: invalid JSON", result.rejected[0][1])
+        self.assertEqual(len(svc.list_students()), 2)
+
+    def test_batch_enrollment_reports_each_item(self):
+        s_id = svc.add_student("Cara", "Diaz", "S200", None)
+        c_id = svc.add_course("Biology", 4, None)
+        results = svc.enroll_students_in_courses(
+            [(s_id, c_id, "2024S"), (s_id, c_id, "2024S"), (999, c_id, "2024S")]
+        )
+        self.assertIsInstance(results[0], int)
+        self.assertIsInstance(results[1], sqlite3.IntegrityError)
+        self.assertIsInstance(results[2], LookupError)
+        self.assertEqual(len(svc.get_student_enrollments(s_id)), 1)
+        found = svc.get_students_by_ids([s_id, 999])
+        self.assertEqual([row["id"] for row in found], [s_id])
+
+    def test_batch_lookups_fit_the_old_variable_limit(self):
+        open_connection = school_db.get_connection
+
+        def limited(*args, **kwargs):
+            conn = open_connection(*args, **kwargs)
+            conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+            return conn
+
+        s_ids = [svc.add_student("S", str(n), f"V{n}", None) for n in range(3)]
+        c_id = svc.add_course("Biology", 4, None)
+        ids = list(range(1000, 0, -1))
+        school_db.close_pools()
+        with mock.patch.object(school_db, "get_connection", limited):
+            self.assertEqual([row["id"] for row in svc.get_students_by_ids(ids)], s_ids)
+            self.assertEqual([row["id"] for row in svc.get_courses_by_ids(ids)], [c_id])
+            results = svc.enroll_students_in_courses(
+                [(s_id, c_id, "2024S") for s_id in s_ids]
+                + [(n, c_id, "2024S") for n in range(10, 1010)]
+            )
+        self.assertTrue(all(isinstance(r, int) for r in results[:3]))
+        self.assertTrue(all(isinstance(r, LookupError) for r in results[3:]))
+
+    def test_record_grades_validates_each_row(self):
+        c_id = svc.add_course("Biology", 4, None)
+        other_course = svc.add_course("Chemistry", 4, None)
+        ids = [
+            svc.enroll_student_in_course(svc.add_student("S", str(n), f"G{n}", None), c_id, "2024S")
+            for n in range(3)
+        ]
+        elsewhere = svc.enroll_student_in_course(svc.add_student("S", "x", "G9", None), other_course, "2024S")
+        results = svc.record_grades(
+            [
+                {"enrollment_id": ids[0], "grade": "a"},
+                {"enrollment_id": str(ids[1]), "grade": "F", "status": "failed"},
+                {"enrollment_id": ids[2], "grade": "Z"},
+                {"enrollment_id": elsewhere, "grade": "B"},
+                {"enrollment_id": 999, "grade": "B"},
+                {"grade": "B"},
+            ],
+            course_id=c_id,
+        )
+        self.assertEqual(results[:2], [None, None])
+        self.assertIsInstance(results[2], ValueError)
+        self.assertIsInstance(results[3], LookupError)
+        self.assertIsInstance(results[4], LookupError)
+        self.assertIsInstance(results[5], ValueError)
+        grades = {row["id"]: (row["grade"], row["status"]) for row in svc.get_enrollments_for_course(c_id)}
+        self.assertEqual(grades[ids[0]], ("A", "completed"))
+        self.assertEqual(grades[ids[1]], ("F", "failed"))
+        self.assertEqual(grades[ids[2]], (None, "enrolled"))
+        self.assertIsNone(svc.get_enrollment(elsewhere)["grade"])
+
+    def test_teacher_dashboard_matches_the_single_lookups(self):
+        t_id = svc.add_teacher("Tess", "Ng", None)
+        courses = [svc.add_course(name, 3, t_id) for name in ("Physics", "Algebra")]
+        svc.add_course("Other", 3, None)
+        students = [svc.add_student(first, last, f"D{n}", None)
+                    for n, (first, last) in enumerate([("Bo", "Yu"), ("Al", "Yu"), ("Cy", "Ames")])]
+        for student_id in students:
+            for course_id in courses:
+                e_id = svc.enroll_student_in_course(student_id, course_id, "2024S")
+                if student_id != students[0]:
+                    svc.record_grade(e_id, "B", "completed")
+        dashboard = svc.get_teacher_dashboard(t_id)
+        self.assertEqual(dict(dashboard.teacher), dict(svc.get_teacher(t_id)))
+        self.assertEqual([dict(r) for r in dashboard.courses], [dict(r) for r in svc.get_teacher_courses(t_id)])
+        self.assertEqual([dict(r) for r in dashboard.students], [dict(r) for r in svc.get_teacher_students(t_id)])
+        self.assertEqual([r["last_name"] for r in dashboard.students], ["Ames", "Yu", "Yu"])
+        self.assertEqual([dict(r) for r in dashboard.evaluations], [dict(r) for r in svc.get_teacher_evaluations(t_id)])
+        self.assertEqual(len(dashboard.evaluations), 4)
+        self.assertIsNone(svc.get_teacher_dashboard(999).teacher)
+
+    def test_keyset_pagination_walks_all_students(self):
+        for number, last in enumerate(["Ng", "Abe", "Ng", "Moss", "Abe"]):
+            svc.add_student("Pat", last, f"S{number}", None)
+        seen, cursor = [], None
+        while True:
+            page = svc.list_students(limit=2, after=cursor)
+            seen.extend(row["id"] for row in page)
+            cursor = svc.page_cursor(page, 2, svc.STUDENT_KEYS)
+            if cursor is None:
+                break
+        self.assertEqual(seen, [row["id"] for row in svc.list_students()])
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(svc.list_students(last_name="Ng")), 2)
+        with self.assertRaises(ValueError):
+            svc.list_students(limit=2, after="not-a-cursor")
+
+    def test_unfinished_export_holds_no_connection(self):
+        for n in range(3):
+            svc.add_student("Exp", str(n), f"X{n}", None)
+        rows = svc.iter_students(chunk_size=2)
+        self.assertEqual(next(rows)["student_number"], "X0")
+        readers = school_db.get_database().readers
+        self.assertEqual(readers._idle.qsize(), readers._opened)
+        self.assertEqual([row["student_number"] for row in rows], ["X1", "X2"])
+
+    def test_export_round_trips_through_import(self):
+        s_id = svc.add_student("Dee", "Fox", "S300", "dee@example.com")
+        c_id = svc.add_course("Chemistry", 5, None)
+        svc.enroll_student_in_course(s_id, c_id, "2024W")
+        exported = "".join(school_io.encode_rows(svc.iter_enrollments(chunk_size=1), "csv"))
+        records = list(school_io.iter_csv(io.StringIO(exported)))
+        self.assertEqual(records[0]["student_number"], "S300")
+        self.assertEqual(records[0]["course_name"], "Chemistry")
+        for record in records:
+            record["semester"] = "2025S"
+        result = svc.import_records("enrollments", records)
+        self.assertEqual(result.inserted, 1)
+        self.assertEqual(len(svc.get_student_enrollments(s_id)), 2)
+
+    def test_enrollment_counters_follow_writes(self):
+        t1 = svc.add_teacher("Tia", "One", None)
+        t2 = svc.add_teacher("Tom", "Two", None)
+        c1 = svc.add_course("Art", 2, t1)
+        c2 = svc.add_course("Music", 2, t2)
+        s1 = svc.add_student("Sam", "Ray", "S400", None)
+        s2 = svc.add_student("Sue", "Ray", "S401", None)
+        svc.enroll_student_in_course(s1, c1, "2024S")
+        svc.enroll_student_in_course(s2, c1, "2024S")
+        svc.enroll_student_in_course(s1, c2, "2024S")
+
+        def counts():
+            courses = {row["name"]: row["cnt"] for row in svc.get_most_popular_courses(10)}
+            teachers = {row["name"]: row["cnt"] for row in svc.get_most_popular_teachers(10)}
+            return courses, teachers
+
+        self.assertEqual(counts(), ({"Art": 2, "Music": 1}, {"Tia One": 2, "Tom Two": 1}))
+        with school_db.db_connection() as conn:
+            conn.execute("UPDATE course SET teacher_id = ? WHERE id = ?", (t2, c1))
+            conn.commit()
+        svc.analytics_cache.clear()
+        self.assertEqual(counts()[1], {"Tia One": 0, "Tom Two": 3})
+        expected = counts()
+        svc.rebuild_enrollment_counts()
+        self.assertEqual(counts(), expected)
+
+    def test_analytics_are_cached_until_a_write(self):
+        c_id = svc.add_course("Drama", 3, None)
+        s_id = svc.add_student("Eve", "Hart", "S500", None)
+        before = svc.analytics_cache.stats()
+        self.assertEqual(svc.get_most_popular_courses(1)[0]["cnt"], 0)
+        svc.get_most_popular_courses(1)
+        after = svc.analytics_cache.stats()
+        self.assertEqual(after["hits"] - before["hits"], 1)
+        self.assertEqual(after["misses"] - before["misses"], 1)
+        svc.enroll_student_in_course(s_id, c_id, "2024S")
+        self.assertEqual(svc.get_most_popular_courses(1)[0]["cnt"], 1)
+
+    def test_data_version_changes_only_with_its_tables(self):
+        teacher_version = svc.get_data_version("teacher")
+        student_version = svc.get_data_version("student")
+        t_id = svc.add_teacher("Fay", "Ivy", None)
+        self.assertNotEqual(svc.get_data_version("teacher")[0], teacher_version[0])
+        self.assertEqual(svc.get_data_version("student"), student_version)
+        course_version = svc.get_data_version("course")
+        s_id = svc.add_student("Gus", "Jay", "S600", None)
+        c_id = svc.add_course("Law", 3, t_id)
+        self.assertNotEqual(svc.get_data_version("course")[0], course_version[0])
+        before = {table: svc.get_data_version(table) for table in ("teacher", "course", "enrollment")}
+        svc.enroll_student_in_course(s_id, c_id, "2024S")
+        self.assertEqual(svc.get_data_version("teacher"), before["teacher"])
+        self.assertEqual(svc.get_data_version("course"), before["course"])
+        self.assertNotEqual(svc.get_data_version("enrollment")[0], before["enrollment"][0])
+        svc.update_teacher(t_id, "Fay", "Ives", None)
+        self.assertNotEqual(svc.get_data_version("teacher")[0], before["teacher"][0])
+
+    def test_leaderboards_follow_grades(self):
+        c1 = svc.add_course("Logic", 3, None)
+        c2 = svc.add_course("Rhetoric", 3, None)
+        good = svc.add_student("Hal", "Kim", "S700", None)
+        weak = svc.add_student("Ivo", "Lum", "S701", None)
+        for course in (c1, c2):
+            svc.record_grade(svc.enroll_student_in_course(good, course, "2024S"), "A", "completed")
+        svc.record_grade(svc.enroll_student_in_course(weak, c1, "2024S"), "F", "failed")
+        retry = svc.enroll_student_in_course(weak, c2, "2024S")
+        svc.record_grade(retry, "E", "completed")
+
+        best = svc.get_best_students(5)
+        self.assertEqual([(row["id"], row["avg_grade"]) for row in best], [(good, 5.0), (weak, 1.0)])
+        self.assertEqual(svc.get_at_risk_students(5), [])
+        svc.record_grade(retry, "F", "failed")
+        at_risk = svc.get_at_risk_students(5)
+        self.assertEqual([(row["id"], row["failed"], row["passed"]) for row in at_risk], [(weak, 2, 0)])
+        svc.delete_student(weak)
+        self.assertEqual([row["id"] for row in svc.get_best_students(5)], [good])
+
+    def test_enrollments_without_a_student_leave_stats_alone(self):
+        def stats():
+            with school_db.read_connection() as conn:
+                return [tuple(row) for row in conn.execute("SELECT * FROM student_stats ORDER BY student_id")]
+
+        c_id = svc.add_course("Logic", 3, None)
+        s_id = svc.add_student("Hal", "Kim", "S700", None)
+        svc.record_grade(svc.enroll_student_in_course(s_id, c_id, "2024S"), "B", "completed")
+        before = stats()
+        orphan = svc.enroll_student_in_course(None, c_id, "2024F")
+        svc.record_grade(orphan, "A", "completed")
+        self.assertEqual(stats(), before)
+        with school_db.db_connection() as conn:
+            conn.execute("UPDATE enrollment SET student_id = ? WHERE id = ?", (s_id, orphan))
+            conn.commit()
+        moved = stats()
+        self.assertEqual([(row[0], row[1]) for row in moved], [(s_id, 2)])
+        svc.rebuild_student_stats()
+        self.assertEqual(stats(), moved)
+        with school_db.db_connection() as conn:
+            conn.execute("UPDATE enrollment SET student_id = NULL WHERE id = ?", (orphan,))
+            conn.execute("DELETE FROM enrollment WHERE id = ?", (orphan,))
+            conn.commit()
+        self.assertEqual(stats(), before)
+        svc.rebuild_student_stats()
+        self.assertEqual(stats(), before)
+
+    def test_program_progress_matches_per_student_progress(self):
+        p_id = svc.add_program("Arts", None)
+        courses = [svc.add_course(name, 3, None) for name in ("Paint", "Sculpt", "Draw")]
+        for c_id in courses:
+            svc.assign_course_to_program(p_id, c_id)
+        students = [svc.add_student("Jo", last, f"S8{n}", None) for n, last in enumerate("ABC")]
+        for s_id in students:
+            svc.enroll_student_in_program(s_id, p_id)
+        svc.record_grade(svc.enroll_student_in_course(students[0], courses[0], "2024S"), "B", "completed")
+        svc.record_grade(svc.enroll_student_in_course(students[0], courses[1], "2024S"), "F", "failed")
+        svc.record_grade(svc.enroll_student_in_course(students[1], courses[2], "2024S"), "A", "completed")
+
+        rows = svc.get_program_progress(p_id)
+        self.assertEqual([row["student_id"] for row in rows], students)
+        for row in rows:
+            expected = svc.get_student_progress(row["student_id"], p_id)
+            self.assertEqual((row["passed"], row["remaining"], row["failed"]), expected)
+        self.assertEqual([tuple(row) for row in svc.iter_program_progress(p_id, chunk_size=1)],
+                         [tuple(row) for row in rows])
+        streamed = svc.iter_program_progress(p_id, chunk_size=2)
+        self.assertEqual(next(streamed)["student_id"], students[0])
+        readers = school_db.get_database().readers
+        self.assertEqual(readers._idle.qsize(), readers._opened)
+        self.assertEqual([row["student_id"] for row in streamed], students[1:])
+
+    def test_search_follows_inserts_updates_and_deletes(self):
+        t_id = svc.add_teacher("José", "Álvarez", "jose@example.com")
+        s_id = svc.add_student("Anna", "Smith", "S12345", "anna@example.com")
+        other = svc.add_student("Annabel", "Jones", "S22222", None)
+        c_id = svc.add_course("Annual Physics", 3, t_id)
+
+        self.assertEqual([row["id"] for row in svc.search("student", "ann")], [s_id, other])
+        self.assertEqual([row["label"] for row in svc.search("student", "s123")], ["Anna Smith (S12345)"])
+        self.assertEqual([row["id"] for row in svc.search("teacher", "jose alv")], [t_id])
+        self.assertEqual([row["id"] for row in svc.search("course", "phys")], [c_id])
+        self.assertEqual(svc.search("student", '"*'), [])
+
+        svc.update_student(s_id, "Hanna", "Smith", "S12345", None)
+        svc.delete_student(other)
+        self.assertEqual(svc.search("student", "ann"), [])
+        self.assertEqual([row["id"] for row in svc.search("student", "hanna smi")], [s_id])
+        with self.assertRaises(ValueError):
+            svc.search("program", "x")
+
 
 if __name__ == "__main__":
     unittest.main()